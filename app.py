@@ -1,11 +1,18 @@
-import os, re, json
+import os, re, json, time, queue
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from scraper import PriceScraper
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from catalog import CatalogStore
+from selector_profiles import default_selector_profiles
+from history import HISTORY_MAX_AGE_H, HistoryStore
+from jobs import FINAL_STATES, STREAM_WORKERS, JobRunner, JobStore
+from metrics import REGISTRY
+from ratelimit import HostPolicy, SharedHostScheduler, host_of
+from sheets_export import DEFAULT_SHEET, SheetsExporter, default_client as sheets_client
+from stream_export import EXTENSIONS, FORMATS, HAVE_ARROW, encode, needs_arrow
+from workqueue import SHARD_PRODUCTS, TASKS_TTL_S, QueueWorker, open_queue
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
@@ -15,8 +22,18 @@ PROMPT_FILE = BASE_DIR / "prompt-2.txt"
 app = Flask(__name__, static_folder=str(STATIC_DIR), static_url_path="")
 CORS(app)
 
-# Cancelaciones por lote
-CANCEL_FLAGS = {}
+# Trabajos y cancelaciones en SQLite: visibles desde cualquier worker de gunicorn
+JOBS = JobStore()
+JOB_RUNNER = JobRunner(JOBS)
+STREAM_RUNNER = JobRunner(JOBS, STREAM_WORKERS, name="stream")   # pool aparte: un stream lento no frena /api/jobs
+# Al arrancar, los trabajos que quedaron en cola o corriendo en un proceso anterior (lease vencido) pasan a error
+JOBS.fail_orphans()
+# Cola compartida para trabajos repartidos (WORK_QUEUE_URL) y turno por host común a todos los procesos
+QUEUE = open_queue()
+# Historial de precios (modo incremental y /api/history)
+HISTORY = HistoryStore()
+# Catálogo local de cada vendedor (sitemaps / feeds): URL de ficha por EAN y modelo
+CATALOG = CatalogStore()
 
 DEFAULT_VENDORS = {
     "Carrefour": "https://www.carrefour.com.ar",
@@ -34,25 +51,54 @@ DEFAULT_VENDORS = {
 def to_str(x): 
     return "" if x is None else str(x).strip()
 
-def parse_vendors_file(path: Path):
+def parse_limit_options(text: str):
+    # "rate=0.5 burst=2" / "rate=0.5;jitter=1" -> {"rate": "0.5", "burst": "2"}
+    opts = {}
+    for part in re.split(r"[\s;,]+", to_str(text)):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            opts[to_str(k).lower()] = to_str(v)
+    return opts
+
+def read_vendors_file(path: Path):
     if not path.exists():
-        return None
-    vendors = {}
+        return None, {}
+    vendors, limits = {}, {}
     seps = ["|", ",", ";", "\t", " — ", " – ", " - ", "->", "=>"]
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         for raw in f.readlines():
             line = to_str(raw)
             if not line or line.startswith("#"):
                 continue
-            name, url = line, ""
+            name, url, extra = line, "", ""
             for sep in seps:
                 if sep in line:
                     name, url = [to_str(p) for p in line.split(sep, 1)]
+                    if sep in url:
+                        url, extra = [to_str(p) for p in url.split(sep, 1)]
                     break
             if not url:
                 url = DEFAULT_VENDORS.get(name, "")
             vendors[name] = url
-    return vendors or None
+            if extra:
+                limits[name] = parse_limit_options(extra)
+    return vendors or None, limits
+
+def parse_vendors_file(path: Path):
+    return read_vendors_file(path)[0]
+
+def parse_vendor_limits(path: Path):
+    return read_vendors_file(path)[1]
+
+def request_rate_limits(data):
+    # Límites por vendedor: VENDEDORES.txt, sobrescritos por "rate_limits" del payload
+    limits = parse_vendor_limits(VENDORS_FILE)
+    extra = data.get("rate_limits")
+    if isinstance(extra, dict):
+        for name, opts in extra.items():
+            if isinstance(opts, dict):
+                limits[to_str(name)] = {**limits.get(to_str(name), {}), **opts}
+    return limits
 
 def parse_vendors_from_prompt(path: Path):
     if not path.exists():
@@ -70,6 +116,48 @@ def parse_vendors_from_prompt(path: Path):
             out[nm_clean] = DEFAULT_VENDORS.get(nm_clean, "")
     return out or None
 
+ORDERED_COLUMNS = [
+    "Producto","Marca","Modelo","EAN","Carrefour","Cetrogar","CheekSA","Frávega","Libertad",
+    "Masonline","Megatone","Musimundo","Naldo","Vital","Marca (Sitio oficial)","Fecha de Consulta"
+]
+BASE_COLUMNS = ["Producto","Marca","Modelo","EAN","Marca (Sitio oficial)","Fecha de Consulta"]
+
+def order_scrape_row(row):
+    # Misma forma que /api/scrape: columnas fijas (ND si falta) + precios "(num)"
+    out = {c: row.get(c, "ND") for c in ORDERED_COLUMNS}
+    out.update({c: v for c, v in row.items() if c.endswith(" (num)")})
+    return out
+
+def vendor_scrape_row(row, name):
+    return {c: row[c] for c in BASE_COLUMNS + [name, f"{name} (num)"] if c in row}
+
+def shared_scheduler(delay_range):
+    return SharedHostScheduler(QUEUE.slots, HostPolicy.from_delay_range(delay_range))
+
+def build_scraper(data, max_workers=None):
+    delay_range = (int(data.get("min_delay", 2)), int(data.get("max_delay", 5)))
+    return PriceScraper(
+        headless=bool(data.get("headless", True)),
+        delay_range=delay_range,
+        max_workers=max_workers,
+        rate_limits=request_rate_limits(data),
+        use_cache=bool(data.get("use_cache", True)),
+        history=HISTORY,
+        scheduler=shared_scheduler(delay_range),
+        catalog=CATALOG,
+    )
+
+def incremental_max_age(data):
+    # "incremental": true saltea pares (producto, vendedor) con precio de hace menos de max_age_h horas
+    if not data.get("incremental"): return None
+    try:
+        return float(data.get("max_age_h", HISTORY_MAX_AGE_H)) * 3600
+    except (TypeError, ValueError):
+        return HISTORY_MAX_AGE_H * 3600
+
+def cancel_callback(run_id):
+    return (lambda: JOBS.is_cancelled(run_id)) if run_id else (lambda: False)
+
 def sanitize_products(products):
     safe = []
     for p in products or []:
@@ -101,6 +189,11 @@ def static_files(filename):
 def health():
     return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
 
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    # Formato de texto de Prometheus; contadores del proceso (cada worker de gunicorn expone los suyos)
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route("/api/vendors", methods=["GET"])
 def get_vendors():
     v_from_txt = parse_vendors_file(VENDORS_FILE)
@@ -111,13 +204,31 @@ def get_vendors():
         return jsonify({"vendors": v_from_prompt})
     return jsonify({"vendors": DEFAULT_VENDORS})
 
+@app.route("/api/vendors/probe", methods=["POST"])
+def probe_vendors():
+    data = request.get_json(force=True, silent=True) or {}
+    vendors = data.get("vendors")
+    if not vendors or not isinstance(vendors, dict):
+        vendors = parse_vendors_file(VENDORS_FILE) or parse_vendors_from_prompt(PROMPT_FILE) or DEFAULT_VENDORS
+    vendors = {to_str(k): to_str(v) for k, v in vendors.items() if to_str(k) and to_str(v)}
+    if not vendors:
+        return jsonify({"success": False, "error": "No hay vendedores con URL"}), 400
+    scraper = PriceScraper(delay_range=(0, 0), rate_limits=request_rate_limits(data), scheduler=shared_scheduler((0, 0)))
+    result, logs = scraper.probe_vendors(vendors)
+    return jsonify({"success": True, "vendors": result, "log": logs})
+
+@app.route("/api/selectors", methods=["GET"])
+def selector_profiles():
+    # Perfil de selectores aprendido por vendedor (SELECTORES.json) y su tasa de acierto
+    return jsonify({"success": True, "vendors": default_selector_profiles().stats()})
+
 @app.route("/api/cancel", methods=["POST"])
 def cancel():
     data = request.get_json(force=True, silent=False)
     run_id = to_str(data.get("run_id"))
     if not run_id:
         return jsonify({"success": False, "error": "run_id requerido"}), 400
-    CANCEL_FLAGS[run_id] = True
+    JOBS.cancel(run_id)
     return jsonify({"success": True})
 
 @app.route("/api/scrape_vendor", methods=["POST"])
@@ -134,23 +245,27 @@ def scrape_vendor():
     if not name:
         return jsonify({"success": False, "error": "Falta nombre de vendedor"}), 400
 
-    headless = bool(data.get("headless", True))
-    min_delay = int(data.get("min_delay", 2))
-    max_delay = int(data.get("max_delay", 5))
-    include_official = bool(data.get("include_official", False))
-    cancel_cb = (lambda: bool(CANCEL_FLAGS.get(run_id))) if run_id else (lambda: False)
+    fmt = export_format(data)
+    if fmt not in FORMATS and fmt != "json":
+        return export_format_error(fmt)
+    if fmt != "json":
+        params = {**data, "products": products, "vendors": {name: url}, "include_official": bool(data.get("include_official", False))}
+        return stream_scrape(fmt, params, lambda r: vendor_scrape_row(r, name), BASE_COLUMNS + [name, f"{name} (num)"])
 
-    scraper = PriceScraper(headless=headless, delay_range=(min_delay, max_delay))
-    df, logs = scraper.scrape_all_vendors(
-        products, {name: url}, include_official_site=include_official, return_logs=True, cancel_cb=cancel_cb
+    include_official = bool(data.get("include_official", False))
+    scraper = build_scraper(data)
+    rows, logs = scraper.scrape_all_vendors(
+        products, {name: url}, include_official_site=include_official, return_logs=True, cancel_cb=cancel_callback(run_id), as_frame=False
     )
+    rows = [vendor_scrape_row(r, name) for r in rows]
 
-    base_cols = ["Producto","Marca","Marca (Sitio oficial)","Fecha de Consulta"]
-    vendor_cols = [c for c in df.columns if c == name or c == f"{name} (num)"]
-    keep = [c for c in base_cols + vendor_cols if c in df.columns]
-    df = df[keep]
+    return jsonify({"success": True, "rows": rows, "log": logs, "metrics": scraper.last_metrics})
 
-    return jsonify({"success": True, "rows": df.to_dict(orient="records"), "log": logs})
+def resolve_vendors(data):
+    vendors = data.get("vendors")
+    if not vendors or not isinstance(vendors, dict) or len(vendors) == 0:
+        vendors = parse_vendors_file(VENDORS_FILE) or parse_vendors_from_prompt(PROMPT_FILE) or DEFAULT_VENDORS
+    return vendors
 
 @app.route("/api/scrape", methods=["POST"])
 def scrape():
@@ -159,68 +274,362 @@ def scrape():
         return jsonify({"success": False, "error": "Cuerpo JSON inválido"}), 400
 
     products = sanitize_products(data.get("products", []))
-    vendors = data.get("vendors")
+    vendors = resolve_vendors(data)
     run_id = to_str(data.get("run_id"))
-    if not vendors or not isinstance(vendors, dict) or len(vendors) == 0:
-        vendors = parse_vendors_file(VENDORS_FILE) or parse_vendors_from_prompt(PROMPT_FILE) or DEFAULT_VENDORS
     if not vendors:
         return jsonify({"success": False, "error": "No hay vendedores configurados"}), 400
     if not products:
         return jsonify({"success": False, "error": "No se enviaron productos"}), 400
 
-    headless = bool(data.get("headless", True))
-    min_delay = int(data.get("min_delay", 2))
-    max_delay = int(data.get("max_delay", 5))
     include_official = bool(data.get("include_official", False))
-    cancel_cb = (lambda: bool(CANCEL_FLAGS.get(run_id))) if run_id else (lambda: False)
-
-    scraper = PriceScraper(headless=headless, delay_range=(min_delay, max_delay))
-    df, logs = scraper.scrape_all_vendors(products, vendors, include_official_site=include_official, return_logs=True, cancel_cb=cancel_cb)
-
-    ordered = [
-        "Producto","Marca","Carrefour","Cetrogar","CheekSA","Frávega","Libertad",
-        "Masonline","Megatone","Musimundo","Naldo","Vital","Marca (Sitio oficial)","Fecha de Consulta"
-    ]
-    for c in ordered:
-        if c not in df.columns:
-            df[c] = "ND"
-    extra = [c for c in df.columns if c.endswith(" (num)")]
-    df = df[ordered + extra]
-    return jsonify({"success": True, "rows": df.to_dict(orient="records"), "log": logs})
+    max_workers = int(data.get("max_workers", os.getenv("SCRAPE_WORKERS", 8)))
+    fmt = export_format(data)
+    if fmt not in FORMATS and fmt != "json":
+        return export_format_error(fmt)
+    if fmt != "json":
+        params = {**data, "products": products, "vendors": vendors, "include_official": include_official, "max_workers": max_workers}
+        return stream_scrape(fmt, params, order_scrape_row, ORDERED_COLUMNS + [f"{vn} (num)" for vn in vendors])
 
-@app.route("/api/export/sheets", methods=["POST"])
-def export_sheets():
+    scraper = build_scraper(data, max_workers=max_workers)
+    rows, logs = scraper.scrape_all_vendors(products, vendors, include_official_site=include_official, return_logs=True, cancel_cb=cancel_callback(run_id),
+                                            max_age_s=incremental_max_age(data), as_frame=False)
+    return jsonify({"success": True, "rows": [order_scrape_row(r) for r in rows], "log": logs, "metrics": scraper.last_metrics})
+
+# ------------------------ Exportación en streaming ------------------------
+# /api/scrape y /api/scrape_vendor con "format" (o ?format=) ndjson, csv, arrow o parquet: las filas salen de un
+# generador a medida que se completan, sin armar la lista entera; los logs quedan en el trabajo (X-Job-Id) y se
+# leen paginados con GET /api/jobs/<id>/logs
+EXPORT_QUEUE_ROWS = int(os.getenv("EXPORT_QUEUE_ROWS", 256))
+
+def export_format(data):
+    return to_str(request.args.get("format") or data.get("format") or "json").lower()
+
+def export_format_error(fmt):
+    return jsonify({"success": False, "error": f"Formato no soportado: {fmt} (json, {', '.join(FORMATS)})"}), 400
+
+def scrape_rows(job_id, params, shape):
+    # El scrape corre en el pool de trabajos y entrega cada fila por una cola acotada: si el cliente lee más lento
+    # los vendedores esperan. Las filas salen en orden de producto (sólo se retienen las que llegan adelantadas)
+    rows, closed, done = queue.Queue(maxsize=EXPORT_QUEUE_ROWS), [False], object()
+    def put(item):
+        while not closed[0]:
+            try:
+                rows.put(item, timeout=1); return
+            except queue.Full:
+                pass
+    def run(job_id):
+        try:
+            scraper = build_scraper(params, max_workers=params.get("max_workers"))
+            scraper.scrape_all_vendors(
+                params["products"], params["vendors"], include_official_site=bool(params.get("include_official")),
+                cancel_cb=lambda: closed[0] or JOBS.is_cancelled(job_id), on_row=lambda i, row: put((i, shape(row))),
+                on_log=lambda line: JOBS.add_event(job_id, "log", line), max_age_s=incremental_max_age(params),
+                as_frame=False, keep_rows=False,
+            )
+            return {"products": len(params["products"]), "vendors": list(params["vendors"]), "hosts": scraper.last_stats, "metrics": scraper.last_metrics}
+        finally:
+            put(done)
+    STREAM_RUNNER.submit(job_id, run)
+    ahead, nxt, finished = {}, 0, False
+    try:
+        while True:
+            try:
+                item = rows.get(timeout=1)
+            except queue.Empty:
+                if (JOBS.get(job_id) or {}).get("status") in FINAL_STATES: break
+                continue
+            if item is done: break
+            ahead[item[0]] = item[1]
+            while nxt in ahead:
+                yield ahead.pop(nxt); nxt += 1
+        for i in sorted(ahead):
+            yield ahead[i]
+        finished = True
+    finally:
+        # cliente desconectado: se cancela el scrape y se liberan los vendedores que esperaban lugar en la cola
+        if not finished: JOBS.cancel(job_id)
+        closed[0] = True
+
+def stream_scrape(fmt, params, shape, columns):
+    if needs_arrow(fmt) and not HAVE_ARROW:
+        return jsonify({"success": False, "error": f"{fmt} requiere pyarrow (pip install pyarrow)"}), 501
+    job_id = JOBS.create("scrape", {k: v for k, v in params.items() if k != "format"})
+    rows = scrape_rows(job_id, params, shape)
+    def generate():
+        try:
+            yield from encode(fmt, rows, columns)
+        finally:
+            rows.close()
+    name = f"precios-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{EXTENSIONS[fmt]}"
+    headers = {"X-Job-Id": job_id, "Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Content-Disposition": f'attachment; filename="{name}"'}
+    return Response(stream_with_context(generate()), mimetype=FORMATS[fmt], headers=headers)
+
+# ------------------------ Trabajos asíncronos ------------------------
+def run_scrape_job(job_id):
+    job = JOBS.get(job_id)
+    params = job["params"]
+    vendor_name = params.get("vendor_name")
+    log = lambda line: JOBS.add_event(job_id, "log", line)
+    # Con "export_sheets" las filas van llegando a la hoja mientras se scrapea
+    exporter = SheetsExporter(sheets_client(), params.get("sheet_name") or DEFAULT_SHEET, log=log) if params.get("export_sheets") else None
+    def on_row(i, row):
+        nonlocal exporter
+        row = vendor_scrape_row(row, vendor_name) if vendor_name else order_scrape_row(row)
+        JOBS.add_event(job_id, "row", {"index": i, "row": row})
+        if exporter:
+            try:
+                exporter.add_rows([row])
+            except Exception as e:
+                log(f"Sheets: exportación desactivada ({type(e).__name__}: {e})"); exporter = None
+    scraper = build_scraper(params, max_workers=params.get("max_workers"))
+    scraper.scrape_all_vendors(
+        params["products"], params["vendors"], include_official_site=bool(params.get("include_official", False)),
+        cancel_cb=cancel_callback(job_id), on_row=on_row, on_log=log,
+        max_age_s=incremental_max_age(params), as_frame=False,
+    )
+    summary = {"products": len(params["products"]), "vendors": list(params["vendors"]), "hosts": scraper.last_stats, "metrics": scraper.last_metrics}
+    if exporter:
+        summary["sheets"] = {**exporter.flush(), "sheet_url": exporter.sheet.url if exporter.sheet else None}
+    return summary
+
+def run_catalog_job(job_id):
+    params = JOBS.get(job_id)["params"]
+    scraper = build_scraper(params)
+    result, _ = scraper.build_catalog(params["vendors"], full=bool(params.get("full")), max_pages=params.get("max_pages"),
+                                      cancel_cb=cancel_callback(job_id), on_log=lambda line: JOBS.add_event(job_id, "log", line))
+    return {"vendors": result, "hosts": scraper.last_stats}
+
+# ------------------------ Trabajos repartidos (cola compartida) ------------------------
+def shard_size(params):
+    try:
+        return max(1, int(params.get("shard_size") or SHARD_PRODUCTS))
+    except (TypeError, ValueError):
+        return SHARD_PRODUCTS
+
+def shard_tasks(params):
+    # Un grupo por tramo de productos; dentro del grupo, una tarea por vendedor
+    step, n = shard_size(params), len(params["products"])
+    return [{"group": k // step, "vendor": vn, "host": host_of(url), "payload": {"vendor": vn, "url": url, "start": k, "n": min(step, n - k)}}
+            for k in range(0, n, step) for vn, url in params["vendors"].items()]
+
+def run_shard(task, lost):
+    job = JOBS.get(task.job_id)
+    if not job or JOBS.is_cancelled(task.job_id, max_age_s=0):
+        return {"status": "cancelled", "vendor": task.vendor, "rows": []}
+    if job["status"] == "queued":
+        JOBS.set_status(task.job_id, "running")
+    params, p = job["params"], task.payload
+    vn, start = p["vendor"], p["start"]
+    products = params["products"][start:start + p["n"]]
+    log = lambda line: JOBS.add_event(task.job_id, "log", line)
+    log(f"[{vn}] productos {start + 1}-{start + len(products)} de {len(params['products'])} en {QUEUE_WORKER.worker_id}")
+    rows = {}
+    def on_row(i, row):
+        rows[i] = vendor_scrape_row(row, vn)
+        JOBS.add_event(task.job_id, "cells", {"vendor": vn, "index": start + i, "row": rows[i]})
+    scraper = build_scraper(params)
+    scraper.scrape_all_vendors(
+        products, {vn: p["url"]}, include_official_site=bool(params.get("include_official", False)),
+        cancel_cb=lambda: lost() or JOBS.is_cancelled(task.job_id), on_row=on_row, on_log=log,
+        max_age_s=incremental_max_age(params), as_frame=False,
+    )
+    status = "cancelled" if JOBS.is_cancelled(task.job_id, max_age_s=0) else "done"
+    return {"status": status, "vendor": vn, "rows": [rows[i] for i in sorted(rows)], "hosts": scraper.last_stats}
+
+def merge_shard_rows(params, group):
+    # Filas del tramo con la forma de /api/scrape (o de /api/scrape_vendor con "vendor"); ND si la tarea de un vendedor falló
+    p = group[0]["payload"]
+    start, vendor_name = p["start"], params.get("vendor_name")
+    by_vendor = {t["vendor"]: (t["result"] or {}).get("rows") or [] for t in group}
+    date_only = datetime.now().strftime("%d/%m/%Y")
+    out = []
+    for j, prod in enumerate(params["products"][start:start + p["n"]]):
+        row = {"Producto": prod["producto"], "Marca": prod["marca"], "Modelo": prod["modelo"], "EAN": prod["ean"],
+               "Marca (Sitio oficial)": "ND", "Fecha de Consulta": date_only}
+        for vn in params["vendors"]:
+            row.update({vn: "ND", f"{vn} (num)": ""})
+            vrows = by_vendor.get(vn) or []
+            if j < len(vrows): row.update(vrows[j])
+        out.append((start + j, vendor_scrape_row(row, vendor_name) if vendor_name else order_scrape_row(row)))
+    return out
+
+def finish_sharded_job(job_id, counts):
+    params = JOBS.get(job_id)["params"]
+    tasks = QUEUE.results(job_id)
+    hosts = {}
+    for t in tasks:
+        for h, st in ((t["result"] or {}).get("hosts") or {}).items():
+            acc = hosts.setdefault(h, {})
+            for k, v in st.items(): acc[k] = round(acc.get(k, 0) + v, 3)
+    errors = [f"[{t['vendor']}] {t['error']}" for t in tasks if t["status"] == "error"]
+    for e in errors:
+        JOBS.add_event(job_id, "log", f"ERROR tarea {e}")
+    summary = {"products": len(params["products"]), "vendors": list(params["vendors"]), "sharded": True, "tasks": counts,
+               "workers": sorted({t["worker"].rsplit("/", 1)[0] for t in tasks if t["worker"]}), "hosts": hosts}
+    if params.get("export_sheets"):
+        groups = {}
+        for t in tasks: groups.setdefault(t["grp"], []).append(t)
+        rows = [row for g in sorted(groups) for _, row in merge_shard_rows(params, groups[g])]
+        try:
+            exporter = SheetsExporter(sheets_client(), params.get("sheet_name") or DEFAULT_SHEET, log=lambda line: JOBS.add_event(job_id, "log", line))
+            summary["sheets"] = {**exporter.export(rows), "sheet_url": exporter.sheet.url if exporter.sheet else None}
+        except Exception as e:
+            JOBS.add_event(job_id, "log", f"Sheets: exportación fallida ({type(e).__name__}: {e})")
+    if JOBS.is_cancelled(job_id, max_age_s=0):
+        JOBS.set_status(job_id, "cancelled", summary=summary)
+    elif errors and not counts.get("done"):
+        JOBS.set_status(job_id, "error", summary=summary, error=errors[0])
+    else:
+        JOBS.set_status(job_id, "done", summary=summary)
+
+def on_shard_finish(task, fin):
+    # Lo recibe el worker que cerró la última tarea de un tramo (filas completas) o del trabajo (estado final)
+    try:
+        if fin.get("requeued"):
+            JOBS.add_event(task.job_id, "log", f"[{task.vendor}] tarea reintentada (intento {task.attempts}): {fin.get('error')}")
+        if fin.get("group"):
+            for i, row in merge_shard_rows(JOBS.get(task.job_id)["params"], fin["group"]):
+                JOBS.add_event(task.job_id, "row", {"index": i, "row": row})
+        if fin.get("job"):
+            finish_sharded_job(task.job_id, fin["job"])
+    except Exception as e:
+        JOBS.add_event(task.job_id, "log", f"ERROR al cerrar tarea: {type(e).__name__}: {e}")
+        if fin.get("job"): JOBS.set_status(task.job_id, "error", error=f"{type(e).__name__}: {e}")
+
+# Cada proceso (worker de gunicorn o instancia) toma tareas con QUEUE_WORKERS hilos. No arrancan al importar la app
+# (tests, herramientas, master con GUNICORN_PRELOAD=1): cada worker los arranca en post_fork (gunicorn.conf.py) y
+# cualquier proceso al encolar su primer lote repartido
+QUEUE_WORKER = QueueWorker(QUEUE, run_shard, on_shard_finish)
+
+def after_fork():
+    # Worker recién creado desde un master con la app precargada: conexiones SQLite propias e hilos de la cola
+    for store in (JOBS, HISTORY, CATALOG, QUEUE, QUEUE.slots):
+        store.after_fork()
+    QUEUE_WORKER.start()
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
     data = request.get_json(force=True, silent=False)
-    rows = data.get("rows", [])
-    sheet_name = data.get("sheet_name", "Comparación Precios Electrodomésticos")
-    creds_path = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
-    creds_b64 = os.getenv("GOOGLE_CREDENTIALS_BASE64", "")
-    if creds_b64 and not os.path.exists(creds_path):
-        import base64
-        with open(creds_path, "wb") as f:
-            f.write(base64.b64decode(creds_b64))
-
-    scope = ["https://spreadsheets.google.com/feeds","https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
-    client = gspread.authorize(creds)
-
-    headers = list(rows[0].keys()) if rows else [
-        "Producto","Marca","Carrefour","Cetrogar","CheekSA","Frávega","Libertad",
-        "Masonline","Megatone","Musimundo","Naldo","Vital","Marca (Sitio oficial)","Fecha de Consulta"
-    ]
-    values = [headers] + [[(r.get(h, "") if r.get(h, "") is not None else "") for h in headers] for r in rows]
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Cuerpo JSON inválido"}), 400
+    params = {k: data[k] for k in ("headless", "min_delay", "max_delay", "include_official", "rate_limits", "use_cache", "incremental", "max_age_h", "export_sheets", "sheet_name", "sharded", "shard_size") if k in data}
+    params["products"] = sanitize_products(data.get("products", []))
+    v = data.get("vendor")
+    if isinstance(v, dict) and to_str(v.get("name")):
+        params["vendors"] = {to_str(v.get("name")): to_str(v.get("url"))}
+        params["vendor_name"] = to_str(v.get("name"))
+    else:
+        params["vendors"] = resolve_vendors(data)
+    params["max_workers"] = int(data.get("max_workers", os.getenv("SCRAPE_WORKERS", 8)))
+    if not params["vendors"]:
+        return jsonify({"success": False, "error": "No hay vendedores configurados"}), 400
+    if not params["products"]:
+        return jsonify({"success": False, "error": "No se enviaron productos"}), 400
+
+    job_id = JOBS.create("scrape", params)
+    if params.get("sharded"):
+        # Repartido: tareas (vendedor, tramo de productos) en la cola; las toma cualquier worker o instancia
+        QUEUE.purge(time.time() - TASKS_TTL_S)
+        n = QUEUE.enqueue(job_id, shard_tasks(params))
+        JOBS.add_event(job_id, "log", f"Lote repartido en {n} tarea(s) de hasta {shard_size(params)} producto(s)")
+        QUEUE_WORKER.start().notify()
+    else:
+        JOB_RUNNER.submit(job_id, run_scrape_job)
+    return jsonify({"success": True, "job_id": job_id}), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = JOBS.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Trabajo inexistente"}), 404
+    job.pop("params", None)
+    return jsonify({"success": True, "job": job})
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    if not JOBS.get(job_id):
+        return jsonify({"success": False, "error": "Trabajo inexistente"}), 404
+    JOBS.cancel(job_id)
+    return jsonify({"success": True})
+
+@app.route("/api/jobs/<job_id>/stream", methods=["GET"])
+def stream_job(job_id):
+    # NDJSON por defecto; Server-Sent Events con ?format=sse o Accept: text/event-stream
+    if not JOBS.get(job_id):
+        return jsonify({"success": False, "error": "Trabajo inexistente"}), 404
+    after = int(request.args.get("after", 0))
+    sse = request.args.get("format") == "sse" or "text/event-stream" in (request.headers.get("Accept") or "")
+
+    def generate():
+        for ev in JOBS.follow(job_id, after=after):
+            line = json.dumps(ev, ensure_ascii=False)
+            yield f"id: {ev['seq']}\nevent: {ev['type']}\ndata: {line}\n\n" if sse else line + "\n"
+        job = JOBS.get(job_id) or {}
+        end = json.dumps({"type": "end", "status": job.get("status"), "summary": job.get("summary"), "error": job.get("error")}, ensure_ascii=False)
+        yield f"event: end\ndata: {end}\n\n" if sse else end + "\n"
 
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream" if sse else "application/x-ndjson", headers=headers)
+
+@app.route("/api/jobs/<job_id>/logs", methods=["GET"])
+def job_logs(job_id):
+    # Logs paginados: ?after=<next de la página anterior>&limit=
+    job = JOBS.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Trabajo inexistente"}), 404
     try:
-        sheet = client.open(sheet_name); ws = sheet.sheet1; ws.clear()
-    except Exception:
-        sheet = client.create(sheet_name); ws = sheet.sheet1
+        after, limit = int(request.args.get("after", 0)), min(int(request.args.get("limit", 500)), 5000)
+    except ValueError:
+        return jsonify({"success": False, "error": "after/limit inválidos"}), 400
+    events = JOBS.events(job_id, after=after, limit=limit, types=["log"])
+    return jsonify({"success": True, "status": job["status"], "lines": [ev["data"] for ev in events],
+                    "next": events[-1]["seq"] if events else after, "more": len(events) == limit})
 
-    ws.update("A1", values)
+# ------------------------ Historial ------------------------
+@app.route("/api/history", methods=["GET"])
+def history():
+    # ?ean= o ?marca=&modelo= (o ?producto=), opcional vendor, since/until (YYYY-MM-DD) y limit
+    args = request.args
+    product = {k: to_str(args.get(k)) for k in ("ean", "marca", "modelo", "producto") if args.get(k)}
     try:
-        ws.format("A1:Z1", {"textFormat": {"bold": True}})
-    except Exception:
-        pass
-    return jsonify({"success": True, "sheet_url": sheet.url})
+        limit = min(int(args.get("limit", 1000)), 10000)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit inválido"}), 400
+    rows = HISTORY.query(product=product or None, vendor=to_str(args.get("vendor")) or None,
+                         since=to_str(args.get("since")) or None, until=to_str(args.get("until")) or None, limit=limit)
+    # Serie por vendedor (día, precio) para comparar en el tiempo
+    series = {}
+    for r in reversed(rows):
+        series.setdefault(r["vendor"], []).append([r["day"], r["price_num"]])
+    return jsonify({"success": True, "rows": rows, "series": series})
+
+# ------------------------ Catálogo local ------------------------
+@app.route("/api/catalog", methods=["GET"])
+def catalog_stats():
+    return jsonify({"success": True, "vendors": CATALOG.stats()})
+
+@app.route("/api/catalog/build", methods=["POST"])
+def catalog_build():
+    # Arma o refresca (por lastmod) el catálogo como trabajo asíncrono: progreso en /api/jobs/<id>/stream
+    data = request.get_json(force=True, silent=True) or {}
+    params = {k: data[k] for k in ("headless", "min_delay", "max_delay", "rate_limits", "use_cache", "full", "max_pages") if k in data}
+    params["vendors"] = resolve_vendors(data)
+    if not params["vendors"]:
+        return jsonify({"success": False, "error": "No hay vendedores configurados"}), 400
+    job_id = JOBS.create("catalog", params)
+    JOB_RUNNER.submit(job_id, run_catalog_job)
+    return jsonify({"success": True, "job_id": job_id}), 202
+
+@app.route("/api/export/sheets", methods=["POST"])
+def export_sheets():
+    # Por diferencias: celdas cambiadas de filas ya exportadas (mismo producto y fecha) + filas nuevas
+    data = request.get_json(force=True, silent=False)
+    rows = data.get("rows", [])
+    exporter = SheetsExporter(sheets_client(), data.get("sheet_name", DEFAULT_SHEET)).open()
+    if not rows and not exporter.header:
+        exporter.ensure_columns(ORDERED_COLUMNS)
+    stats = exporter.export(rows)
+    return jsonify({"success": True, "sheet_url": exporter.sheet.url, **stats})
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
@@ -0,0 +1,104 @@
+# bench/bench_cards.py
+# Micro-benchmark de extracción desde cards sobre HTML guardado (bench/fixtures/*.html).
+# Compara el camino original (html.parser + cascada de selectores por card) con el actual (HtmlPage).
+#   python bench/bench_cards.py [--repeat 20]
+import re, sys, time, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bs4 import BeautifulSoup
+import scraper
+from scraper import PriceScraper, HtmlPage, CARD_SELECTORS, TITLE_SELECTORS, PRICE_CSS, PRICE_PAT
+
+FIXTURES = ROOT / "bench" / "fixtures"
+
+# ---------------- implementación original (referencia) ----------------
+def legacy_strip(text):
+    if text is None: return None
+    keep = re.sub(r"[^\d\.,]", "", str(text))
+    if "," in keep:
+        keep = keep.split(",", 1)[0]
+    else:
+        keep = re.sub(r"\.\d{1,2}\s*$", "", keep)
+    return re.sub(r"\D", "", keep) or None
+
+def legacy_norm(txt):
+    return re.sub(r"\s+", " ", txt or "").strip()
+
+def legacy_variants(term):
+    base = legacy_norm(term)
+    v = [base]
+    v2 = legacy_norm(re.sub(r"[^A-Za-z0-9 ÁÉÍÓÚÜÑáéíóúüñ\-_/\.]", " ", base))
+    if v2 and v2.lower() not in [x.lower() for x in v]: v.append(v2)
+    v3 = base.replace("/", " ").replace('"', " ").replace("'", " ")
+    if v3.lower() not in [x.lower() for x in v]: v.append(legacy_norm(v3))
+    return v
+
+def legacy_match(text, variants):
+    lt = legacy_norm(text).lower()
+    return any(all(tok in lt for tok in legacy_norm(v).lower().split()) for v in variants)
+
+def legacy_extract(soup, term):
+    variants = legacy_variants(term)
+    for cs in CARD_SELECTORS:
+        for card in soup.select(cs):
+            ctxt = card.get_text(" ", strip=True)
+            title_ok = legacy_match(ctxt, variants)
+            if not title_ok:
+                for ts in TITLE_SELECTORS:
+                    t = card.select_one(ts)
+                    if t and legacy_match(t.get_text(" ", strip=True), variants):
+                        title_ok = True; break
+            if not title_ok: continue
+            for ps in PRICE_CSS:
+                el = card.select_one(ps)
+                if el:
+                    p = legacy_strip(el.get_text(" ", strip=True))
+                    if p: return p
+            m = PRICE_PAT.search(ctxt)
+            if m:
+                p = legacy_strip(m.group(0))
+                if p: return p
+    return None
+
+def terms_for_bench():
+    # (término, precio de lista en products.txt; None si no está en las fixtures)
+    rows = [line.split("|") for line in (FIXTURES / "products.txt").read_text(encoding="utf-8").splitlines() if line]
+    picks = [rows[i] for i in (0, 7, 15, 22, 30, 35)]
+    return [(f"{b} {m}", price) for b, _, m, _, price in picks] + [("Sony XR55A80L", None), ("Heladera Inexistente 999", None)]
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); out = fn(); best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+    expected = terms_for_bench()
+    terms = [t for t, _ in expected]
+    ps = PriceScraper(use_cache=False)
+    print(f"parser actual: {scraper.HTML_PARSER} | términos por página: {len(terms)} | mejor de {args.repeat}")
+    # "correctos": precio de la card del producto (la oferta, no el precio tachado) o ND si no está
+    print(f"{'fixture':<26}{'original ms':>12}{'actual ms':>12}{'speedup':>9}  correctos (original / actual)")
+    tot_old = tot_new = 0.0
+    for path in sorted(FIXTURES.glob("*.html")):
+        html = path.read_text(encoding="utf-8")
+        # como en producción: cada término es una búsqueda, una página parseada por término
+        def old():
+            return [legacy_extract(BeautifulSoup(html, "html.parser"), t) for t in terms]
+        def new():
+            return [ps._extract_from_cards(HtmlPage(html), t) for t in terms]
+        t_old, r_old = timeit(old, args.repeat)
+        t_new, r_new = timeit(new, args.repeat)
+        tot_old += t_old; tot_new += t_new
+        ok = lambda res: sum(1 for got, (_, want) in zip(res, expected) if got == want)
+        print(f"{path.name:<26}{t_old*1000:>12.1f}{t_new*1000:>12.1f}{t_old/t_new:>8.1f}x  {ok(r_old)}/{len(terms)} {ok(r_new)}/{len(terms)}")
+    print(f"{'total':<26}{tot_old*1000:>12.1f}{tot_new*1000:>12.1f}{tot_old/tot_new:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
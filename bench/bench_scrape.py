@@ -0,0 +1,199 @@
+# bench/bench_scrape.py
+# Benchmark de punta a punta contra el servidor local de bench/stand_in.py (sin tocar sitios reales).
+# Corre scrape_all_vendors ("lib") y POST /api/scrape ("api") con lotes de 10/100/1000 productos y delay 0.
+# Cada escenario va en un subproceso con caché vacía: tiempos y pico de RSS comparables entre corridas.
+# Con --catalog cada escenario arma primero el catálogo local (sitemaps del stand-in) y scrapea con él;
+# el armado se informa aparte (pared y pedidos) y no entra en los pedidos del scrape.
+#   python bench/bench_scrape.py [--sizes 10,100,1000] [--modes lib,api] [--warm] [--catalog]
+#                                [--out bench/results/hoy.json] [--compare bench/results/base.json]
+import os, sys, json, time, shutil, argparse, resource, tempfile, threading, subprocess
+from pathlib import Path
+from typing import Dict, List
+from urllib.request import urlopen
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT)); sys.path.insert(0, str(ROOT / "bench"))
+
+STAGE_NAMES = ["fetch", "parse", "pdf", "ocr", "dataframe", "other"]
+
+# ---------------- CPU por etapa ----------------
+# Se envuelven métodos del scraper; cada etapa cuenta CPU del hilo *exclusiva* (sin las etapas anidadas).
+# "ocr" cuenta tiempo de pared: el trabajo corre en el pool de procesos.
+class Stages:
+    def __init__(self):
+        self.cpu: Dict[str, float] = {k: 0.0 for k in STAGE_NAMES}
+        self.calls: Dict[str, int] = {k: 0 for k in STAGE_NAMES}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def run(self, stage: str, fn, *a, **kw):
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [0.0]  # CPU de etapas anidadas
+        stack.append(frame)
+        c0, w0 = time.thread_time(), time.perf_counter()
+        try:
+            return fn(*a, **kw)
+        finally:
+            cpu = time.thread_time() - c0
+            stack.pop()
+            if stack: stack[-1][0] += cpu
+            spent = (time.perf_counter() - w0) if stage == "ocr" else cpu - frame[0]
+            with self._lock:
+                self.cpu[stage] += spent; self.calls[stage] += 1
+
+STAGES = None   # Stages de la pasada en curso
+
+def instrument():
+    # Una sola vez por proceso; cada envoltura reporta a STAGES
+    import scraper
+    def wrap(owner, attr: str, stage: str):
+        orig = getattr(owner, attr)
+        def wrapper(*a, **kw):
+            return STAGES.run(stage, orig, *a, **kw)
+        setattr(owner, attr, wrapper)
+    wrap(scraper.HttpClient, "get", "fetch")
+    for m in ("_try_vtex", "_try_magento_html", "_try_wordpress", "_try_generic", "_try_brochures"):
+        wrap(scraper.PriceScraper, m, "parse")   # la estrategia menos sus descargas
+    wrap(scraper.PriceScraper, "_pdf_text_from_url", "pdf")
+    wrap(scraper.PriceScraper, "_pdf_ocr_pages", "ocr")
+
+# ---------------- un escenario (subproceso) ----------------
+def server_stats(vendors: Dict[str, str], reset: bool = False) -> Dict[str, Dict]:
+    path = "/__bench/reset" if reset else "/__bench/stats"
+    return {vn: json.loads(urlopen(url + path, timeout=10).read()) for vn, url in vendors.items()}
+
+def build_catalog(vendors: Dict[str, str], rate_limits: Dict) -> Dict:
+    from catalog import CatalogStore
+    from scraper import PriceScraper
+    server_stats(vendors, reset=True)
+    t0 = time.perf_counter()
+    ps = PriceScraper(delay_range=(0, 0), rate_limits=rate_limits, max_workers=len(vendors), catalog=CatalogStore())
+    result, _ = ps.build_catalog(vendors)
+    return {"wall_s": round(time.perf_counter() - t0, 3), "requests": sum(st["requests"] for st in server_stats(vendors).values()),
+            "pages": sum((r.get("pages") or {}).get("ok", 0) for r in result.values())}
+
+def run_once(mode: str, size: int, vendors: Dict[str, str], rate_limits: Dict, label: str, catalog_built: Dict = None) -> Dict:
+    global STAGES
+    from stand_in import VENDORS, Vendor, batch, catalog
+    products = batch(size)
+    # precio real de cada (vendedor, producto) en el catálogo del stand-in ("" si el vendedor no lo tiene)
+    items = catalog(size)
+    truth = {name: {it["model"]: str(it["price"]) for it in Vendor(name, platform, opts, items).items} for name, platform, opts in VENDORS}
+    stages = STAGES = Stages()
+    server_stats(vendors, reset=True)
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    if mode == "lib":
+        from scraper import PriceScraper
+        from catalog import CatalogStore
+        ps = PriceScraper(delay_range=(0, 0), rate_limits=rate_limits, max_workers=len(vendors), catalog=CatalogStore() if catalog_built else None)
+        df, _ = stages.run("dataframe", ps.scrape_all_vendors, products, vendors, return_logs=True)
+        rows = df.to_dict(orient="records")
+    else:
+        import app
+        payload = {"products": products, "vendors": vendors, "rate_limits": rate_limits, "min_delay": 0, "max_delay": 0, "max_workers": len(vendors)}
+        client = app.app.test_client()
+        resp = stages.run("dataframe", client.post, "/api/scrape", json=payload)
+        rows = resp.get_json()["rows"]
+    wall = time.perf_counter() - t0
+    cpu_total = time.process_time() - cpu0
+    stages.cpu["other"] = max(0.0, cpu_total - sum(v for k, v in stages.cpu.items() if k != "ocr"))
+    srv = server_stats(vendors)
+    status: Dict[str, int] = {}
+    for st in srv.values():
+        for code, n in st["status"].items(): status[code] = status.get(code, 0) + n
+    cells = [r.get(f"{vn} (num)") for r in rows for vn in vendors]
+    wrong = sum(1 for p, r in zip(products, rows) for vn in vendors if r.get(f"{vn} (num)") and r[f"{vn} (num)"] != truth.get(vn, {}).get(p["modelo"]))
+    return {
+        "scenario": f"{mode}/{size}" + ("/catalogo" if catalog_built else "") + (f"/{label}" if label != "cold" else ""),
+        "mode": mode, "size": size, "pass": label,
+        "wall_s": round(wall, 3), "cpu_s": round(cpu_total, 3),
+        "requests": sum(st["requests"] for st in srv.values()), "status": status,
+        "bytes": sum(st["bytes"] for st in srv.values()),
+        "stages_cpu_s": {k: round(v, 3) for k, v in stages.cpu.items()},
+        "found": sum(1 for c in cells if c), "wrong": wrong, "cells": len(cells),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "per_vendor_requests": {vn: st["requests"] for vn, st in srv.items()},
+        **({"catalog": catalog_built} if catalog_built else {}),
+    }
+
+def child(mode: str, size: int, vendors: Dict[str, str], rate_limits: Dict, warm: bool, with_catalog: bool):
+    # el catálogo se arma antes de instrumentar: sus descargas no cuentan como etapas del scrape
+    built = build_catalog(vendors, rate_limits) if with_catalog else None
+    instrument()
+    out = [run_once(mode, size, vendors, rate_limits, "cold", built)]
+    if warm:
+        out.append(run_once(mode, size, vendors, rate_limits, "warm", built))
+    print(json.dumps(out), flush=True)
+
+# ---------------- driver ----------------
+def fmt_row(r: Dict) -> str:
+    st = r["stages_cpu_s"]
+    errs = "/".join(str(r["status"].get(c, 0)) for c in ("403", "429"))
+    return (f"{r['scenario']:<16}{r['wall_s']:>9.2f}{r['cpu_s']:>8.2f}{r['requests']:>8}{errs:>9}"
+            + "".join(f"{st.get(k, 0):>10.2f}" for k in STAGE_NAMES)
+            + f"{r['peak_rss_mb']:>9.1f}{r['found']:>7}/{r['cells']}{r.get('wrong', 0):>8}")
+
+def compare(results: List[Dict], base_path: Path):
+    base = {r["scenario"]: r for r in json.loads(base_path.read_text(encoding="utf-8"))["results"]}
+    print(f"\nvs {base_path}:")
+    for r in results:
+        b = base.get(r["scenario"])
+        if not b: continue
+        ratio = lambda k: (b[k] / r[k]) if r[k] else float("inf")
+        print(f"  {r['scenario']:<16} wall {b['wall_s']:.2f}s -> {r['wall_s']:.2f}s ({ratio('wall_s'):.2f}x)  "
+              f"cpu {b['cpu_s']:.2f}s -> {r['cpu_s']:.2f}s  pedidos {b['requests']} -> {r['requests']}  "
+              f"RSS {b['peak_rss_mb']} -> {r['peak_rss_mb']} MB  precios {b['found']} -> {r['found']}  "
+              f"erróneos {b.get('wrong', '?')} -> {r.get('wrong', '?')}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--modes", default="lib,api")
+    ap.add_argument("--warm", action="store_true", help="segunda pasada con la caché de la primera")
+    ap.add_argument("--catalog", action="store_true", help="armar el catálogo local (sitemaps) antes de scrapear")
+    ap.add_argument("--out", help="guardar resultados (JSON)")
+    ap.add_argument("--compare", help="resultados previos (JSON) para comparar")
+    ap.add_argument("--child", nargs=2, metavar=("MODE", "SIZE"), help=argparse.SUPPRESS)
+    ap.add_argument("--vendors", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        cfg = json.loads(args.vendors)
+        return child(args.child[0], int(args.child[1]), cfg["vendors"], cfg["rate_limits"], args.warm, args.catalog)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    modes = [x for x in args.modes.split(",") if x]
+    server = subprocess.Popen([sys.executable, str(ROOT / "bench" / "stand_in.py"), "--products", str(max(sizes))],
+                              stdout=subprocess.PIPE, text=True)
+    results: List[Dict] = []
+    try:
+        cfg = server.stdout.readline()
+        print(f"stand-in: {', '.join(f'{k}={v}' for k, v in json.loads(cfg)['vendors'].items())}")
+        print(f"{'escenario':<16}{'pared s':>9}{'cpu s':>8}{'pedidos':>8}{'403/429':>9}"
+              + "".join(f"{k:>10}" for k in STAGE_NAMES) + f"{'RSS MB':>9}{'precios':>11}{'erróneos':>9}")
+        for mode in modes:
+            for size in sizes:
+                tmp = tempfile.mkdtemp(prefix="bench-scrape-")
+                env = {**os.environ, "SCRAPER_CACHE_DIR": tmp, "SELECTORS_FILE": os.path.join(tmp, "SELECTORES.json")}
+                try:
+                    p = subprocess.run([sys.executable, __file__, "--child", mode, str(size), "--vendors", cfg] + (["--warm"] if args.warm else []) + (["--catalog"] if args.catalog else []),
+                                       env=env, cwd=str(ROOT), capture_output=True, text=True)
+                finally:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                if p.returncode != 0:
+                    print(f"{mode}/{size}: error\n{p.stderr[-2000:]}"); continue
+                for r in json.loads(p.stdout.strip().splitlines()[-1]):
+                    results.append(r); print(fmt_row(r))
+                if args.catalog and results and "catalog" in results[-1]:
+                    c = results[-1]["catalog"]
+                    print(f"{'':<16}catálogo: {c['wall_s']:.2f}s, {c['requests']} pedidos, {c['pages']} fichas")
+    finally:
+        server.terminate(); server.wait()
+    meta = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "when": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"meta": meta, "results": results}, indent=1), encoding="utf-8")
+    if args.compare:
+        compare(results, Path(args.compare))
+
+if __name__ == "__main__":
+    main()
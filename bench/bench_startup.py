@@ -0,0 +1,182 @@
+# bench/bench_startup.py
+# Arranque en frío de la app: cada corrida es `python -X importtime` en un subproceso con caché vacía.
+# Mide el import de app (pared y suma de -X importtime), el primer /api/health, RSS tras importar y tras atender
+# /api/health + /api/vendors, qué dependencias pesadas quedaron cargadas y los imports directos de app más caros.
+# Con --gunicorn (si está instalado) levanta gunicorn -c gunicorn.conf.py con y sin GUNICORN_PRELOAD y mide el
+# tiempo hasta el primer /api/health y RSS/PSS del master y de cada worker.
+#   python bench/bench_startup.py [--runs 5] [--top 15] [--gunicorn] [--workers 2]
+#                                 [--out bench/results/arranque.json] [--compare bench/results/base.json]
+import os, sys, json, time, shutil, socket, argparse, statistics, tempfile, subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.request import urlopen
+
+ROOT = Path(__file__).resolve().parents[1]
+
+HEAVY = ["pandas", "numpy", "pdfminer", "bs4", "soupsieve", "gspread", "oauth2client", "curl_cffi", "pypdfium2", "PIL", "pytesseract", "lxml"]
+
+def proc_kb(pid, field: str, name: str = "status") -> Optional[int]:
+    # VmRSS de /proc/<pid>/status o Pss de /proc/<pid>/smaps_rollup (Linux), en kB
+    try:
+        for line in Path(f"/proc/{pid}/{name}").read_text().splitlines():
+            if line.startswith(field + ":"): return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def mb(kb: Optional[int]) -> Optional[float]:
+    return round(kb / 1024, 1) if kb is not None else None
+
+# ---------------- una corrida (subproceso con -X importtime) ----------------
+def child():
+    sys.path.insert(0, str(ROOT))
+    t0 = time.perf_counter()
+    import app
+    import_s = time.perf_counter() - t0
+    rss_import = proc_kb("self", "VmRSS")
+    client = app.app.test_client()
+    t1 = time.perf_counter()
+    client.get("/api/health")
+    first_s = time.perf_counter() - t1
+    client.get("/api/vendors")
+    print(json.dumps({"import_s": round(import_s, 4), "first_request_s": round(first_s, 4),
+                      "rss_import_mb": mb(rss_import), "rss_served_mb": mb(proc_kb("self", "VmRSS")),
+                      "heavy": [m for m in HEAVY if m in sys.modules]}), flush=True)
+
+def parse_importtime(stderr: str, root: str = "app") -> Dict:
+    # "import time:  self [us] | cumulative | imported package": los hijos se listan antes que el padre y el nivel
+    # es la sangría del nombre. Se toma el bloque de `root` (sin los imports del propio benchmark)
+    total, direct, pending = 0, {}, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line: continue
+        _, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            pending[name.strip()] = int(cum_us)
+        elif depth == 0:
+            if name.strip() == root:
+                total, direct = int(cum_us), pending
+            pending = {}
+    return {"importtime_s": round(total / 1e6, 4), "top": direct}
+
+def run_import(env: Dict) -> Dict:
+    p = subprocess.run([sys.executable, "-X", "importtime", __file__, "--child"], env=env, cwd=str(ROOT), capture_output=True, text=True)
+    if p.returncode != 0: raise RuntimeError(p.stderr[-2000:])
+    out = json.loads(p.stdout.strip().splitlines()[-1])
+    return {**out, **parse_importtime(p.stderr)}
+
+def import_scenario(runs: int) -> Dict:
+    res = []
+    for _ in range(runs):
+        tmp = tempfile.mkdtemp(prefix="bench-startup-")
+        try:
+            res.append(run_import({**os.environ, "SCRAPER_CACHE_DIR": tmp, "QUEUE_WORKERS": "0"}))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    med = lambda k: round(statistics.median(r[k] for r in res), 4)
+    top: Dict[str, List[int]] = {}
+    for r in res:
+        for name, us in r["top"].items(): top.setdefault(name, []).append(us)
+    return {"scenario": "import", "runs": runs, "import_s": med("import_s"), "importtime_s": med("importtime_s"),
+            "first_request_s": med("first_request_s"), "rss_import_mb": med("rss_import_mb"), "rss_served_mb": med("rss_served_mb"),
+            "heavy": res[-1]["heavy"], "top_ms": {k: round(statistics.median(v) / 1000, 1) for k, v in top.items()}}
+
+# ---------------- gunicorn ----------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+def children(pid: int) -> List[int]:
+    try:
+        return [int(x) for x in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+    except OSError:
+        return []
+
+def gunicorn_scenario(preload: bool, workers: int, timeout_s: float = 60) -> Dict:
+    port, tmp = free_port(), tempfile.mkdtemp(prefix="bench-startup-")
+    env = {**os.environ, "SCRAPER_CACHE_DIR": tmp, "PORT": str(port), "WORKERS": str(workers), "GUNICORN_PRELOAD": "1" if preload else "0"}
+    t0 = time.perf_counter()
+    p = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:app"],
+                         env=env, cwd=str(ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        ready = None
+        while time.perf_counter() - t0 < timeout_s and p.poll() is None:
+            try:
+                if urlopen(f"http://127.0.0.1:{port}/api/health", timeout=2).status == 200:
+                    ready = time.perf_counter() - t0; break
+            except OSError:
+                time.sleep(0.02)
+        if ready is None: raise RuntimeError((p.stderr.read() if p.poll() is not None else "timeout")[-2000:])
+        while len(children(p.pid)) < workers and time.perf_counter() - t0 < timeout_s: time.sleep(0.05)
+        all_ready = time.perf_counter() - t0
+        for _ in range(4 * workers): urlopen(f"http://127.0.0.1:{port}/api/vendors", timeout=5).read()
+        kids = children(p.pid)
+        return {"scenario": f"gunicorn/{'preload' if preload else 'sin-preload'}", "workers": workers,
+                "first_health_s": round(ready, 3), "all_workers_s": round(all_ready, 3),
+                "master_rss_mb": mb(proc_kb(p.pid, "VmRSS")),
+                "worker_rss_mb": [mb(proc_kb(k, "VmRSS")) for k in kids],
+                "worker_pss_mb": [mb(proc_kb(k, "Pss", "smaps_rollup")) for k in kids]}
+    finally:
+        p.terminate()
+        try: p.wait(10)
+        except subprocess.TimeoutExpired: p.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+# ---------------- driver ----------------
+def compare(results: List[Dict], base_path: Path):
+    base = {r["scenario"]: r for r in json.loads(base_path.read_text(encoding="utf-8"))["results"]}
+    print(f"\nvs {base_path}:")
+    for r in results:
+        b = base.get(r["scenario"])
+        if not b: continue
+        keys = [k for k in ("import_s", "importtime_s", "first_request_s", "rss_served_mb", "first_health_s", "all_workers_s", "master_rss_mb") if k in r and k in b]
+        print(f"  {r['scenario']:<22}" + "  ".join(f"{k} {b[k]} -> {r[k]}" for k in keys))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="imports directos de app a listar")
+    ap.add_argument("--gunicorn", action="store_true", help="medir también gunicorn con y sin precarga")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--out", help="guardar resultados (JSON)")
+    ap.add_argument("--compare", help="resultados previos (JSON) para comparar")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child()
+
+    results: List[Dict] = []
+    r = import_scenario(args.runs)
+    results.append(r)
+    print(f"import app ({r['runs']} corridas, mediana): {r['import_s']:.3f}s pared, {r['importtime_s']:.3f}s -X importtime, "
+          f"primer /api/health {r['first_request_s'] * 1000:.1f} ms")
+    print(f"RSS: {r['rss_import_mb']} MB tras importar, {r['rss_served_mb']} MB tras /api/health + /api/vendors")
+    print(f"dependencias pesadas cargadas: {', '.join(r['heavy']) or 'ninguna'}")
+    print("imports directos de app más caros (ms acumulados):")
+    for name, ms in sorted(r["top_ms"].items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {name:<28}{ms:>9.1f}")
+
+    if args.gunicorn:
+        from importlib.util import find_spec
+        if find_spec("gunicorn") is None:
+            print("\ngunicorn no está instalado: se omite --gunicorn")
+        else:
+            print(f"\n{'escenario':<24}{'1er health s':>13}{'workers s':>11}{'master MB':>11}   RSS / PSS por worker (MB)")
+            for preload in (False, True):
+                try:
+                    g = gunicorn_scenario(preload, args.workers)
+                except RuntimeError as e:
+                    print(f"gunicorn preload={preload}: error\n{e}"); continue
+                results.append(g)
+                per = ", ".join(f"{a}/{b}" for a, b in zip(g["worker_rss_mb"], g["worker_pss_mb"]))
+                print(f"{g['scenario']:<24}{g['first_health_s']:>13.2f}{g['all_workers_s']:>11.2f}{g['master_rss_mb']:>11}   {per}")
+
+    meta = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "when": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"meta": meta, "results": results}, indent=1), encoding="utf-8")
+    if args.compare:
+        compare(results, Path(args.compare))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# bench/stand_in.py
+# Servidor local que imita a los vendedores (VTEX JSON, Magento y WooCommerce HTML, folleto PDF, 403/429)
+# con un catálogo sintético determinístico. Un servidor (host propio) por vendedor, así el rate limit por host
+# se comporta como con sitios reales.
+#   python bench/stand_in.py [--products 1000]   -> imprime {"vendors": {...}} y queda escuchando
+import re, gzip, json, zlib, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+SEED = 7
+BRANDS = ["Samsung","LG","Whirlpool","Drean","Philco","BGH","Electrolux","Gafa","Patrick","Noblex","Atma","Liliana"]
+KINDS = [("Heladera","No Frost {c}L"),("Lavarropas","Carga Frontal {k}Kg"),("Smart TV","{p}\" 4K UHD"),
+         ("Aire Acondicionado","Split {f} Frigorías"),("Microondas","{l}L Digital"),("Cocina","{h} Hornallas")]
+PAGE_SIZE = 24
+
+# (nombre, plataforma, opciones). Los nombres no coinciden con los vendedores reales: el orden de estrategias
+# se aprende igual que con un sitio nuevo.
+VENDORS = [
+    ("TiendaVtex", "vtex", {}),
+    ("TiendaMagento", "magento", {}),
+    ("TiendaWoo", "woo", {}),
+    ("Vital", "woo", {"brochure": True}),                 # folletos primero (ver _detect_platform_order)
+    ("Limitado", "magento", {"status": 429, "every": 7}),  # 429 con Retry-After: 0 cada 7 pedidos
+    ("Bloqueado", "magento", {"status": 403, "every": 4}), # WAF intermitente: 403 cada 4 pedidos
+]
+# Backoff corto para 403/429: el benchmark mide el scraper, no los sleeps
+RATE_LIMITS = {"Limitado": {"backoff_base": 0.02, "backoff_max": 0.1}, "Bloqueado": {"backoff_base": 0.02, "backoff_max": 0.1}}
+
+def fmt(p: int) -> str:
+    return f"$ {p:,}".replace(",", ".") + ",00"
+
+def tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+def catalog(n: int) -> List[Dict]:
+    # Mismo seed -> mismo catálogo en el servidor y en el driver
+    rnd = random.Random(SEED)
+    out, seen = [], set()
+    while len(out) < n:
+        b = rnd.choice(BRANDS); k, tpl = rnd.choice(KINDS)
+        model = f"{b[:2].upper()}{rnd.randint(10,99)}{rnd.choice('ABCDEFGHJK')}{rnd.randint(100,999)}"
+        if model in seen: continue
+        seen.add(model)
+        desc = tpl.format(c=rnd.choice([300,350,382,410]), k=rnd.choice([6,7,8,9]), p=rnd.choice([32,43,50,55,65]),
+                          f=rnd.choice([2250,3000,4500]), l=rnd.choice([20,25,28]), h=rnd.choice([4,5]))
+        out.append({"brand": b, "kind": k, "model": model, "desc": desc,
+                    "price": rnd.randint(80, 2500) * 1000 + rnd.choice([0, 999, 499]),
+                    "ean": f"779{rnd.randint(10**9, 10**10 - 1)}"})
+    return out
+
+def batch(n: int) -> List[Dict]:
+    # Productos como los manda la UI; la mitad con EAN
+    return [{"producto": f"{p['kind']} {p['desc']}", "marca": p["brand"], "modelo": p["model"], "capacidad": "",
+             "ean": p["ean"] if i % 2 == 0 else ""} for i, p in enumerate(catalog(n))]
+
+def _noise(n: int = 40) -> Tuple[str, str]:
+    nav = "".join(f'<li class="nav-item level{j%3}"><a href="/categoria/{j}" class="nav-link">Categoría {j} <span class="badge">Nuevo</span></a><ul class="submenu">'
+                  + "".join(f'<li><a href="/c/{j}/{q}">Sub {q}</a></li>' for q in range(6)) + '</ul></li>' for j in range(n))
+    script = '<script type="application/json">{"config":{' + ",".join(f'"k{j}":"{"x"*40}"' for j in range(200)) + '}}</script>'
+    footer = '<footer class="page-footer">' + "".join(f'<div class="footer-col"><h3>Ayuda {j}</h3><ul>' + "".join(f'<li><a href="/ayuda/{j}/{q}">Link {q}</a></li>' for q in range(10)) + '</ul></div>' for j in range(6)) + '</footer>'
+    return f'<header class="page-header"><div class="panel wrapper"><ul class="header links">{nav}</ul></div></header>{script}', footer
+HEADER, FOOTER = _noise()
+
+def magento_card(it: Dict) -> str:
+    m, p = it["model"], it["price"]
+    return (f'<li class="item product product-item"><div class="product-item-info"><a href="/{m.lower()}.html" class="product photo product-item-photo">'
+            f'<img class="product-image-photo" src="/media/{m}.jpg" alt="{it["kind"]} {it["brand"]} {m}"/></a><div class="product details product-item-details">'
+            f'<strong class="product name product-item-name"><a class="product-item-link" href="/{m.lower()}.html">{it["kind"]} {it["brand"]} {it["desc"]} {m}</a></strong>'
+            f'<div class="price-box price-final_price"><span class="price-container"><span class="price-wrapper" data-price-amount="{p}"><span class="price">{fmt(p)}</span></span></span></div>'
+            f'<div class="product-item-inner"><div class="product actions product-item-actions"><button class="action tocart primary">Agregar al carrito</button></div>'
+            f'<ul class="cuotas"><li>12 cuotas sin interés de {fmt(p // 12)}</li></ul></div></div></div></li>')
+
+def woo_card(it: Dict) -> str:
+    m, p = it["model"], it["price"]
+    num = lambda v: f"{v:,}".replace(",", ".")
+    return (f'<li class="product type-product status-publish instock product_cat-electro purchasable product-type-simple"><a href="/producto/{m.lower()}/" class="woocommerce-LoopProduct-link">'
+            f'<img src="/wp-content/uploads/{m}.jpg" class="attachment-woocommerce_thumbnail"/><h2 class="woocommerce-loop-product__title">{it["kind"]} {it["brand"]} {m} {it["desc"]}</h2>'
+            f'<span class="price"><del><span class="woocommerce-Price-amount amount"><bdi><span class="woocommerce-Price-currencySymbol">$</span>{num(p + p // 10)}</bdi></span></del> '
+            f'<ins><span class="woocommerce-Price-amount amount"><bdi><span class="woocommerce-Price-currencySymbol">$</span>{num(p)}</bdi></span></ins></span></a>'
+            f'<a href="?add-to-cart={p}" class="button add_to_cart_button">Añadir al carrito</a></li>')
+
+def vtex_product(it: Dict) -> Dict:
+    return {"productId": it["model"], "productName": f'{it["kind"]} {it["brand"]} {it["model"]} {it["desc"]}', "brand": it["brand"],
+            "items": [{"itemId": it["model"] + "-1", "name": it["desc"], "ean": it["ean"],
+                       "sellers": [{"commertialOffer": {"Price": float(it["price"]), "AvailableQuantity": 10}}]}]}
+
+# Fichas y sitemaps (para catalog.py): VTEX y WooCommerce publican JSON-LD, Magento microdatos
+LASTMOD = "2026-10-01"
+
+def product_path(platform: str, it: Dict) -> str:
+    m = it["model"].lower()
+    return {"vtex": f"/{m}/p", "magento": f"/{m}.html", "woo": f"/producto/{m}/"}[platform]
+
+def product_page(platform: str, it: Dict) -> str:
+    title = f'{it["kind"]} {it["brand"]} {it["model"]} {it["desc"]}'
+    if platform == "magento":
+        return (f'<div class="product-info-main" itemscope itemtype="http://schema.org/Product"><h1 class="page-title"><span itemprop="name">{title}</span></h1>'
+                f'<meta itemprop="sku" content="{it["model"]}"/><div class="price-box" itemprop="offers" itemscope itemtype="http://schema.org/Offer">'
+                f'<meta itemprop="price" content="{it["price"]}"/><span class="price">{fmt(it["price"])}</span></div></div>')
+    ld = {"@context": "https://schema.org", "@type": "Product", "name": title, "brand": {"@type": "Brand", "name": it["brand"]},
+          "sku": it["model"] if platform == "woo" else it["model"] + "-1", "gtin13": it["ean"],
+          "offers": {"@type": "AggregateOffer", "lowPrice": it["price"], "priceCurrency": "ARS"} if platform == "vtex"
+                    else {"@type": "Offer", "price": f'{it["price"]}.00', "priceCurrency": "ARS"}}
+    return f'<script type="application/ld+json">{json.dumps(ld)}</script><h1 class="product_title">{title}</h1><p class="price">{fmt(it["price"])}</p>'
+
+def urlset(urls: List[str], lastmod: str = LASTMOD) -> str:
+    return ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + "".join(f"<url><loc>{u}</loc><lastmod>{lastmod}</lastmod></url>" for u in urls) + "</urlset>")
+
+def sitemap_index(urls: List[str], lastmod: str = LASTMOD) -> str:
+    return ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + "".join(f"<sitemap><loc>{u}</loc><lastmod>{lastmod}</lastmod></sitemap>" for u in urls) + "</sitemapindex>")
+
+def make_pdf(lines: List[str], per_page: int = 50) -> bytes:
+    # PDF mínimo con texto (Helvetica): pdfminer lo extrae sin OCR
+    pages = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+    esc = lambda t: t.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>",
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode(),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    for i, pl in enumerate(pages):
+        stream = "\n".join(["BT", "/F1 10 Tf", "14 TL", "40 810 Td"] + [f"({esc(l)}) '" for l in pl] + ["ET"]).encode("cp1252", "replace")
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out, offs = bytearray(b"%PDF-1.4\n"), []
+    for k, body in enumerate(objs, 1):
+        offs.append(len(out)); out += b"%d 0 obj\n" % k + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1) + b"".join(b"%010d 00000 n \n" % o for o in offs)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return bytes(out)
+
+class Vendor:
+    def __init__(self, name: str, platform: str, opts: Dict, items: List[Dict]):
+        self.name = name; self.platform = platform; self.opts = opts
+        # Cada vendedor: ~10% del catálogo sin stock y precios propios (determinísticos)
+        self.items = []
+        for it in items:
+            h = zlib.crc32(f"{name}|{it['model']}".encode())
+            if h % 10 == 0: continue
+            self.items.append({**it, "price": it["price"] + (h % 9) * 1000})
+        self.index: Dict[str, set] = {}
+        for i, it in enumerate(self.items):
+            for t in tokens(f"{it['kind']} {it['brand']} {it['model']} {it['desc']} {it['ean']}"):
+                self.index.setdefault(t, set()).add(i)
+        self.by_ean = {it["ean"]: it for it in self.items}
+        self.by_path = {product_path(platform, it): it for it in self.items}
+        self.pdf = make_pdf([f"{it['kind']} {it['brand']} {it['model']} {it['desc']} {fmt(it['price'])}" for it in self.items[::3]]) if opts.get("brochure") else None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0; self.status: Dict[str, int] = {}; self.bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"requests": self.requests, "status": dict(self.status), "bytes": self.bytes}
+
+    def count(self, status: int, size: int) -> bool:
+        # Devuelve True si a este pedido le toca el error configurado (403/429)
+        with self._lock:
+            self.requests += 1
+            every = self.opts.get("every")
+            fail = bool(every) and self.requests % every == 0
+            code = str(self.opts["status"] if fail else status)
+            self.status[code] = self.status.get(code, 0) + 1
+            self.bytes += 0 if fail else size
+            return fail
+
+    def search(self, q: str) -> List[Dict]:
+        toks = tokens(q)
+        if not toks: return []
+        hits = set.intersection(*(self.index.get(t, set()) for t in toks))
+        return [self.items[i] for i in sorted(hits)]
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, como un sitio real
+
+    def log_message(self, *a):
+        pass
+
+    def send(self, status: int, body, ctype: str = "text/html; charset=utf-8", headers: Optional[Dict] = None, count: bool = True):
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        v: Vendor = self.server.vendor
+        headers = dict(headers or {})
+        # gzip si el cliente lo pide (como cualquier CDN); los bytes contados son los transferidos
+        if len(body) > 1024 and ctype != "application/pdf" and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, 5); headers["Content-Encoding"] = "gzip"
+        if count and v.count(status, len(body)):
+            status, body, ctype = v.opts["status"], b"<html><body>Access denied</body></html>", "text/html"
+            headers = {"Retry-After": "0"} if status == 429 else {}
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, val in headers.items(): self.send_header(k, val)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, inner: str, head: str = "", body_class: str = "") -> str:
+        # body_class: la que ponen las plataformas en la búsqueda (Magento: catalogsearch-result-index, WordPress: search-no-results)
+        return f'<!doctype html><html><head><title>{self.server.vendor.name}</title>{head}</head><body class="{body_class}">{HEADER}<main>{inner}</main>{FOOTER}</body></html>'
+
+    def do_GET(self):
+        v: Vendor = self.server.vendor
+        u = urlsplit(self.path); q = parse_qs(u.query)
+        if u.path == "/__bench/stats":
+            return self.send(200, json.dumps(v.stats()), "application/json", count=False)
+        if u.path == "/__bench/reset":
+            v.reset(); return self.send(200, "{}", "application/json", count=False)
+        base = f"http://{self.headers.get('Host')}"
+        if v.platform == "vtex" and u.path == "/api/catalog_system/pub/products/search":
+            eans = [x.split(":", 1)[1] for x in q.get("fq", []) if x.startswith("alternateIds_Ean:")]
+            found = [v.by_ean[e] for e in eans if e in v.by_ean] if eans else v.search(q.get("ft", [""])[0])
+            lo = int(q.get("_from", [0])[0]); hi = int(q.get("_to", [lo + 9])[0])
+            return self.send(200, json.dumps([vtex_product(it) for it in found[lo:hi + 1]]), "application/json; charset=utf-8")
+        if v.platform == "magento" and u.path.rstrip("/") == "/catalogsearch/result":
+            cards = "".join(magento_card(it) for it in v.search(q.get("q", [""])[0])[:PAGE_SIZE])
+            inner = f'<ol class="products list items product-items">{cards}</ol>' if cards else '<div class="message notice"><div>La búsqueda no devolvió resultados.</div></div>'
+            return self.send(200, self.page(inner, '<script type="text/x-magento-init">{}</script>', "catalogsearch-result-index page-products"))
+        if v.platform == "woo" and u.path == "/" and "s" in q:
+            cards = "".join(woo_card(it) for it in v.search(q["s"][0])[:PAGE_SIZE])
+            inner = f'<ul class="products columns-4">{cards}</ul>' if cards else '<p class="woocommerce-info">No se encontraron productos.</p>'
+            return self.send(200, self.page(inner, '<link rel="stylesheet" href="/wp-content/themes/x/style.css"/>', "search " + ("search-results" if cards else "search-no-results")))
+        if u.path == "/":
+            head = {"vtex": "<script>window.__RUNTIME__={}</script>", "magento": '<script type="text/x-magento-init">{}</script>',
+                    "woo": '<link rel="stylesheet" href="/wp-content/themes/x/style.css"/>'}[v.platform]
+            inner = f'<form role="search" class="search-form" action="{base}/"><input name="s"/></form>' if v.platform == "woo" else ""
+            if v.pdf: inner += '<a href="/folletos/ofertas-semana.pdf">Folleto de ofertas</a>'
+            return self.send(200, self.page(inner, head))
+        # sitemaps como los de cada plataforma: VTEX índice -> product-N.xml, WooCommerce robots.txt -> índice de Yoast,
+        # Magento un único sitemap.xml con categorías y productos mezclados
+        xml = "application/xml; charset=utf-8"
+        products = [base + path for path in v.by_path]
+        if u.path == "/robots.txt":
+            return self.send(200, "User-agent: *\n" + (f"Sitemap: {base}/sitemap_index.xml\n" if v.platform == "woo" else ""), "text/plain")
+        if v.platform == "vtex" and u.path == "/sitemap.xml":
+            return self.send(200, sitemap_index([f"{base}/sitemap/product-{k}.xml" for k in range(0, len(products), 500)] + [f"{base}/sitemap/category-0.xml"]), xml)
+        if v.platform == "vtex" and u.path.startswith("/sitemap/product-"):
+            k = int(u.path.rsplit("-", 1)[1].split(".")[0])
+            return self.send(200, urlset(products[k:k + 500]), xml)
+        if v.platform == "vtex" and u.path == "/sitemap/category-0.xml":
+            return self.send(200, urlset([f"{base}/heladeras", f"{base}/lavarropas"]), xml)
+        if v.platform == "woo" and u.path == "/sitemap_index.xml":
+            return self.send(200, sitemap_index([f"{base}/product-sitemap.xml", f"{base}/page-sitemap.xml"]), xml)
+        if v.platform == "woo" and u.path == "/product-sitemap.xml":
+            return self.send(200, urlset(products), xml)
+        if v.platform == "woo" and u.path == "/page-sitemap.xml":
+            return self.send(200, urlset([f"{base}/contacto/", f"{base}/sucursales/"]), xml)
+        if v.platform == "magento" and u.path == "/sitemap.xml":
+            return self.send(200, urlset([f"{base}/heladeras.html", f"{base}/lavarropas.html"] + products), xml)
+        if u.path in v.by_path:
+            return self.send(200, self.page(product_page(v.platform, v.by_path[u.path])))
+        if v.pdf and u.path == "/folletos/ofertas-semana.pdf":
+            return self.send(200, v.pdf, "application/pdf")
+        return self.send(404, self.page("<h1>404</h1>"))
+
+def start(n_products: int = 1000) -> Dict[str, str]:
+    # Un servidor por vendedor en 127.0.0.x distintos (en Linux todo 127/8 es loopback); si no, puertos distintos
+    items = catalog(n_products)
+    urls = {}
+    for k, (name, platform, opts) in enumerate(VENDORS):
+        for host in (f"127.0.0.{10 + k}", "127.0.0.1"):
+            try:
+                srv = ThreadingHTTPServer((host, 0), Handler); break
+            except OSError:
+                continue
+        srv.daemon_threads = True
+        srv.vendor = Vendor(name, platform, opts, items)
+        threading.Thread(target=srv.serve_forever, daemon=True, name=f"stand-in-{name}").start()
+        urls[name] = f"http://{host}:{srv.server_address[1]}"
+    return urls
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", type=int, default=1000)
+    args = ap.parse_args()
+    print(json.dumps({"vendors": start(args.products), "rate_limits": RATE_LIMITS}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# brochure_index.py
+# Índice invertido de folletos: token normalizado -> precios cercanos (ventana de ±200 caracteres)
+import os, re, hashlib, threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+BROCHURE_TEXT_DIR = Path(os.getenv("BROCHURE_TEXT_DIR", CACHE_DIR / "folletos"))
+
+TOKEN_RE = re.compile(r"[0-9a-záéíóúüñ]+")
+
+def tokens(text: str) -> List[str]:
+    return TOKEN_RE.findall((text or "").lower())
+
+class BrochureIndex:
+    def __init__(self, price_pat: re.Pattern, to_digits: Callable[[str], Optional[str]], window: int = 200):
+        self.price_pat = price_pat
+        self.to_digits = to_digits
+        self.window = window
+        self.prices: List[Tuple[str, int, str]] = []   # (url, posición, precio entero)
+        self.index: Dict[str, Set[int]] = {}
+
+    def add(self, url: str, text: str):
+        tl = (text or "").lower()
+        for m in self.price_pat.finditer(text or ""):
+            # descarta números pegados a un código ("RT38") o demasiado cortos para ser precio
+            if m.start() > 0 and text[m.start() - 1].isalnum(): continue
+            p = self.to_digits(m.group(0))
+            if not p or len(p) < 3: continue
+            pid = len(self.prices)
+            self.prices.append((url, m.start(), p))
+            for tok in set(TOKEN_RE.findall(tl[max(0, m.start() - self.window): m.end() + self.window])):
+                self.index.setdefault(tok, set()).add(pid)
+
+    def lookup(self, variants: List[str]) -> Optional[str]:
+        # Primer precio (en orden de folleto/posición) cuya ventana contiene todos los tokens de alguna variante
+        best = None
+        for v in variants:
+            toks = tokens(v)
+            if not toks: continue
+            sets = sorted((self.index.get(t) for t in set(toks)), key=lambda x: len(x) if x else 0)
+            if not sets[0]: continue
+            ids = set.intersection(*sets)
+            if ids:
+                pid = min(ids)
+                if best is None or pid < best: best = pid
+        return self.prices[best][2] if best is not None else None
+
+    def __len__(self):
+        return len(self.prices)
+
+# Texto extraído por contenido del PDF: un folleto sin cambios no se vuelve a procesar
+class BrochureTextStore:
+    def __init__(self, root: Path = BROCHURE_TEXT_DIR):
+        self.root = Path(root)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha1(data or b"").hexdigest()
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            with open(self.root / f"{digest}.txt", "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, digest: str, text: str):
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.root / f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text or "")
+            os.replace(tmp, self.root / f"{digest}.txt")
+        except OSError:
+            pass
@@ -0,0 +1,389 @@
+# catalog.py
+# Índice local del catálogo de cada vendedor, armado antes de las búsquedas desde su sitemap (o un feed de
+# productos): EAN / código de modelo -> URL de la ficha y último precio visto. Una consulta interactiva resuelve
+# contra el índice y sólo pide esa ficha para confirmar el precio, en vez de recorrer el buscador del sitio.
+# Se actualiza por <lastmod>: sólo se vuelven a bajar los sitemaps y fichas que cambiaron.
+#   python catalog.py [--vendors Carrefour,Vital] [--full] [--max-pages 5000]
+import os, re, gzip, json, time, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from xml.etree import ElementTree
+
+from brochure_index import tokens
+from matcher import CODE_RE, EAN_RE
+from ratelimit import Cancelled
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+CATALOG_DB = Path(os.getenv("CATALOG_DB", CACHE_DIR / "catalogo.sqlite3"))
+CATALOG_CONCURRENCY = int(os.getenv("CATALOG_CONCURRENCY", 4))
+CATALOG_MAX_PAGES = int(os.getenv("CATALOG_MAX_PAGES", 5000))
+CATALOG_MAX_SITEMAPS = int(os.getenv("CATALOG_MAX_SITEMAPS", 200))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sitemaps (
+    vendor TEXT, url TEXT, lastmod TEXT, ts REAL,
+    PRIMARY KEY (vendor, url)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    vendor TEXT, url TEXT, lastmod TEXT, status TEXT, ts REAL,
+    title TEXT, brand TEXT, ean TEXT, sku TEXT, price_num INTEGER,
+    PRIMARY KEY (vendor, url)
+);
+CREATE INDEX IF NOT EXISTS pages_status ON pages(vendor, status);
+CREATE TABLE IF NOT EXISTS page_keys (
+    vendor TEXT, key TEXT, url TEXT,
+    PRIMARY KEY (vendor, key, url)
+);
+"""
+# status de una ficha: pending (nueva o con lastmod distinto), ok (indexada), noinfo (sin datos de producto), gone (404)
+
+def _s(x) -> str:
+    return "" if x is None else str(x).strip()
+
+def _compact(text: str) -> str:
+    return "".join(tokens(text))
+
+def product_keys(p: Dict) -> List[str]:
+    # Claves de un producto del lote: EAN (sin ceros a la izquierda), modelo compacto y sus códigos
+    keys = []
+    ean = _s(p.get("ean"))
+    if EAN_RE.fullmatch(ean): keys.append(ean.lstrip("0"))
+    model = tokens(_s(p.get("modelo")))
+    if model: keys.append("".join(model))
+    keys += [t for t in model if CODE_RE.fullmatch(t) and t not in keys]
+    return keys
+
+def page_keys(info: Dict) -> List[str]:
+    # Claves de una ficha: GTIN, SKU/MPN compactos y los códigos que aparecen en el título
+    keys = set()
+    for g in info.get("gtins") or []:
+        if EAN_RE.fullmatch(g): keys.add(g.lstrip("0"))
+    for code in (info.get("sku"), info.get("mpn")):
+        c = _compact(_s(code))
+        if len(c) >= 4: keys.add(c)
+    keys.update(t for t in tokens(info.get("title")) if CODE_RE.fullmatch(t))
+    return sorted(keys)
+
+# ---------------- sitemaps, feeds y fichas ----------------
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1].split(":")[-1].lower()
+
+def _xml_root(body: bytes):
+    if body[:2] == b"\x1f\x8b": body = gzip.decompress(body)   # sitemap.xml.gz servido sin Content-Encoding
+    try:
+        return ElementTree.fromstring(body)
+    except ElementTree.ParseError:
+        return None
+
+def parse_sitemap(body: bytes) -> Tuple[str, List[Tuple[str, str]]]:
+    # ("index", [(sitemap, lastmod)]) o ("urlset", [(url, lastmod)]); ("", []) si no es un sitemap
+    root = _xml_root(body)
+    if root is None or _local(root.tag) not in ("sitemapindex", "urlset"): return "", []
+    out = []
+    for el in root:
+        loc = lastmod = ""
+        for child in el:
+            name = _local(child.tag)
+            if name == "loc": loc = _s(child.text)
+            elif name == "lastmod": lastmod = _s(child.text)
+        if loc: out.append((loc, lastmod))
+    return ("index" if _local(root.tag) == "sitemapindex" else "urlset"), out
+
+def parse_feed(body: bytes) -> List[Dict]:
+    # Feed de productos (Google Merchant RSS/Atom): cada <item>/<entry> con link, título, gtin/mpn y precio
+    root = _xml_root(body)
+    if root is None: return []
+    out = []
+    for el in root.iter():
+        if _local(el.tag) not in ("item", "entry"): continue
+        f: Dict[str, str] = {}
+        for child in el:
+            name = _local(child.tag)
+            text = _s(child.text) or _s(child.get("href"))
+            if text and name not in f: f[name] = text
+        url = f.get("link")
+        if not url: continue
+        out.append({"url": url, "title": f.get("title", ""), "brand": f.get("brand", ""), "sku": f.get("id", ""), "mpn": f.get("mpn", ""),
+                    "gtins": [f["gtin"]] if f.get("gtin") else [], "price": (f.get("sale_price") or f.get("price") or "").split(" ")[0],
+                    "available": f.get("availability", "in stock").replace("_", " ") != "out of stock"})
+    return out
+
+LD_JSON_RE = re.compile(r"<script[^>]+application/ld\+json[^>]*>(.*?)</script>", re.I | re.S)
+META_PRICE_RE = re.compile(r"<meta[^>]+(?:property|itemprop|name)=[\"'](?:product:price:amount|og:price:amount|price)[\"'][^>]*>", re.I)
+CONTENT_RE = re.compile(r"content=[\"']([^\"']+)[\"']", re.I)
+ITEMPROP_RE = re.compile(r"itemprop=[\"'](gtin\d*|sku|mpn)[\"'][^>]*content=[\"']([^\"']+)[\"']", re.I)
+
+def _ld_products(node) -> Iterable[Dict]:
+    if isinstance(node, list):
+        for x in node: yield from _ld_products(x)
+    elif isinstance(node, dict):
+        t = node.get("@type")
+        if t == "Product" or (isinstance(t, list) and "Product" in t): yield node
+        for k in ("@graph", "mainEntity", "itemListElement"):
+            if k in node: yield from _ld_products(node[k])
+
+def _offer_price(offers) -> str:
+    for o in (offers if isinstance(offers, list) else [offers]):
+        if not isinstance(o, dict): continue
+        spec = o.get("priceSpecification")
+        price = o.get("price") or o.get("lowPrice") or (spec.get("price") if isinstance(spec, dict) else None)
+        if price not in (None, ""): return _s(price)
+    return ""
+
+def product_info(html: str) -> Dict:
+    # Datos estructurados de una ficha: JSON-LD Product (lo publican VTEX, Magento y WooCommerce) y metas de precio
+    info: Dict = {"title": "", "brand": "", "sku": "", "mpn": "", "gtins": [], "price": ""}
+    for raw in LD_JSON_RE.findall(html or ""):
+        try:
+            data = json.loads(raw.strip())
+        except ValueError:
+            continue
+        for prod in _ld_products(data):
+            brand = prod.get("brand")
+            info["title"] = info["title"] or _s(prod.get("name"))
+            info["brand"] = info["brand"] or _s(brand.get("name") if isinstance(brand, dict) else brand)
+            info["sku"] = info["sku"] or _s(prod.get("sku"))
+            info["mpn"] = info["mpn"] or _s(prod.get("mpn"))
+            info["gtins"] += [_s(prod[k]) for k in ("gtin13", "gtin", "gtin14", "gtin12", "gtin8") if _s(prod.get(k))]
+            info["price"] = info["price"] or _offer_price(prod.get("offers"))
+    if not info["price"]:
+        m = META_PRICE_RE.search(html or "")
+        c = CONTENT_RE.search(m.group(0)) if m else None
+        if c: info["price"] = c.group(1)
+    for name, value in ITEMPROP_RE.findall(html or ""):
+        name = name.lower()
+        if name.startswith("gtin"): info["gtins"].append(value)
+        elif not info[name]: info[name] = value
+    return info
+
+def is_product_url(url: str, sitemap: str) -> bool:
+    # En sitemaps de productos todo vale; en los mixtos, las rutas de ficha de cada plataforma
+    if "product" in sitemap.lower() or "producto" in sitemap.lower(): return True
+    path = urlsplit(url).path.lower()
+    return path.endswith("/p") or "/producto/" in path or "/product/" in path or path.endswith(".html")
+
+# ---------------- almacén ----------------
+class CatalogStore:
+    def __init__(self, path: Path = CATALOG_DB):
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.row_factory = sqlite3.Row
+            self._local.conn = c
+        return c
+
+    def after_fork(self):
+        self._local = threading.local()
+
+    def _tx(self, fn):
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(c)
+            c.execute("COMMIT")
+            return out
+        except Exception:
+            c.execute("ROLLBACK"); raise
+
+    def has(self, vendor: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM pages WHERE vendor=? AND status='ok' LIMIT 1", (vendor,)).fetchone() is not None
+
+    def sitemap_lastmod(self, vendor: str, url: str) -> Optional[str]:
+        r = self._conn().execute("SELECT lastmod FROM sitemaps WHERE vendor=? AND url=?", (vendor, url)).fetchone()
+        return r["lastmod"] if r else None
+
+    def set_sitemap(self, vendor: str, url: str, lastmod: str):
+        self._conn().execute("INSERT INTO sitemaps (vendor, url, lastmod, ts) VALUES (?,?,?,?) ON CONFLICT(vendor, url) DO UPDATE SET "
+                             "lastmod=excluded.lastmod, ts=excluded.ts", (vendor, url, lastmod, time.time()))
+
+    def add_urls(self, vendor: str, urls: List[Tuple[str, str]], full: bool = False) -> Dict[str, int]:
+        # Fichas del sitemap: nuevas o con otro lastmod quedan pendientes; sin lastmod sólo si nunca se bajaron
+        def run(c):
+            known = {}
+            for k in range(0, len(urls), 500):
+                chunk = [u for u, _ in urls[k:k + 500]]
+                q = f"SELECT url, lastmod, status FROM pages WHERE vendor=? AND url IN ({','.join('?' * len(chunk))})"
+                known.update({r["url"]: (r["lastmod"], r["status"]) for r in c.execute(q, [vendor, *chunk])})
+            new = changed = 0
+            for url, lastmod in urls:
+                prev = known.get(url)
+                if prev is None:
+                    new += 1
+                    c.execute("INSERT OR IGNORE INTO pages (vendor, url, lastmod, status, ts) VALUES (?,?,?,'pending',?)", (vendor, url, lastmod, time.time()))
+                elif full or (lastmod and lastmod != prev[0]):
+                    changed += 1
+                    c.execute("UPDATE pages SET lastmod=?, status='pending' WHERE vendor=? AND url=?", (lastmod, vendor, url))
+            return {"new": new, "changed": changed}
+        return self._tx(run)
+
+    def pending(self, vendor: str, limit: int) -> List[str]:
+        return [r["url"] for r in self._conn().execute("SELECT url FROM pages WHERE vendor=? AND status='pending' LIMIT ?", (vendor, limit))]
+
+    def save(self, vendor: str, url: str, info: Optional[Dict], price: Optional[str], lastmod: Optional[str] = None):
+        # info None: la ficha ya no existe. Las claves se reemplazan (el título o el GTIN pueden cambiar)
+        keys = page_keys(info) if info else []
+        status = "gone" if info is None else ("ok" if keys else "noinfo")
+        def run(c):
+            c.execute("""INSERT INTO pages (vendor, url, lastmod, status, ts, title, brand, ean, sku, price_num) VALUES (?,?,?,?,?,?,?,?,?,?)
+                         ON CONFLICT(vendor, url) DO UPDATE SET lastmod=COALESCE(excluded.lastmod, pages.lastmod), status=excluded.status,
+                           ts=excluded.ts, title=excluded.title, brand=excluded.brand, ean=excluded.ean, sku=excluded.sku, price_num=excluded.price_num""",
+                      (vendor, url, lastmod, status, time.time(), _s((info or {}).get("title")), _s((info or {}).get("brand")),
+                       ",".join((info or {}).get("gtins") or []), _s((info or {}).get("sku")), int(price) if price else None))
+            c.execute("DELETE FROM page_keys WHERE vendor=? AND url=?", (vendor, url))
+            c.executemany("INSERT OR IGNORE INTO page_keys (vendor, key, url) VALUES (?,?,?)", [(vendor, k, url) for k in keys])
+        self._tx(run)
+
+    def set_price(self, vendor: str, url: str, price: str):
+        self._conn().execute("UPDATE pages SET price_num=?, ts=? WHERE vendor=? AND url=?", (int(price), time.time(), vendor, url))
+
+    def lookup(self, vendor: str, keys: List[str]) -> Optional[Dict]:
+        # Ficha indexada para la primera clave (EAN antes que modelo) que la identifica sin ambigüedad
+        c = self._conn()
+        for key in keys:
+            rows = c.execute("""SELECT p.* FROM page_keys k JOIN pages p ON p.vendor=k.vendor AND p.url=k.url
+                                WHERE k.vendor=? AND k.key=? AND p.status='ok' ORDER BY p.ts DESC LIMIT 2""", (vendor, key)).fetchall()
+            if len(rows) == 1: return dict(rows[0])
+        return None
+
+    def stats(self) -> Dict[str, Dict]:
+        out: Dict[str, Dict] = {}
+        for r in self._conn().execute("SELECT vendor, status, COUNT(*) n, MAX(ts) ts FROM pages GROUP BY vendor, status"):
+            v = out.setdefault(r["vendor"], {"updated": 0})
+            v[r["status"]] = r["n"]; v["updated"] = max(v["updated"], r["ts"] or 0)
+        return out
+
+# ---------------- armado ----------------
+class CatalogBuilder:
+    # client_factory() -> cliente HTTP con .get(url) (HttpClient): uno por hilo, con el rate limit por host de siempre
+    def __init__(self, store: CatalogStore, client_factory: Callable[[], object], to_digits: Callable[[str], Optional[str]],
+                 log: Optional[Callable[[str], None]] = None, concurrency: int = CATALOG_CONCURRENCY,
+                 max_pages: int = CATALOG_MAX_PAGES, max_sitemaps: int = CATALOG_MAX_SITEMAPS):
+        self.store = store
+        self.client_factory = client_factory
+        self.to_digits = to_digits
+        self.log = log or (lambda *_: None)
+        self.concurrency = max(1, concurrency)
+        self.max_pages = max_pages
+        self.max_sitemaps = max_sitemaps
+        self._local = threading.local()
+
+    def _client(self):
+        c = getattr(self._local, "client", None)
+        if c is None: c = self._local.client = self.client_factory()
+        return c
+
+    def _get(self, url: str):
+        return self._client().get(url, timeout=45)
+
+    def _roots(self, base: str, sitemap: Optional[str]) -> List[str]:
+        if sitemap: return [urljoin(base.rstrip("/") + "/", sitemap)]
+        roots = []
+        try:
+            for line in self._get(base.rstrip("/") + "/robots.txt").text.splitlines():
+                if line.lower().startswith("sitemap:"): roots.append(line.split(":", 1)[1].strip())
+        except Cancelled:
+            raise
+        except Exception as e:
+            self.log(f"robots.txt: {e}")
+        return roots or [base.rstrip("/") + "/sitemap.xml", base.rstrip("/") + "/sitemap_index.xml"]
+
+    def _walk(self, vendor: str, base: str, sitemap: Optional[str], full: bool) -> Tuple[List[Tuple[str, str]], int, int]:
+        # Recorre el índice de sitemaps; un sitemap hijo con el mismo lastmod que la vez anterior no se baja
+        queue, seen, urls, fetched, skipped = [(u, "") for u in self._roots(base, sitemap)], set(), [], 0, 0
+        while queue and fetched < self.max_sitemaps:
+            url, lastmod = queue.pop(0)
+            if url in seen: continue
+            seen.add(url)
+            if lastmod and not full and self.store.sitemap_lastmod(vendor, url) == lastmod:
+                skipped += 1; continue
+            try:
+                r = self._get(url)
+            except Cancelled:
+                raise
+            except Exception as e:
+                self.log(f"[{vendor}] sitemap {url}: {e}"); continue
+            fetched += 1
+            kind, items = parse_sitemap(r.content)
+            if kind == "index":
+                queue += items
+            elif kind == "urlset":
+                urls += [(u, lm) for u, lm in items if is_product_url(u, url)]
+            if kind: self.store.set_sitemap(vendor, url, lastmod)
+        return urls, fetched, skipped
+
+    def _feed(self, vendor: str, feed: str) -> int:
+        r = self._get(feed)
+        items = parse_feed(r.content)
+        for it in items:
+            self.store.save(vendor, it["url"], it, self.to_digits(it["price"]) if it["price"] and it["available"] else None)
+        return len(items)
+
+    def _page(self, vendor: str, url: str) -> str:
+        try:
+            r = self._get(url)
+        except Cancelled:
+            raise
+        except Exception as e:
+            if getattr(getattr(e, "response", None), "status_code", None) in (404, 410):
+                self.store.save(vendor, url, None, None); return "gone"
+            self.log(f"[{vendor}] ficha {url}: {e}"); return "error"
+        info = product_info(r.text)
+        price = self.to_digits(info["price"]) if info["price"] else None
+        self.store.save(vendor, url, info, price)
+        return "ok" if page_keys(info) else "noinfo"
+
+    def build(self, vendor: str, base: str, sitemap: Optional[str] = None, feed: Optional[str] = None, full: bool = False) -> Dict:
+        t0 = time.time()
+        out: Dict = {"vendor": vendor}
+        if feed:
+            out["feed_items"] = self._feed(vendor, feed)
+            self.log(f"[{vendor}] feed: {out['feed_items']} producto(s)")
+        if feed and not sitemap:
+            out["seconds"] = round(time.time() - t0, 1)
+            return out
+        urls, out["sitemaps"], out["sitemaps_unchanged"] = self._walk(vendor, base, sitemap, full)
+        out.update(self.store.add_urls(vendor, urls, full), urls=len(urls))
+        pending = self.store.pending(vendor, self.max_pages)
+        self.log(f"[{vendor}] sitemaps: {out['sitemaps']} leído(s), {out['sitemaps_unchanged']} sin cambios; {len(urls)} ficha(s), "
+                 f"{out['new']} nueva(s), {out['changed']} con cambios; {len(pending)} a bajar")
+        done: Dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="catalog") as ex:
+            for res in ex.map(lambda u: self._page(vendor, u), pending):
+                done[res] = done.get(res, 0) + 1
+        out["pages"] = done
+        out["seconds"] = round(time.time() - t0, 1)
+        self.log(f"[{vendor}] catálogo: " + ", ".join(f"{k}={v}" for k, v in sorted(done.items())) + f" en {out['seconds']}s")
+        return out
+
+def main():
+    import argparse
+    os.environ.setdefault("QUEUE_WORKERS", "0")   # la app no arranca hilos de la cola sólo para leer VENDEDORES.txt
+    from app import VENDORS_FILE, read_vendors_file
+    from scraper import PriceScraper
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vendors", help="nombres separados por coma (por defecto, todos los de VENDEDORES.txt)")
+    ap.add_argument("--full", action="store_true", help="volver a bajar todo, sin mirar lastmod")
+    ap.add_argument("--max-pages", type=int, default=CATALOG_MAX_PAGES)
+    args = ap.parse_args()
+    vendors, options = read_vendors_file(VENDORS_FILE)
+    vendors = vendors or {}
+    if args.vendors:
+        names = [n.strip() for n in args.vendors.split(",") if n.strip()]
+        vendors = {n: vendors.get(n, "") for n in names}
+    scraper = PriceScraper(delay_range=(1, 2), rate_limits=options, catalog=CatalogStore())
+    result, _ = scraper.build_catalog({k: v for k, v in vendors.items() if v}, full=args.full, max_pages=args.max_pages, on_log=print)
+    print(json.dumps(result, ensure_ascii=False, indent=1))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# downloads.py
+# Descargas en streaming con tope de tamaño. Los PDF van a un archivo temporal (o al cuerpo ya guardado en la
+# caché HTTP) que comparten la extracción de texto y el OCR: pdfminer lee por mmap y pdfium abre la ruta,
+# sin copiar el folleto entero a memoria. El HTML se parsea mientras llega y se puede dejar de leer antes.
+import io, os, mmap, hashlib, tempfile
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+PDF_MAX_BYTES = int(float(os.getenv("PDF_MAX_MB", 60)) * 1024 * 1024)
+HTML_MAX_BYTES = int(float(os.getenv("HTML_MAX_MB", 8)) * 1024 * 1024)
+CHUNK = 64 * 1024
+# Si al cortar un HTML queda poco por leer se lee igual: cerrar antes pierde la conexión keep-alive
+HTML_DRAIN_BYTES = 64 * 1024
+
+class DownloadTooLarge(Exception):
+    pass
+
+def _declared_size(r) -> Optional[int]:
+    try: return int(r.headers.get("content-length"))
+    except (TypeError, ValueError): return None
+
+def _too_large(url: str, max_bytes: int) -> DownloadTooLarge:
+    return DownloadTooLarge(f"supera el máximo de {max_bytes / 1048576:.0f} MB: {url}")
+
+class MmapReader(io.RawIOBase):
+    # Archivo de sólo lectura sobre un mmap (pdfminer exige un io.IOBase); lee por tramos, sin copiar el total
+    def __init__(self, mm):
+        self._mm = mm; self._pos = 0
+
+    def readable(self): return True
+    def seekable(self): return True
+    def tell(self): return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._mm)}[whence]
+        self._pos = max(0, base + pos)
+        return self._pos
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._mm) - self._pos))
+        b[:n] = self._mm[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+class Download:
+    # Cuerpo en disco: .path para pdfium/OCR, .view() (mmap de sólo lectura) para pdfminer
+    def __init__(self, path: Path, url: str, temp: bool, digest: Optional[str] = None):
+        self.path = Path(path)
+        self.url = url
+        self.temp = temp   # archivo propio: se borra al cerrar
+        self._f = open(self.path, "rb")
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._digest = digest
+
+    @classmethod
+    def fetch(cls, r, url: str, max_bytes: int = PDF_MAX_BYTES, dir: Optional[Path] = None) -> "Download":
+        # Lee la respuesta (stream=True) por bloques al disco, con sha1 incremental y corte por tamaño
+        declared = _declared_size(r)
+        if declared is not None and declared > max_bytes: raise _too_large(url, max_bytes)
+        if dir is not None: Path(dir).mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".download", dir=dir)
+        h, n = hashlib.sha1(), 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in r.iter_content(CHUNK):
+                    n += len(chunk)
+                    if n > max_bytes: raise _too_large(url, max_bytes)
+                    h.update(chunk); f.write(chunk)
+            return cls(path, url, temp=True, digest=h.hexdigest())
+        except BaseException:
+            try: os.unlink(path)
+            except OSError: pass
+            raise
+
+    @property
+    def digest(self) -> str:
+        # sha1 del contenido (mismo que BrochureTextStore.digest); desde caché se calcula sobre el mmap
+        if self._digest is None:
+            self._digest = hashlib.sha1(self._mm if self._mm is not None else b"").hexdigest()
+        return self._digest
+
+    def view(self) -> io.IOBase:
+        # Lector nuevo en cada llamada (posición 0) sobre el mismo mmap
+        if self._mm is None: return io.BytesIO(b"")
+        return io.BufferedReader(MmapReader(self._mm), buffer_size=CHUNK)
+
+    def close(self):
+        if self._mm is not None: self._mm.close(); self._mm = None
+        self._f.close()
+        if self.temp:
+            try: os.unlink(self.path)
+            except OSError: pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _remaining(r) -> Optional[int]:
+    # Bytes (en el cable) que faltan leer, si el servidor declaró Content-Length
+    declared = _declared_size(r)
+    raw_read = getattr(getattr(r, "raw", None), "tell", lambda: None)()
+    if declared is None or raw_read is None: return None
+    return max(0, declared - raw_read)
+
+def discard(r):
+    # Respuesta en streaming que no se va a usar (403/429, 304): si el cuerpo es chico se lee para no perder la conexión
+    left = _remaining(r)
+    if left is not None and left <= HTML_DRAIN_BYTES:
+        try:
+            for _ in r.iter_content(CHUNK): pass
+        except Exception:
+            pass
+    r.close()
+
+def read_html(r, parser, done: Callable[[list], bool], max_bytes: int = HTML_MAX_BYTES) -> Tuple[bytes, bool]:
+    # Alimenta el parser incremental por bloques; done(eventos) decide si ya no hace falta el resto.
+    # Si resta poco se lee igual (la conexión vuelve al pool y el cuerpo completo se puede cachear).
+    # Devuelve (cuerpo leído, completo)
+    buf = bytearray()
+    watching, complete = True, True
+    for chunk in r.iter_content(CHUNK):
+        buf += chunk
+        parser.feed(chunk)
+        events = list(parser.read_events())
+        if len(buf) >= max_bytes or (watching and done(events)):
+            left = _remaining(r)
+            if len(buf) < max_bytes and left is not None and left <= HTML_DRAIN_BYTES:
+                watching = False
+                continue
+            complete = False
+            break
+    r.close()
+    return bytes(buf), complete
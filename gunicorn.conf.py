@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py app:app   (los flags de la línea de comandos tienen prioridad)
+# GUNICORN_PRELOAD=1 importa la app en el master antes del fork: los workers arrancan más rápido y comparten
+# (copy-on-write) las páginas de los módulos ya cargados. GUNICORN_PRELOAD_MODULES agrega módulos pesados que
+# la app ya no importa al arrancar, p. ej. "pandas,pdfminer.high_level,bs4", para pagarlos una sola vez.
+import os, importlib
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WORKERS", 2))
+threads = int(os.getenv("THREADS", 8))
+timeout = int(os.getenv("TIMEOUT", 900))
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+PRELOAD_MODULES = [m.strip() for m in os.getenv("GUNICORN_PRELOAD_MODULES", "").split(",") if m.strip()]
+
+def on_starting(server):
+    if not preload_app: return
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            server.log.warning(f"preload: no se pudo importar {name}: {e}")
+
+def post_fork(server, worker):
+    # Cada worker abre sus conexiones SQLite (con la app precargada no sirven las del master) y arranca sus hilos
+    # de la cola, que la app no arranca al importarse
+    import app
+    app.after_fork()
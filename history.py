@@ -0,0 +1,107 @@
+# history.py
+# Historial de precios en SQLite: una fila por (vendedor, producto, día), escrita a medida que se completan
+# las filas del lote. Permite el modo incremental (saltear pares recientes) y consultas históricas.
+import os, re, time, sqlite3, threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+HISTORY_DB = Path(os.getenv("PRICE_HISTORY_DB", CACHE_DIR / "historial.sqlite3"))
+HISTORY_MAX_AGE_H = float(os.getenv("HISTORY_MAX_AGE_H", 20))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    vendor TEXT, product_key TEXT, day TEXT, ts REAL,
+    ean TEXT, marca TEXT, modelo TEXT, producto TEXT,
+    price_num INTEGER, price_txt TEXT,
+    PRIMARY KEY (vendor, product_key, day)
+);
+CREATE INDEX IF NOT EXISTS prices_key ON prices(product_key, day);
+"""
+
+def _norm(x) -> str:
+    return re.sub(r"\s+", " ", str(x or "")).strip()
+
+def product_key(p: Dict) -> str:
+    # EAN si es válido; si no, marca + modelo normalizados (mismo producto aunque cambie la descripción)
+    ean = re.sub(r"\D", "", _norm(p.get("ean")))
+    if 8 <= len(ean) <= 14: return f"ean:{ean}"
+    mm = " ".join(re.findall(r"[a-z0-9]+", f"{_norm(p.get('marca'))} {_norm(p.get('modelo'))}".lower()))
+    if _norm(p.get("modelo")): return f"model:{mm}"
+    return "name:" + " ".join(re.findall(r"[a-z0-9]+", f"{_norm(p.get('marca'))} {_norm(p.get('producto'))}".lower()))
+
+class HistoryStore:
+    def __init__(self, path: Path = HISTORY_DB):
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.row_factory = sqlite3.Row
+            self._local.conn = c
+        return c
+
+    def after_fork(self):
+        self._local = threading.local()
+
+    def record(self, p: Dict, cells: Dict[str, Tuple[str, str]], ts: Optional[float] = None):
+        # cells: vendedor -> (precio texto, precio num); un ND no pisa un precio ya visto ese día
+        ts = ts or time.time()
+        day = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+        key = product_key(p)
+        rows = [(vn, key, day, ts, _norm(p.get("ean")), _norm(p.get("marca")), _norm(p.get("modelo")), _norm(p.get("producto")),
+                 int(num) if str(num or "").isdigit() else None, txt or "ND") for vn, (txt, num) in cells.items()]
+        if not rows: return
+        c = self._conn()
+        c.execute("BEGIN")
+        try:
+            c.executemany("""INSERT INTO prices (vendor, product_key, day, ts, ean, marca, modelo, producto, price_num, price_txt)
+                             VALUES (?,?,?,?,?,?,?,?,?,?)
+                             ON CONFLICT(vendor, product_key, day) DO UPDATE SET
+                               ts=excluded.ts, price_num=excluded.price_num, price_txt=excluded.price_txt,
+                               ean=excluded.ean, marca=excluded.marca, modelo=excluded.modelo, producto=excluded.producto
+                             WHERE excluded.price_num IS NOT NULL OR prices.price_num IS NULL""", rows)
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK"); raise
+
+    def fresh(self, products: List[Dict], vendors: List[str], max_age_s: float) -> Dict[Tuple[int, str], Tuple[str, str, float]]:
+        # (índice de producto, vendedor) -> (precio texto, precio num, ts) para los pares con precio reciente
+        if not products or not vendors: return {}
+        keys = {}
+        for i, p in enumerate(products):
+            keys.setdefault(product_key(p), []).append(i)
+        since = time.time() - max_age_s
+        out = {}
+        c = self._conn()
+        klist = list(keys)
+        for k in range(0, len(klist), 500):
+            chunk = klist[k:k + 500]
+            q = (f"SELECT vendor, product_key, ts, price_num, price_txt FROM prices WHERE ts >= ? AND price_num IS NOT NULL "
+                 f"AND vendor IN ({','.join('?' * len(vendors))}) AND product_key IN ({','.join('?' * len(chunk))}) ORDER BY ts")
+            for r in c.execute(q, [since, *vendors, *chunk]):
+                for i in keys[r["product_key"]]:
+                    out[(i, r["vendor"])] = (r["price_txt"], str(r["price_num"]), r["ts"])
+        return out
+
+    def query(self, product: Optional[Dict] = None, vendor: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+        q, args = "SELECT day, vendor, product_key, ean, marca, modelo, producto, price_num, price_txt, ts FROM prices WHERE 1=1", []
+        if product:
+            q += " AND product_key=?"; args.append(product_key(product))
+        if vendor:
+            q += " AND vendor=?"; args.append(vendor)
+        if since:
+            q += " AND day>=?"; args.append(since)
+        if until:
+            q += " AND day<=?"; args.append(until)
+        q += " ORDER BY day DESC, vendor LIMIT ?"; args.append(limit)
+        return [dict(r) for r in self._conn().execute(q, args)]
@@ -0,0 +1,204 @@
+# http_cache.py
+# Caché HTTP en disco: TTL por tipo de contenido, revalidación ETag/Last-Modified y desalojo LRU por tamaño
+import os, json, time, hashlib, threading
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+HTTP_CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", CACHE_DIR / "http"))
+
+# Búsquedas (HTML/JSON) viejas rápido; los folletos PDF casi no cambian
+DEFAULT_TTLS = {
+    "search": float(os.getenv("HTTP_CACHE_TTL_SEARCH", 15 * 60)),
+    "html": float(os.getenv("HTTP_CACHE_TTL_HTML", 60 * 60)),
+    "pdf": float(os.getenv("HTTP_CACHE_TTL_PDF", 7 * 86400)),
+}
+KEEP_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "date")
+
+def content_kind(url: str, params: Optional[Dict], content_type: str) -> str:
+    ct = (content_type or "").lower()
+    if "pdf" in ct or url.lower().split("?", 1)[0].endswith(".pdf"): return "pdf"
+    if params or "json" in ct: return "search"
+    return "html"
+
+class CacheCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._c: Dict[str, int] = {}
+
+    def inc(self, name: str, n: int = 1):
+        with self._lock:
+            self._c[name] = self._c.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._c)
+
+class CacheEntry:
+    def __init__(self, cache: "ResponseCache", key: str, meta: Dict):
+        self.cache = cache; self.key = key; self.meta = meta
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.meta.get("stored_at", 0) < self.meta.get("ttl", 0)
+
+    def validators(self) -> Dict[str, str]:
+        h = {}
+        if self.meta["headers"].get("etag"): h["If-None-Match"] = self.meta["headers"]["etag"]
+        if self.meta["headers"].get("last-modified"): h["If-Modified-Since"] = self.meta["headers"]["last-modified"]
+        return h
+
+    @property
+    def body_path(self) -> Path:
+        return self.cache._body_path(self.key)
+
+    def response(self) -> requests.Response:
+        r = requests.Response()
+        with open(self.body_path, "rb") as f:
+            r._content = f.read()
+        r.status_code = self.meta.get("status", 200)
+        r.url = self.meta.get("url", "")
+        r.headers = CaseInsensitiveDict(self.meta.get("headers") or {})
+        r.headers["x-cache"] = "HIT"
+        r.encoding = get_encoding_from_headers(r.headers)
+        r.reason = "OK"
+        return r
+
+class ResponseCache:
+    def __init__(self, root: Path = HTTP_CACHE_DIR, max_bytes: int = int(os.getenv("HTTP_CACHE_MAX_MB", 512)) * 1024 * 1024, ttls: Optional[Dict[str, float]] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, list]] = None   # key -> [size, último acceso]
+        self._total = 0
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        items = params.items() if isinstance(params, dict) else (params or [])
+        q = urlencode(sorted((str(k), str(v)) for k, v in items))
+        return hashlib.sha1(f"{url}?{q}".encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.body"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        if self._index is not None: return
+        self._index, self._total = {}, 0
+        if not self.root.exists(): return
+        for p in self.root.glob("*/*.body"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            self._index[p.stem] = [st.st_size, st.st_atime]
+            self._total += st.st_size
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._body_path(key).exists():
+            return None
+        with self._lock:
+            self._load_index()
+            if key in self._index: self._index[key][1] = time.time()
+        return CacheEntry(self, key, meta)
+
+    def _meta(self, url: str, params: Optional[Dict], r, size: int) -> Optional[Dict]:
+        headers = {h: r.headers[h] for h in KEEP_HEADERS if r.headers.get(h)}
+        kind = content_kind(url, params, headers.get("content-type", ""))
+        ttl = self.ttls.get(kind, 0)
+        if ttl <= 0 or "no-store" in (headers.get("cache-control") or "").lower():
+            return None
+        return {"url": r.url or url, "status": r.status_code, "headers": headers, "stored_at": time.time(), "ttl": ttl, "kind": kind, "size": size}
+
+    def store(self, key: str, url: str, params: Optional[Dict], r) -> bool:
+        body = r.content
+        meta = self._meta(url, params, r, len(body))
+        if meta is None: return False
+        bp = self._body_path(key)
+        try:
+            bp.parent.mkdir(parents=True, exist_ok=True)
+            tmp = bp.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, bp)
+        except OSError:
+            return False
+        return self._commit(key, meta)
+
+    def store_file(self, key: str, url: str, params: Optional[Dict], r, path: Path) -> Optional[Path]:
+        # Cuerpo ya descargado a disco (streaming, en self.root): se mueve a la caché sin copiarlo.
+        # Devuelve la nueva ruta del cuerpo, o None si no se guardó
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        meta = self._meta(url, params, r, size)
+        if meta is None: return None
+        bp = self._body_path(key)
+        try:
+            bp.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, bp)
+        except OSError:
+            return None
+        self._commit(key, meta)
+        return bp
+
+    def _commit(self, key: str, meta: Dict) -> bool:
+        try:
+            with open(self._meta_path(key), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except OSError:
+            return False
+        with self._lock:
+            self._load_index()
+            old = self._index.get(key)
+            if old: self._total -= old[0]
+            self._index[key] = [meta["size"], time.time()]
+            self._total += meta["size"]
+            self._evict()
+        return True
+
+    def refresh(self, entry: CacheEntry, headers) -> CacheEntry:
+        # 304: el cuerpo sigue vigente, se renueva el TTL
+        entry.meta["stored_at"] = time.time()
+        for h in ("etag", "last-modified", "date"):
+            if headers.get(h): entry.meta["headers"][h] = headers[h]
+        try:
+            with open(self._meta_path(entry.key), "w", encoding="utf-8") as f:
+                json.dump(entry.meta, f)
+        except OSError:
+            pass
+        return entry
+
+    def _evict(self):
+        if self._total <= self.max_bytes: return
+        for key, (size, _) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+            if self._total <= self.max_bytes * 0.9: break
+            for p in (self._body_path(key), self._meta_path(key)):
+                try: p.unlink()
+                except OSError: pass
+            del self._index[key]
+            self._total -= size
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+def default_response_cache() -> ResponseCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
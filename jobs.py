@@ -0,0 +1,195 @@
+# jobs.py
+# Trabajos de scraping en segundo plano: estado, eventos (filas/log) y cancelación en SQLite,
+# compartidos entre todos los workers de gunicorn
+import os, json, time, uuid, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+JOBS_DB = Path(os.getenv("JOBS_DB", CACHE_DIR / "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))         # hilos para /api/jobs y el catálogo
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", 4))   # hilos para las exportaciones en streaming (aparte)
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", 60))      # sin heartbeat por este tiempo, el trabajo se da por perdido
+JOBS_TTL_S = float(os.getenv("JOBS_TTL_S", 2 * 86400))
+
+FINAL_STATES = ("done", "error", "cancelled")
+CANCEL_SEEN_MAX = 256   # claves de cancelación con respuesta negativa en caché antes de limpiar
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, kind TEXT, status TEXT, created REAL, updated REAL,
+    params TEXT, summary TEXT, error TEXT, worker TEXT, lease_until REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, type TEXT, data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_job ON events(job_id, seq);
+CREATE TABLE IF NOT EXISTS cancels (id TEXT PRIMARY KEY, created REAL);
+"""
+
+class JobStore:
+    def __init__(self, path: Path = JOBS_DB):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._cancel_seen: Dict[str, float] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+            cols = {r["name"] for r in c.execute("PRAGMA table_info(jobs)")}
+            for col, type_ in (("worker", "TEXT"), ("lease_until", "REAL")):
+                if col not in cols: c.execute(f"ALTER TABLE jobs ADD COLUMN {col} {type_}")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.row_factory = sqlite3.Row
+            self._local.conn = c
+        return c
+
+    def after_fork(self):
+        self._local = threading.local()
+
+    # ------------------------ trabajos ------------------------
+    def create(self, kind: str, params: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        c = self._conn()
+        c.execute("INSERT INTO jobs (id, kind, status, created, updated, params) VALUES (?,?,?,?,?,?)",
+                  (job_id, kind, "queued", now, now, json.dumps(params, ensure_ascii=False)))
+        self.purge(now - JOBS_TTL_S)
+        self.fail_orphans()   # también los de un worker que murió mientras los demás siguen
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        r = self._conn().execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if not r: return None
+        d = dict(r)
+        d["params"] = json.loads(d["params"] or "{}")
+        d["summary"] = json.loads(d["summary"] or "{}")
+        return d
+
+    def set_status(self, job_id: str, status: str, summary: Optional[Dict] = None, error: Optional[str] = None):
+        sets, args = ["status=?", "updated=?"], [status, time.time()]
+        if summary is not None: sets.append("summary=?"); args.append(json.dumps(summary, ensure_ascii=False))
+        if error is not None: sets.append("error=?"); args.append(error)
+        self._conn().execute(f"UPDATE jobs SET {', '.join(sets)} WHERE id=?", (*args, job_id))
+
+    # ------------------------ leases ------------------------
+    # Los trabajos de JobRunner llevan worker y lease_until, renovado por heartbeat mientras esperan o corren.
+    # Los repartidos (workqueue) no: sus tareas tienen lease propio y la cola los cierra.
+    def lease(self, job_ids: List[str], worker: str, lease_s: float = JOB_LEASE_S):
+        if not job_ids: return
+        self._conn().execute(f"UPDATE jobs SET worker=?, lease_until=? WHERE id IN ({','.join('?' * len(job_ids))})",
+                             (worker, time.time() + lease_s, *job_ids))
+
+    def fail_orphans(self) -> int:
+        # queued/running con el lease vencido: el proceso que los tenía se reinició o murió
+        now = time.time()
+        c = self._conn()
+        ids = [r[0] for r in c.execute("SELECT id FROM jobs WHERE status IN ('queued','running') AND lease_until < ?", (now,))]
+        for job_id in ids:
+            c.execute("UPDATE jobs SET status='error', error=?, updated=?, lease_until=NULL WHERE id=? AND status IN ('queued','running') AND lease_until < ?",
+                      ("interrumpido: el proceso que lo corría se reinició", now, job_id, now))
+            self.add_event(job_id, "log", "ERROR trabajo interrumpido (proceso reiniciado)")
+        return len(ids)
+
+    def purge(self, older_than: float):
+        c = self._conn()
+        old = [r[0] for r in c.execute("SELECT id FROM jobs WHERE updated < ?", (older_than,))]
+        for job_id in old:
+            c.execute("DELETE FROM events WHERE job_id=?", (job_id,))
+            c.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+        c.execute("DELETE FROM cancels WHERE created < ?", (older_than,))
+
+    # ------------------------ eventos ------------------------
+    def add_event(self, job_id: str, type_: str, data):
+        self._conn().execute("INSERT INTO events (job_id, type, data) VALUES (?,?,?)",
+                             (job_id, type_, json.dumps(data, ensure_ascii=False)))
+
+    def events(self, job_id: str, after: int = 0, limit: int = 500, types: Optional[List[str]] = None) -> List[Dict]:
+        q, args = "SELECT seq, type, data FROM events WHERE job_id=? AND seq>?", [job_id, after]
+        if types:
+            q += f" AND type IN ({','.join('?' * len(types))})"; args += list(types)
+        q += " ORDER BY seq LIMIT ?"; args.append(limit)
+        return [{"seq": r["seq"], "type": r["type"], "data": json.loads(r["data"])} for r in self._conn().execute(q, args)]
+
+    def follow(self, job_id: str, after: int = 0, poll_s: float = 0.5, timeout_s: float = 3600) -> Iterator[Dict]:
+        # Generador para streaming: entrega eventos nuevos hasta que el trabajo termina
+        deadline = time.time() + timeout_s
+        while time.time() < deadline:
+            batch = self.events(job_id, after)
+            for ev in batch:
+                after = ev["seq"]; yield ev
+            if batch: continue
+            job = self.get(job_id)
+            if not job or job["status"] in FINAL_STATES:
+                for ev in self.events(job_id, after):
+                    yield ev
+                return
+            time.sleep(poll_s)
+
+    # ------------------------ cancelación ------------------------
+    def cancel(self, key: str):
+        self._conn().execute("INSERT OR REPLACE INTO cancels (id, created) VALUES (?,?)", (key, time.time()))
+
+    def is_cancelled(self, key: str, max_age_s: float = 0.5) -> bool:
+        # cancel_cb se consulta muy seguido: se cachea la respuesta negativa unos instantes
+        now = time.time()
+        if now - self._cancel_seen.get(key, 0) < max_age_s: return False
+        hit = self._conn().execute("SELECT 1 FROM cancels WHERE id=?", (key,)).fetchone() is not None
+        if not hit:
+            # una entrada por run/trabajo/tramo: las vencidas ya no evitan consultas y se descartan
+            if len(self._cancel_seen) >= CANCEL_SEEN_MAX:
+                self._cancel_seen = {k: t for k, t in self._cancel_seen.items() if now - t < max_age_s}
+            self._cancel_seen[key] = now
+        return hit
+
+class JobRunner:
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, name: str = "job", lease_s: float = JOB_LEASE_S):
+        self.store = store
+        self.name = name
+        self.lease_s = lease_s
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._active: Set[str] = set()
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _beat(self):
+        # Renueva el lease de los trabajos en cola o corriendo en este proceso; termina cuando no queda ninguno
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active: self._heartbeat = None; return
+            try:
+                self.store.lease(active, f"{os.getpid()}:{self.name}", self.lease_s)
+            except sqlite3.Error:
+                pass
+            time.sleep(self.lease_s / 3)
+
+    def submit(self, job_id: str, fn: Callable[[str], Optional[Dict]]):
+        with self._lock:
+            self._active.add(job_id)
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._beat, name=f"{self.name}-heartbeat", daemon=True)
+                self._heartbeat.start()
+        self.store.lease([job_id], f"{os.getpid()}:{self.name}", self.lease_s)
+        return self.executor.submit(self._run, job_id, fn)
+
+    def _run(self, job_id: str, fn: Callable[[str], Optional[Dict]]):
+        try:
+            if self.store.is_cancelled(job_id, max_age_s=0):
+                self.store.set_status(job_id, "cancelled"); return
+            self.store.set_status(job_id, "running")
+            try:
+                summary = fn(job_id) or {}
+                status = "cancelled" if self.store.is_cancelled(job_id, max_age_s=0) else "done"
+                self.store.set_status(job_id, status, summary=summary)
+            except Exception as e:
+                self.store.add_event(job_id, "log", f"ERROR {type(e).__name__}: {e}")
+                self.store.set_status(job_id, "error", error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock: self._active.discard(job_id)
@@ -0,0 +1,136 @@
+# matcher.py
+# Coincidencia card -> producto para todo el lote en una sola pasada. El índice se arma una vez por lote con los
+# identificadores de cada producto (EAN, modelo, marca, nombre); cada card se tokeniza una vez y se asigna al
+# producto (o productos empatados) con mejor puntaje, no al primero cuyo término aparece en su texto.
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from brochure_index import tokens
+
+# Un EAN exacto pesa más que el modelo y el modelo más que la marca. El nombre ("Heladera No Frost 382L")
+# sólo alcanza si el producto no tiene EAN ni modelo, o si la card no muestra ningún código
+SCORE_EAN = 100
+SCORE_MODEL = 50
+SCORE_MODEL_PART = 30     # "RT38K5930" dentro de "RT38K5930SL" o "RT38K5930SL" de "RT38K5930SL/BG": + largo, el más específico gana
+SCORE_BRAND = 10
+SCORE_NAME = 5
+STRONG = SCORE_MODEL_PART
+MAX_GRAM = 4              # "RT-38 XL" -> rt, 38, xl: el modelo se busca también con tokens vecinos pegados
+MIN_PART = 5
+
+EAN_RE = re.compile(r"\d{8,14}")
+# código de modelo (6+ caracteres con letras y 2+ dígitos) o EAN, sobre texto en minúscula
+CODE_RE = re.compile(r"(?<![0-9a-z])(?:(?=[0-9a-z]*[a-z])(?=[a-z]*\d[a-z]*\d)[0-9a-z]{6,}|\d{8,14})(?![0-9a-z])")
+STOPWORDS = {"de", "del", "la", "el", "los", "las", "con", "sin", "y", "en", "para", "x"}
+
+def _s(x) -> str:
+    return "" if x is None else str(x).strip()
+
+def _part_score(n: int) -> int:
+    return SCORE_MODEL_PART + min(n, SCORE_MODEL - SCORE_MODEL_PART - 1)
+
+class _Product:
+    __slots__ = ("ean", "model", "parts", "brand", "phrases")
+
+    def __init__(self, p: Dict):
+        ean = _s(p.get("ean"))
+        self.ean = ean.lstrip("0") if EAN_RE.fullmatch(ean) else ""
+        model = tokens(_s(p.get("modelo")))
+        self.model = "".join(model)
+        self.parts = [t for t in model if CODE_RE.fullmatch(t)] if len(model) > 1 else []
+        self.brand = frozenset(tokens(_s(p.get("marca"))))
+        words = lambda t: frozenset(w for w in tokens(t) if w not in STOPWORDS)
+        # frases débiles: todas sus palabras en la card (como las variantes "producto" y "marca capacidad")
+        cap = words(_s(p.get("capacidad")))
+        self.phrases = [ph for ph in (words(_s(p.get("producto"))), self.brand | cap if cap else frozenset()) if ph]
+
+    @property
+    def identified(self) -> bool:
+        return bool(self.ean or self.model)
+
+class ProductMatcher:
+    def __init__(self, products: Iterable[Dict]):
+        self.products = [_Product(p) for p in products]
+        self.codes: Dict[str, List[Tuple[int, int]]] = {}    # EAN / modelo / código del modelo -> (producto, puntaje)
+        self.prefixes: Dict[str, List[int]] = {}             # modelo que puede aparecer al inicio de otro código
+        self.words: Dict[str, List[int]] = {}                # marca / nombre -> productos
+        for i, p in enumerate(self.products):
+            if p.ean: self.codes.setdefault(p.ean, []).append((i, SCORE_EAN))
+            if p.model:
+                self.codes.setdefault(p.model, []).append((i, SCORE_MODEL))
+                if len(p.model) >= MIN_PART: self.prefixes.setdefault(p.model, []).append(i)
+            for part in p.parts:
+                self.codes.setdefault(part, []).append((i, _part_score(len(part))))
+            for w in p.brand.union(*p.phrases):
+                self.words.setdefault(w, []).append(i)
+        self.prefix_lens = sorted({len(m) for m in self.prefixes})
+        self.max_len = max(map(len, self.codes), default=0)
+
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def for_term(cls, term: str) -> "ProductMatcher":
+        # Sin lote (búsqueda suelta): el término hace de producto; sus códigos, de modelo
+        if EAN_RE.fullmatch(_s(term)): return cls([{"ean": term}])
+        toks = tokens(term)
+        codes = [t for t in toks if CODE_RE.fullmatch(t)]
+        return cls([{"modelo": " ".join(codes), "producto": " ".join(t for t in toks if t not in codes)}])
+
+    def scan(self, text: str) -> Dict[int, int]:
+        # Puntaje de cada producto que la card identifica; vacío si ninguno
+        toks = tokens(text)
+        strong: Dict[int, int] = {}
+        codes, prefix_lens, max_len = self.codes, self.prefix_lens, self.max_len
+        for j, tok in enumerate(toks):
+            # el token solo y pegado a los siguientes ("rt" "38" -> "rt38"), mientras pueda ser una clave
+            g = tok
+            for k in range(j + 1, min(len(toks), j + MAX_GRAM) + 1):
+                if len(g) > max_len: break
+                for i, score in codes.get(g.lstrip("0") if g.isdigit() else g, ()):
+                    if score > strong.get(i, 0): strong[i] = score
+                if k < len(toks): g += toks[k]
+            for n in prefix_lens:
+                if n >= len(tok): break
+                for i in self.prefixes.get(tok[:n], ()):
+                    if _part_score(n) > strong.get(i, 0): strong[i] = _part_score(n)
+        seen: Dict[int, Set[str]] = {}
+        for t in set(toks):
+            for i in self.words.get(t, ()):
+                seen.setdefault(i, set()).add(t)
+        out: Dict[int, int] = {}
+        has_codes = None
+        for i in set(strong) | set(seen):
+            p, w = self.products[i], seen.get(i, set())
+            score = strong.get(i, 0)
+            named = any(ph <= w for ph in p.phrases)
+            if not score:
+                if not named: continue
+                # la card muestra un código que no es el de este producto: es otro con la misma descripción
+                if p.identified:
+                    if has_codes is None: has_codes = CODE_RE.search(text.lower()) is not None
+                    if has_codes: continue
+                score = SCORE_NAME
+            elif named:
+                score += SCORE_NAME
+            if p.brand and p.brand <= w: score += SCORE_BRAND
+            out[i] = score
+        return out
+
+    def assign(self, entries, cache: Optional[Dict[str, Dict[int, int]]] = None, min_score: int = 0) -> Dict[int, Tuple[int, str]]:
+        # entries: (texto en minúscula, títulos, precio). Cada card va al/los producto(s) de mayor puntaje;
+        # por producto queda la card de mayor puntaje (a igual puntaje, la primera)
+        best: Dict[int, Tuple[int, str]] = {}
+        for ctxt, titles, price in entries:
+            if not price: continue
+            text = " ".join([ctxt] + list(titles)) if titles else ctxt
+            scores = cache.get(text) if cache is not None else None
+            if scores is None:
+                scores = self.scan(text)
+                if cache is not None: cache[text] = scores
+            if not scores: continue
+            top = max(scores.values())
+            if top < min_score: continue
+            for i, score in scores.items():
+                if score == top and (i not in best or score > best[i][0]):
+                    best[i] = (score, price)
+        return best
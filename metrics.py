@@ -0,0 +1,130 @@
+# metrics.py
+# Métricas del camino caliente (duraciones, bytes, status, estrategias por vendedor) en memoria.
+# REGISTRY es global del proceso (/api/metrics, formato Prometheus); cada corrida usa un Metrics hijo
+# que además reenvía al global y da el resumen compacto por trabajo.
+import time, functools, threading
+from typing import Dict, Optional, Tuple
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# nombre -> (tipo, ayuda)
+METRICS = {
+    "scraper_http_requests_total": ("counter", "Pedidos HTTP a la red por host y status"),
+    "scraper_http_bytes_total": ("counter", "Bytes descargados por host"),
+    "scraper_http_seconds": ("histogram", "Duración de cada pedido HTTP a la red por host"),
+    "scraper_http_cache_total": ("counter", "Resultados de la caché HTTP (hit, miss, revalidated)"),
+    "scraper_stage_seconds": ("histogram", "Duración por etapa (http_get, http_download, extract_cards, pdf_text, pdf_ocr) y vendedor"),
+    "scraper_strategy_seconds": ("histogram", "Duración de cada intento de estrategia por vendedor"),
+    "scraper_strategy_total": ("counter", "Resultados de cada estrategia por vendedor (hit, miss, empty, error)"),
+    "scraper_selector_profile_total": ("counter", "Páginas resueltas con el perfil de selectores del vendedor (hit), con la cascada genérica teniendo perfil (fallback) o sin perfil (learn)"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(kw: Dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_esc(v)}"' for k, v in labels] + ([extra] if extra else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metrics:
+    def __init__(self, parent: Optional["Metrics"] = None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], list] = {}   # [conteos por bucket..., suma, cantidad]
+
+    def inc(self, name: str, n: float = 1.0, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + n
+        if self.parent: self.parent.inc(name, n, **labels)
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, b in enumerate(BUCKETS):
+                if seconds <= b: h[i] += 1
+            h[-2] += seconds; h[-1] += 1
+        if self.parent: self.parent.observe(name, seconds, **labels)
+
+    def render(self) -> str:
+        # Formato de exposición de texto de Prometheus
+        with self._lock:
+            counters = dict(self._counters); hists = {k: list(v) for k, v in self._hists.items()}
+        out = []
+        for name, (kind, help_) in METRICS.items():
+            series = sorted((k[1], v) for k, v in (counters if kind == "counter" else hists).items() if k[0] == name)
+            if not series: continue
+            out += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+            for labels, v in series:
+                if kind == "counter":
+                    out.append(f"{name}{_fmt_labels(labels)} {v:g}")
+                    continue
+                for b, c in zip(BUCKETS, v):
+                    le = 'le="%g"' % b
+                    out.append(f"{name}_bucket{_fmt_labels(labels, le)} {c}")
+                le = 'le="+Inf"'
+                out.append(f"{name}_bucket{_fmt_labels(labels, le)} {v[-1]}")
+                out.append(f"{name}_sum{_fmt_labels(labels)} {v[-2]:.6f}")
+                out.append(f"{name}_count{_fmt_labels(labels)} {v[-1]}")
+        return "\n".join(out) + "\n"
+
+    def summary(self) -> Dict:
+        # Resumen compacto para el trabajo: totales HTTP, tiempo por etapa y estrategias por vendedor
+        with self._lock:
+            counters = dict(self._counters); hists = {k: list(v) for k, v in self._hists.items()}
+        http = {"requests": 0, "bytes": 0, "seconds": 0.0, "status": {}, "cache": {}}
+        stages: Dict[str, Dict] = {}
+        vendors: Dict[str, Dict] = {}
+        for (name, labels), v in counters.items():
+            d = dict(labels)
+            if name == "scraper_http_requests_total":
+                http["requests"] += int(v); http["status"][d["status"]] = http["status"].get(d["status"], 0) + int(v)
+            elif name == "scraper_http_bytes_total":
+                http["bytes"] += int(v)
+            elif name == "scraper_http_cache_total":
+                http["cache"][d["result"]] = int(v)
+            elif name == "scraper_strategy_total":
+                st = vendors.setdefault(d["vendor"], {"seconds": 0.0, "strategies": {}})["strategies"].setdefault(d["strategy"], {})
+                st[d["outcome"]] = st.get(d["outcome"], 0) + int(v)
+            elif name == "scraper_selector_profile_total":
+                pr = vendors.setdefault(d["vendor"], {"seconds": 0.0, "strategies": {}}).setdefault("profile", {})
+                pr[d["outcome"]] = pr.get(d["outcome"], 0) + int(v)
+        for (name, labels), v in hists.items():
+            d = dict(labels)
+            if name == "scraper_http_seconds":
+                http["seconds"] += v[-2]
+            elif name == "scraper_stage_seconds":
+                sg = stages.setdefault(d["stage"], {"count": 0, "seconds": 0.0})
+                sg["count"] += v[-1]; sg["seconds"] += v[-2]
+            elif name == "scraper_strategy_seconds":
+                vd = vendors.setdefault(d["vendor"], {"seconds": 0.0, "strategies": {}})
+                vd["seconds"] += v[-2]
+                vd["strategies"].setdefault(d["strategy"], {})["seconds"] = round(v[-2], 3)
+        http["seconds"] = round(http["seconds"], 3)
+        for sg in stages.values(): sg["seconds"] = round(sg["seconds"], 3)
+        for vd in vendors.values(): vd["seconds"] = round(vd["seconds"], 3)
+        return {"http": http, "stages": stages, "vendors": vendors}
+
+REGISTRY = Metrics()
+
+def timed(stage: str, metric: str = "scraper_stage_seconds", label: str = "stage"):
+    # Decorador para métodos de objetos con .metrics y .vendor (HttpClient, PriceScraper)
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(self, *a, **kw)
+            finally:
+                self.metrics.observe(metric, time.perf_counter() - t0, **{label: stage, "vendor": self.vendor or ""})
+        return wrapper
+    return deco
@@ -0,0 +1,137 @@
+# ocr.py
+# OCR de folletos escaneados: páginas en paralelo (procesos), caché por hash de página,
+# primera pasada a baja resolución y corte temprano cuando ya aparecieron todos los términos
+import os, hashlib, tempfile, threading, multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Union
+
+from brochure_index import tokens
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", CACHE_DIR / "ocr"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+OCR_LANG = os.getenv("OCR_LANG", "spa+eng")
+
+class OcrResult(NamedTuple):
+    text: str
+    pages: int      # páginas del PDF
+    done: int       # páginas procesadas
+    cached: int     # páginas servidas desde la caché
+    complete: bool  # False si se cortó antes por encontrar todos los términos
+
+def _render(page, scale: float):
+    # pypdfium2 < 4 expone render_topil; >= 4 render().to_pil()
+    if hasattr(page, "render_topil"):
+        return page.render_topil(scale=scale, greyscale=False)
+    return page.render(scale=scale).to_pil()
+
+def ocr_page(pdf_path: str, index: int, scale: float, low_scale: float, min_chars: int, cache_dir: str, lang: str):
+    # Corre en un proceso del pool: abre el PDF desde disco (no se serializan los bytes)
+    import pypdfium2 as pdfium
+    import pytesseract
+    doc = pdfium.PdfDocument(pdf_path)
+    try:
+        page = doc.get_page(index)
+        thumb = _render(page, 0.4)
+        key = hashlib.sha1(f"{thumb.size}".encode() + thumb.tobytes()).hexdigest()
+        scales = (low_scale, scale) if low_scale and low_scale < scale else (scale,)
+        txt, hit = "", True
+        for sc in scales:
+            path = Path(cache_dir) / f"{key}-{sc:g}.txt"
+            try:
+                txt = path.read_text(encoding="utf-8")
+            except OSError:
+                hit = False
+                txt = pytesseract.image_to_string(_render(page, sc), lang=lang) or ""
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_text(txt, encoding="utf-8")
+                except OSError:
+                    pass
+            # escalar a mayor resolución sólo si la pasada rápida no reconoció casi nada
+            if len(txt.strip()) >= min_chars: break
+        return index, txt, hit
+    finally:
+        doc.close()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver/spawn: no se forkea un proceso con hilos de gunicorn en curso
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _all_found(seen: Set[str], term_groups: List[List[str]]) -> bool:
+    groups = [[set(tokens(v)) for v in g if tokens(v)] for g in term_groups]
+    return all(any(toks <= seen for toks in g) for g in groups if g)
+
+def ocr_pdf(pdf: Union[bytes, str, Path], term_groups: Optional[List[List[str]]] = None, scale: float = 2.2, low_scale: float = 1.2,
+            min_chars: int = 80, log: Optional[Callable[[str], None]] = None, workers: int = OCR_WORKERS) -> OcrResult:
+    log = log or (lambda *_: None)
+    import pypdfium2 as pdfium
+    # pdf: ruta de un archivo ya descargado (se usa tal cual) o bytes (se escriben a un temporal)
+    own = isinstance(pdf, (bytes, bytearray))
+    if own:
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+    else:
+        path = str(pdf)
+    try:
+        doc = pdfium.PdfDocument(path)
+        n = len(doc); doc.close()
+        args = (scale, low_scale, min_chars, str(OCR_CACHE_DIR), OCR_LANG)
+        texts: Dict[int, str] = {}
+        seen: Set[str] = set()
+        cached = 0
+        complete = True
+        if workers > 1 and n > 1:
+            try:
+                pool = _get_pool(workers)
+                # ventana acotada de páginas en vuelo: lo no enviado se puede omitir al cortar
+                pending = list(range(n)); running = set()
+                while pending or running:
+                    while pending and len(running) < workers:
+                        running.add(pool.submit(ocr_page, path, pending.pop(0), *args))
+                    done_futs, running = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done_futs:
+                        i, txt, hit = fut.result()
+                        texts[i] = txt; cached += hit
+                        seen.update(tokens(txt))
+                    if term_groups and pending and _all_found(seen, term_groups):
+                        complete = False
+                        log(f"OCR: términos encontrados, {len(pending)} página(s) omitidas")
+                        pending = []
+            except BrokenProcessPool:
+                log("OCR: pool de procesos caído, reintento en serie")
+                _reset_pool()
+                texts, seen, cached, complete = {}, set(), 0, True
+        if not texts:
+            for i in range(n):
+                _, txt, hit = ocr_page(path, i, *args)
+                texts[i] = txt; cached += hit
+                seen.update(tokens(txt))
+                if term_groups and i + 1 < n and _all_found(seen, term_groups):
+                    complete = False
+                    log(f"OCR: términos encontrados, {n - i - 1} página(s) omitidas")
+                    break
+        return OcrResult("\n".join(texts[i] for i in sorted(texts)), n, len(texts), cached, complete)
+    finally:
+        if own:
+            try: os.unlink(path)
+            except OSError: pass
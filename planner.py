@@ -0,0 +1,92 @@
+# planner.py
+# Planificación del lote: términos únicos entre todos los productos, "pool" de cards ya vistas por vendedor
+# y presupuesto de búsqueda por (producto, vendedor)
+import os, time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from brochure_index import tokens
+from matcher import ProductMatcher
+
+def term_key(term: str) -> str:
+    # "RT-38/XL", "rt38 xl" y "RT38  XL" se consultan una sola vez
+    return " ".join(tokens(term))
+
+def near_duplicate_keys(term: str) -> Tuple[str, Tuple[str, ...]]:
+    # "RT-38 XL" ~ "RT38 XL" (mismos caracteres) y "Samsung RT38" ~ "RT38 Samsung" (mismos tokens)
+    toks = tokens(term)
+    return "".join(toks), tuple(sorted(toks))
+
+SEARCH_MAX_REQUESTS = int(os.getenv("SEARCH_MAX_REQUESTS", 12))
+SEARCH_MAX_SECONDS = float(os.getenv("SEARCH_MAX_SECONDS", 90))
+SEARCH_EMPTY_STOP = int(os.getenv("SEARCH_EMPTY_STOP", 2))
+
+class QueryPlan:
+    def __init__(self, term_groups: List[List[str]], vendors: int):
+        self.term_groups = term_groups
+        self.vendors = vendors
+        self.terms_total = sum(len(g) for g in term_groups)
+        self.unique_keys = {term_key(t) for g in term_groups for t in g if term_key(t)}
+
+    def summary(self) -> str:
+        return (f"Plan: {len(self.term_groups)} producto(s) × {self.vendors} vendedor(es); "
+                f"términos {self.terms_total} → {len(self.unique_keys)} únicos; "
+                f"consultas máx. {self.terms_total * self.vendors} → {len(self.unique_keys) * self.vendors}")
+
+# Cards (texto, títulos, precio) de todas las páginas de resultados ya parseadas de un vendedor:
+# una búsqueda que devolvió 10 productos puede completar varias filas del lote sin otra consulta.
+# Cada card se puntúa una sola vez contra todo el lote (ProductMatcher) al entrar al pool
+class CardPool:
+    def __init__(self, matcher: ProductMatcher):
+        self.matcher = matcher
+        self.best: Dict[int, Tuple[int, str]] = {}     # producto -> (puntaje, precio)
+        self._scores: Dict[str, Dict[int, int]] = {}
+
+    def add(self, entries) -> Dict[int, Tuple[int, str]]:
+        # Devuelve la asignación de estas cards (la página actual); el pool guarda la mejor de todas
+        page = self.matcher.assign(entries, self._scores)
+        for i, (score, price) in page.items():
+            if i not in self.best or score > self.best[i][0]: self.best[i] = (score, price)
+        return page
+
+    def match(self, product: int) -> Optional[str]:
+        return self.best[product][1] if product in self.best else None
+
+# Tope por (producto, vendedor): pedidos a la red, segundos y respuestas "sin resultados" válidas del sitio.
+# Un producto que el vendedor no tiene se da por ND en pocos pedidos en vez de recorrer todas las variantes
+class SearchBudget:
+    def __init__(self, requests: Callable[[], int], max_requests: int = SEARCH_MAX_REQUESTS, max_seconds: float = SEARCH_MAX_SECONDS,
+                 empty_stop: int = SEARCH_EMPTY_STOP):
+        self._requests = requests
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+        self.empty_stop = empty_stop
+        self.r0 = requests()
+        self.t0 = time.monotonic()
+        self.empties = 0
+
+    def used(self) -> int:
+        return self._requests() - self.r0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.t0
+
+    def empty(self):
+        self.empties += 1
+
+    def reason(self) -> Optional[str]:
+        # None mientras quede presupuesto; si no, el motivo (para el log)
+        if self.empty_stop and self.empties >= self.empty_stop: return f"{self.empties} búsqueda(s) sin resultados"
+        if self.max_requests and self.used() >= self.max_requests: return f"{self.used()} pedido(s)"
+        if self.max_seconds and self.elapsed() >= self.max_seconds: return f"{self.elapsed():.0f}s"
+        return None
+
+    @contextmanager
+    def excluded(self):
+        # Trabajo de todo el lote (VTEX en bloque, índice de folletos): no se descuenta del producto que lo dispara
+        r0, t0 = self._requests(), time.monotonic()
+        try:
+            yield
+        finally:
+            self.r0 += self._requests() - r0
+            self.t0 += time.monotonic() - t0
@@ -0,0 +1,164 @@
+# ratelimit.py
+# Planificador de pedidos por host: token bucket (GCRA) + backoff ante 429/403 + Retry-After.
+# SharedHostScheduler guarda el turno y el enfriamiento de cada host en un almacén compartido (HostSlots):
+# la cortesía por host vale entre workers de gunicorn e instancias, no sólo dentro del proceso.
+import time, random, threading
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+class Cancelled(RuntimeError):
+    pass
+
+def host_of(url: str) -> str:
+    return (urlsplit(url or "").hostname or "").lower()
+
+def parse_retry_after(value) -> Optional[float]:
+    if value is None: return None
+    v = str(value).strip()
+    if not v: return None
+    if v.isdigit(): return float(v)
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except Exception:
+        return None
+
+@dataclass
+class HostPolicy:
+    rate: float = 0.0          # pedidos por segundo (0 = sin límite)
+    burst: int = 1             # pedidos permitidos en ráfaga
+    jitter: float = 0.0        # espera aleatoria extra (s) cuando hay que esperar
+    backoff_base: float = 2.0  # primer backoff ante 429/403 (s)
+    backoff_max: float = 120.0
+
+    @property
+    def interval(self) -> float:
+        return (1.0 / self.rate) if self.rate > 0 else 0.0
+
+    @classmethod
+    def from_delay_range(cls, delay_range: Tuple[float, float]) -> "HostPolicy":
+        # Equivale al viejo sleep(uniform(lo, hi)) entre pedidos al mismo host
+        lo, hi = (float(x) for x in delay_range)
+        return cls(rate=(1.0 / lo) if lo > 0 else 0.0, burst=1, jitter=max(0.0, hi - lo))
+
+    @classmethod
+    def from_dict(cls, d: Dict, default: Optional["HostPolicy"] = None) -> "HostPolicy":
+        base = default or cls()
+        def num(k, cast=float):
+            try: return cast(d[k]) if d.get(k) not in (None, "") else getattr(base, k)
+            except (TypeError, ValueError): return getattr(base, k)
+        return cls(rate=num("rate"), burst=max(1, num("burst", int)), jitter=num("jitter"),
+                   backoff_base=num("backoff_base"), backoff_max=num("backoff_max"))
+
+class _HostState:
+    __slots__ = ("tat", "cooldown_until", "failures", "requests", "wait_s", "fetch_s", "throttled")
+    def __init__(self):
+        self.tat = 0.0; self.cooldown_until = 0.0; self.failures = 0
+        self.requests = 0; self.wait_s = 0.0; self.fetch_s = 0.0; self.throttled = 0
+
+# acquire() reserva un turno y duerme sólo el hilo que pidió ese host;
+# penalize() abre un enfriamiento (Retry-After o backoff exponencial).
+class HostScheduler:
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, default: Optional[HostPolicy] = None, policies: Optional[Dict[str, HostPolicy]] = None):
+        self.default = default or HostPolicy()
+        self.policies: Dict[str, HostPolicy] = dict(policies or {})
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def set_policy(self, host: str, policy: HostPolicy):
+        with self._lock:
+            self.policies[host] = policy
+
+    def policy(self, host: str) -> HostPolicy:
+        return self.policies.get(host, self.default)
+
+    def _state(self, host: str) -> _HostState:
+        st = self._hosts.get(host)
+        if st is None:
+            st = self._hosts[host] = _HostState()
+        return st
+
+    # --- turno y enfriamiento; SharedHostScheduler los lleva al almacén compartido. Se llaman sin self._lock, que
+    # sólo protege el estado local: un hilo esperando la base compartida no frena a los de otros hosts ---
+    def _reserve(self, host: str, pol: HostPolicy, now: float) -> float:
+        with self._lock:
+            st = self._state(host)
+            start = max(now, st.cooldown_until)
+            ready = max(start, st.tat - (pol.burst - 1) * pol.interval)
+            if ready > now and pol.jitter > 0:
+                ready += random.uniform(0, pol.jitter)
+            st.tat = max(st.tat, ready) + pol.interval
+            return ready
+
+    def _cooldown_until(self, host: str) -> float:
+        with self._lock:
+            return self._state(host).cooldown_until
+
+    def _cool(self, host: str, until: float):
+        with self._lock:
+            st = self._state(host)
+            st.cooldown_until = max(st.cooldown_until, until)
+
+    def acquire(self, host: str, cancel_cb: Optional[Callable[[], bool]] = None) -> float:
+        cancel_cb = cancel_cb or (lambda: False)
+        waited = 0.0
+        while True:
+            ready = self._reserve(host, self.policy(host), self.clock())
+            while True:
+                if cancel_cb(): raise Cancelled("cancelled")
+                left = ready - self.clock()
+                if left <= 0: break
+                time.sleep(min(left, 0.5)); waited += min(left, 0.5)
+            # un 429 pudo abrir un enfriamiento mientras esperábamos: volver a reservar
+            if self.clock() < self._cooldown_until(host): continue
+            with self._lock:
+                st = self._state(host)
+                st.requests += 1; st.wait_s += waited
+            return waited
+
+    def record_fetch(self, host: str, seconds: float):
+        with self._lock:
+            self._state(host).fetch_s += seconds
+
+    def penalize(self, host: str, retry_after=None) -> float:
+        with self._lock:
+            pol = self.policy(host); st = self._state(host)
+            st.failures += 1; st.throttled += 1
+            delay = parse_retry_after(retry_after)
+            if delay is not None:
+                delay = min(delay, pol.backoff_max)
+            else:
+                delay = min(pol.backoff_max, pol.backoff_base * (2 ** (st.failures - 1))) * random.uniform(1.0, 1.5)
+        self._cool(host, self.clock() + delay)
+        return delay
+
+    def reward(self, host: str):
+        with self._lock:
+            self._state(host).failures = 0
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {h: {"requests": st.requests, "wait_s": round(st.wait_s, 3), "fetch_s": round(st.fetch_s, 3), "throttled": st.throttled}
+                    for h, st in self._hosts.items()}
+
+class SharedHostScheduler(HostScheduler):
+    # Turnos sobre reloj de pared (comparable entre procesos y máquinas); las estadísticas siguen siendo locales.
+    # slots: reserve(host, interval, burst, jitter, now) -> turno, cooldown_until(host), cool(host, until)
+    clock = staticmethod(time.time)
+
+    def __init__(self, slots, default: Optional[HostPolicy] = None, policies: Optional[Dict[str, HostPolicy]] = None):
+        super().__init__(default, policies)
+        self.slots = slots
+
+    def _reserve(self, host: str, pol: HostPolicy, now: float) -> float:
+        return self.slots.reserve(host, pol.interval, pol.burst, pol.jitter, now)
+
+    def _cooldown_until(self, host: str) -> float:
+        return self.slots.cooldown_until(host)
+
+    def _cool(self, host: str, until: float):
+        super()._cool(host, until)
+        self.slots.cool(host, until)
@@ -1,39 +1,36 @@
 # scraper.py
-import re, io, time, random
+# Dependencias pesadas (pandas, BeautifulSoup/soupsieve, pdfminer, pypdfium2/PIL/pytesseract) se importan en el
+# camino que las usa: un arranque en frío que sólo atiende /api/health o /api/vendors no las carga.
+import re, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from importlib.util import find_spec
 from typing import Dict, List, Tuple, Optional, Callable
 from datetime import datetime
 
-import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from pdfminer.high_level import extract_text as pdf_extract_text
 
-# Opcional: curl_cffi para reducir 403 (si está disponible)
-try:
-    from curl_cffi import requests as curl_requests
-    HAVE_CURLCFFI = True
-except Exception:
-    HAVE_CURLCFFI = False
+from brochure_index import BrochureIndex, BrochureTextStore
+from catalog import CATALOG_MAX_PAGES, CatalogBuilder, CatalogStore, page_keys, product_info, product_keys
+from downloads import HTML_MAX_BYTES, PDF_MAX_BYTES, Download, discard, read_html
+from history import HistoryStore
+from http_cache import CacheCounters, ResponseCache, default_response_cache
+from matcher import STRONG, ProductMatcher
+from metrics import REGISTRY, Metrics, timed
+from ocr import ocr_pdf
+from planner import CardPool, QueryPlan, SearchBudget, near_duplicate_keys, term_key
+from ratelimit import Cancelled, HostPolicy, HostScheduler, host_of
+from sessions import HAVE_CURLCFFI, SessionPool, default_session_pool
+from selector_profiles import Profile, SelectorProfiles, default_selector_profiles
+from strategy_cache import StrategyCache, default_strategy_cache, detect_platform
 
-# Opcional: pypdfium2 + PIL + pytesseract para OCR de folletos escaneados
-try:
-    import pypdfium2 as pdfium
-    from PIL import Image
-    HAVE_PDFIUM = True
-except Exception:
-    HAVE_PDFIUM = False
+# Opcional: pypdfium2 + PIL + pytesseract para OCR de folletos escaneados (se importan en ocr.py, en el pool)
+def _installed(*modules: str) -> bool:
+    return all(find_spec(m) is not None for m in modules)
 
-try:
-    import pytesseract
-    HAVE_TESS = True
-except Exception:
-    HAVE_TESS = False
-
-UA_POOL = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
-]
+HAVE_PDFIUM = _installed("pypdfium2", "PIL")
+HAVE_TESS = _installed("pytesseract")
 
 PRICE_CSS = [
     ".woocommerce-Price-amount.amount",".price",".product-price",".prices",
@@ -48,199 +45,750 @@ TITLE_SELECTORS = [
     "h1","h2","h3","a[title]"
 ]
 PRICE_PAT = re.compile(r"\$?\s*\d[\d\.\,]*")
+STRUCK_TAGS = ("del", "s", "strike")
+EAN_PAT = re.compile(r"\d{8,14}")
+
+# VTEX en bloque: EANs por consulta (fq repetido) y paginado de _from/_to
+VTEX_BULK_EANS = 20
+VTEX_PAGE = 50
+VTEX_BULK_MAX_PAGES = 5
 
 def s(x): return "" if x is None else str(x).strip()
 
+# Regex precompiladas del camino caliente (normalización y precios)
+WS_RE = re.compile(r"\s+")
+NON_PRICE_CHARS_RE = re.compile(r"[^\d\.,]")
+TRAILING_CENTS_RE = re.compile(r"\.\d{1,2}\s*$")
+NON_DIGIT_RE = re.compile(r"\D")
+NON_TERM_CHARS_RE = re.compile(r"[^A-Za-z0-9 ÁÉÍÓÚÜÑáéíóúüñ\-_/\.]")
+
 def strip_decimal_and_non_digits(text: str) -> Optional[str]:
     if text is None: return None
-    keep = re.sub(r"[^\d\.,]", "", str(text))
+    keep = NON_PRICE_CHARS_RE.sub("", str(text))
     if "," in keep:
         keep = keep.split(",", 1)[0]
     else:
-        keep = re.sub(r"\.\d{1,2}\s*$", "", keep)
-    digits = re.sub(r"\D", "", keep)
+        keep = TRAILING_CENTS_RE.sub("", keep)
+    digits = NON_DIGIT_RE.sub("", keep)
     return digits or None  # convierte “4.999.000,00” -> “4999000”, “6225.0” -> “6225”. [web:523]
 
+def first_price(text: str) -> Optional[str]:
+    # Monto suelto en un texto: no pegado a un código ("RT38", "382L") ni de menos de 3 dígitos ("12 cuotas");
+    # primero los que llevan "$"
+    found = []
+    for m in PRICE_PAT.finditer(text or ""):
+        if (m.start() > 0 and text[m.start() - 1].isalnum()) or (m.end() < len(text) and text[m.end()].isalnum()): continue
+        p = strip_decimal_and_non_digits(m.group(0))
+        if p and len(p) >= 3:
+            if "$" in m.group(0): return p
+            found.append(p)
+    return found[0] if found else None
+
 def plain_from_float(v: float) -> str:
     return str(int(float(v)))  # 6225.0 -> “6225” sin decimales. [web:523]
 
 def normalize_spaces(txt: str) -> str:
-    return re.sub(r"\s+", " ", txt or "").strip()
+    return WS_RE.sub(" ", txt or "").strip()
 
-def mk_variants_for_match(term: str) -> List[str]:
+@lru_cache(maxsize=8192)
+def _variants_for_match(term: str) -> Tuple[str, ...]:
     base = normalize_spaces(term)
     v = [base]
-    v2 = re.sub(r"[^A-Za-z0-9 ÁÉÍÓÚÜÑáéíóúüñ\-_/\.]", " ", base)
+    v2 = NON_TERM_CHARS_RE.sub(" ", base)
     v2 = normalize_spaces(v2)
     if v2 and v2.lower() not in [x.lower() for x in v]: v.append(v2)
     v3 = base.replace("/", " ").replace('"', " ").replace("'", " ")
     if v3.lower() not in [x.lower() for x in v]: v.append(normalize_spaces(v3))
-    return v
+    return tuple(v)
 
-def text_matches_any_variant(text: str, variants: List[str]) -> bool:
-    lt = normalize_spaces(text).lower()
-    for v in variants:
-        if all(tok in lt for tok in normalize_spaces(v).lower().split()):
-            return True
-    return False
+def mk_variants_for_match(term: str) -> List[str]:
+    return list(_variants_for_match(term))
 
-# ---------------- HTTP endurecido con fallback curl_cffi ----------------
-DEFAULT_HEADERS = {
-    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    "accept-language": "es-AR,es;q=0.9,en-US;q=0.8,en;q=0.7",
-    "cache-control": "no-cache",
-    "upgrade-insecure-requests": "1",
-    "sec-fetch-site": "none",
-    "sec-fetch-mode": "navigate",
-    "sec-fetch-user": "?1",
-    "sec-fetch-dest": "document",
-    "pragma": "no-cache",
-}
-def browser_headers(domain: str) -> dict:
-    ua = random.choice(UA_POOL)
-    h = dict(DEFAULT_HEADERS)
-    h["user-agent"] = ua
-    h["sec-ch-ua"] = '"Chromium";v="120", "Google Chrome";v="120", "Not:A-Brand";v="99"'
-    h["sec-ch-ua-platform"] = '"Windows"'
-    h["sec-ch-ua-mobile"] = "?0"
-    h["referer"] = f"{domain.rstrip('/')}/"
-    return h
+# lxml (parser + XPath en C) es bastante más rápido que html.parser + soupsieve; si no está, BeautifulSoup
+try:
+    import lxml.html
+    from lxml import etree
+    HAVE_LXML = True
+except Exception:
+    HAVE_LXML = False
+HTML_PARSER = "lxml" if HAVE_LXML else "html.parser"
+
+def make_soup(html: str):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html or "", HTML_PARSER)
+
+# Traducción CSS -> XPath para los selectores simples que usamos: tag, .clase, [attr], [attr='v'], [attr*='v' i]
+_SIMPLE_SEL_RE = re.compile(r"^([a-zA-Z][\w-]*|\*)?((?:\.[\w-]+|\[[^\]]+\])*)$")
+_SEL_PART_RE = re.compile(r"\.([\w-]+)|\[\s*([\w-]+)\s*(?:(\*?=)\s*['\"]([^'\"]*)['\"]\s*(i)?)?\s*\]")
+_UPPER, _LOWER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+
+def css_to_xpath(sel: str) -> str:
+    m = _SIMPLE_SEL_RE.match(sel.strip())
+    if not m: raise ValueError(f"selector no soportado: {sel}")
+    conds = []
+    for cls, attr, op, val, ci in _SEL_PART_RE.findall(m.group(2)):
+        if cls:
+            conds.append(f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')")
+        elif not op:
+            conds.append(f"@{attr}")
+        else:
+            a = f"translate(@{attr}, '{_UPPER}', '{_LOWER}')" if ci else f"@{attr}"
+            v = val.lower() if ci else val
+            conds.append(f"contains({a}, '{v}')" if op == "*=" else f"{a}='{v}'")
+    return (m.group(1) or "*") + "".join(f"[{c}]" for c in conds)
+
+@lru_cache(maxsize=512)
+def _compiled_xpath(sel: str):
+    return etree.XPath("descendant::" + css_to_xpath(sel))
+
+@lru_cache(maxsize=512)
+def _compiled_css(sel: str):
+    import soupsieve as sv
+    return sv.compile(sel)
+
+class HtmlPage:
+    # Página parseada una sola vez; cards y precios con selectores precompilados
+    def __init__(self, html: Optional[str] = None, root=None):
+        self.root = None; self.soup = None
+        if root is not None:
+            # árbol ya parseado de forma incremental (HttpClient.get_page)
+            self.root = root
+            etree.strip_elements(self.root, "script", "style", etree.Comment, with_tail=False)
+        elif HAVE_LXML:
+            try:
+                try:
+                    self.root = lxml.html.fromstring(html or "<html></html>")
+                except ValueError:  # str con declaración <?xml encoding=...?>
+                    self.root = lxml.html.fromstring((html or "").encode("utf-8"))
+                etree.strip_elements(self.root, "script", "style", etree.Comment, with_tail=False)
+            except (etree.ParserError, ValueError):
+                self.root = None
+        if self.root is None:
+            from bs4 import BeautifulSoup
+            self.soup = BeautifulSoup(html or "", "html.parser")
+
+    def select(self, el, sel: str) -> List:
+        el = self.root if el is None and self.root is not None else (self.soup if el is None else el)
+        if self.root is not None:
+            try: return _compiled_xpath(sel)(el)
+            except ValueError: return []  # selector complejo: sin equivalente XPath
+        return _compiled_css(sel).select(el)
+
+    def first(self, el, sel: str):
+        found = self.select(el, sel)
+        return found[0] if found else None
+
+    def node_text(self, el) -> str:
+        if self.root is not None:
+            return " ".join(t.strip() for t in el.itertext() if t.strip())
+        return el.get_text(" ", strip=True)
+
+    def text(self) -> str:
+        return self.node_text(self.root if self.root is not None else self.soup)
+
+    def struck(self, el) -> bool:
+        # precio tachado (el anterior a la oferta): dentro de <del>/<s>/<strike>
+        if self.root is not None:
+            return el.tag in STRUCK_TAGS or next(el.iterancestors(*STRUCK_TAGS), None) is not None
+        return el.name in STRUCK_TAGS or el.find_parent(STRUCK_TAGS) is not None
+
+    def body_classes(self) -> set:
+        if self.root is not None:
+            return set(" ".join(self.root.xpath("//body/@class")).split())
+        body = self.soup.body
+        return set(body.get("class") or []) if body else set()
+
+    def cards(self, selectors: List[str] = CARD_SELECTORS) -> List:
+        return [card for _, card in self.tagged_cards(selectors)]
+
+    def tagged_cards(self, selectors: List[str] = CARD_SELECTORS) -> List[Tuple[str, object]]:
+        # (selector, card) en orden de prioridad de selectores (como la cascada original), sin repetir cards
+        out, seen = [], set()
+        for cs in selectors:
+            for card in self.select(None, cs):
+                if id(card) in seen: continue
+                seen.add(id(card)); out.append((cs, card))
+        return out
 
+# Respuesta válida del buscador del sitio sin ningún resultado (no un error ni una página que no es de búsqueda)
+class NoResults(Exception):
+    pass
+
+# Clases de <body> que ponen las plataformas en la página de búsqueda: WordPress marca la vacía,
+# Magento marca la de resultados (vacía si además no hay cards)
+WP_NO_RESULTS = "search-no-results"
+MAGENTO_SEARCH = "catalogsearch-result-index"
+
+def is_no_results_page(page: HtmlPage, cards: List) -> bool:
+    bc = page.body_classes()
+    return WP_NO_RESULTS in bc or (MAGENTO_SEARCH in bc and not cards)
+
+@lru_cache(maxsize=64)
+def _self_xpath(sel: str):
+    return etree.XPath("self::" + css_to_xpath(sel))
+
+class GridWatcher:
+    # Lectura incremental (se consulta tras cada bloque): la grilla es el padre que agrupa más cards de más afuera
+    # (fuera de header/nav/aside/footer; un envoltorio con una sola card cuenta como la card). Está cerrada cuando
+    # después de ella terminó un bloque sin cards, o empezó un footer/aside: un carrusel de destacados antes de los
+    # resultados no corta la lectura, porque lo que le sigue son más cards. Desde ahí el resto no cambia el resultado
+    SKIP = ("header", "nav", "aside", "footer")
+    FILLER = ("script", "style", "noscript", "template")
+
+    def __init__(self, selectors: List[str] = CARD_SELECTORS):
+        self.selectors = selectors
+        self.root = None
+
+    def _is_card(self, el) -> bool:
+        return any(_self_xpath(cs)(el) for cs in self.selectors)
+
+    def _has_cards(self, el) -> bool:
+        return self._is_card(el) or any(_compiled_xpath(cs)(el) for cs in self.selectors)
+
+    def _find_grid(self):
+        groups: Dict = {}
+        tops = set()
+        for cs in self.selectors:
+            for card in _compiled_xpath(cs)(self.root):
+                top = card
+                for anc in card.iterancestors():
+                    if anc.tag in self.SKIP: top = None; break
+                    if anc.get("class") and self._is_card(anc): top = anc
+                if top is None or top in tops or top.getparent() is None: continue
+                tops.add(top)
+                while top.getparent().getparent() is not None and len(top.getparent()) == 1: top = top.getparent()
+                groups[top.getparent()] = groups.get(top.getparent(), 0) + 1
+        return max(groups, key=groups.get) if groups else None
+
+    def _ended(self, el) -> bool:
+        # un elemento terminó de parsearse si ya empezó algo después de él
+        return el.getnext() is not None or any(a.getnext() is not None for a in el.iterancestors())
+
+    def _closed(self, grid) -> bool:
+        for el in (grid, *grid.iterancestors()):
+            for sib in el.itersiblings():
+                if not isinstance(sib.tag, str) or sib.tag in self.FILLER: continue
+                if sib.tag in self.SKIP: return True
+                if not self._ended(sib): return False
+                if not self._has_cards(sib) and "".join(sib.itertext()).strip(): return True
+        return False
+
+    def __call__(self, events) -> bool:
+        # eventos: sólo el "start" del elemento raíz
+        for _, el in events:
+            if self.root is None: self.root = el
+        if self.root is None: return False
+        grid = self._find_grid()
+        return grid is not None and self._closed(grid)
+
+# ---------------- HTTP endurecido con fallback curl_cffi ----------------
 class HttpClient:
-    def __init__(self, delay_range=(2,5), log=None, cancel_cb=None):
+    def __init__(self, delay_range=(2,5), log=None, cancel_cb=None, scheduler: Optional[HostScheduler]=None, max_retries: int=2,
+                 cache: Optional[ResponseCache]=None, cache_counters: Optional[CacheCounters]=None, metrics: Optional[Metrics]=None, vendor: str="",
+                 sessions: Optional[SessionPool]=None):
         self.delay_range = delay_range
+        self.metrics = metrics or REGISTRY
+        self.vendor = vendor
+        self.cache = cache
+        self.cache_counters = cache_counters or CacheCounters()
         self.log = log or (lambda *_: None)
         self.cancel_cb = cancel_cb or (lambda: False)
-        self.rs = requests.Session()
-        self.crs = curl_requests.Session() if HAVE_CURLCFFI else None
+        self.scheduler = scheduler or HostScheduler(HostPolicy.from_delay_range(delay_range))
+        self.max_retries = max_retries
+        # Sesiones del proceso: conexiones y TLS siguen vivos entre lotes y trabajos
+        self.sessions = sessions or default_session_pool()
+        self.requests = 0   # pedidos a la red (para el presupuesto por producto)
+
+    def _fetch(self, host, fn, url, **kw):
+        # espera el turno del host (no bloquea a otros hosts) y mide la descarga
+        self.scheduler.acquire(host, self.cancel_cb)
+        self.requests += 1
+        t0 = time.perf_counter()
+        r = None
+        try:
+            r = fn(url, **kw)
+            return r
+        finally:
+            dt = time.perf_counter() - t0
+            self.scheduler.record_fetch(host, dt)
+            self.metrics.observe("scraper_http_seconds", dt, host=host)
+            self.metrics.inc("scraper_http_requests_total", host=host, status=r.status_code if r is not None else "error")
+            # en streaming los bytes se cuentan al leer el cuerpo
+            if r is not None and not kw.get("stream"): self.metrics.inc("scraper_http_bytes_total", len(r.content), host=host)
 
-    def _prep(self, url):
-        base = re.match(r"^https?://[^/]+", url)
-        if base:
-            hdr = browser_headers(base.group(0))
-            self.rs.headers.clear(); self.rs.headers.update(hdr)
-            if self.crs:
-                self.crs.headers.clear(); self.crs.headers.update(hdr)
+    def _throttled(self, host, r) -> bool:
+        if r.status_code in (403, 429, 503):
+            delay = self.scheduler.penalize(host, r.headers.get("Retry-After"))
+            self.log(f"HTTP {r.status_code} en {host}: backoff {delay:.1f}s")
+            return True
+        self.scheduler.reward(host)
+        return False
+
+    def _cache_lookup(self, url, params):
+        # (clave, entrada, vigente): vigente -> se sirve desde disco sin ir a la red
+        if not self.cache: return None, None, False
+        key = self.cache.key(url, params)
+        entry = self.cache.lookup(key)
+        if entry and entry.fresh:
+            self.cache_counters.inc("hits"); self.metrics.inc("scraper_http_cache_total", result="hit")
+            self.log(f"CACHE {url}" + (f" params={params}" if params else ""))
+            return key, entry, True
+        return key, entry, False
+
+    def _cache_revalidated(self, entry, r):
+        self.cache_counters.inc("revalidated"); self.metrics.inc("scraper_http_cache_total", result="revalidated")
+        return self.cache.refresh(entry, r.headers)
+
+    def _cache_miss(self):
+        self.cache_counters.inc("misses"); self.metrics.inc("scraper_http_cache_total", result="miss")
 
+    @timed("http_get")
     def get(self, url, params=None, timeout=25):
-        if self.cancel_cb(): raise RuntimeError("cancelled")
-        self._prep(url)
-        self.log(f"GET {url}" + (f" params={params}" if params else ""))
+        if self.cancel_cb(): raise Cancelled("cancelled")
+        key, entry, fresh = self._cache_lookup(url, params)
+        if fresh: return entry.response()
+        r = self._get_network(url, params, timeout, entry.validators() if entry else None)
+        if entry and r.status_code == 304:
+            return self._cache_revalidated(entry, r).response()
+        if self.cache:
+            self._cache_miss()
+            if r.status_code == 200 and self.cache.store(key, url, params, r):
+                self.cache_counters.inc("stored")
+        return r
+
+    def get_page(self, url, params=None, timeout=25, max_bytes: int = HTML_MAX_BYTES) -> HtmlPage:
+        # Búsquedas HTML: se parsea mientras llega y se deja de leer cuando se cerró la grilla de resultados.
+        # Sin lxml va por get(), que ya mide el pedido: http_get se cuenta una sola vez en los dos caminos
+        if not HAVE_LXML: return HtmlPage(self.get(url, params=params, timeout=timeout).text)
+        return self._get_page_streamed(url, params, timeout, max_bytes)
+
+    @timed("http_get")
+    def _get_page_streamed(self, url, params, timeout, max_bytes: int) -> HtmlPage:
+        if self.cancel_cb(): raise Cancelled("cancelled")
+        key, entry, fresh = self._cache_lookup(url, params)
+        if fresh: return HtmlPage(entry.response().text)
+        r = self._get_network(url, params, timeout, entry.validators() if entry else None, stream=True)
+        if entry and r.status_code == 304:
+            discard(r)
+            return HtmlPage(self._cache_revalidated(entry, r).response().text)
+        ctype = r.headers.get("content-type") or ""
+        enc = ctype.split("charset=", 1)[1].split(";")[0].strip().strip('"') if "charset=" in ctype.lower() else None
+        kw = {"encoding": enc} if enc else {}
+        parser = etree.HTMLPullParser(events=("start",), tag="html", **kw)
+        body, complete = read_html(r, parser, GridWatcher(), max_bytes)
+        self.metrics.inc("scraper_http_bytes_total", len(body), host=host_of(url))
+        try:
+            root = parser.close()
+        except etree.XMLSyntaxError:
+            root = None
+        if not complete:
+            self.log(f"HTML cortado tras la grilla ({len(body) // 1024} KB leídos) {r.url}")
+        if self.cache:
+            self._cache_miss()
+            # sólo se guarda el cuerpo completo
+            r._content, r._content_consumed = body, True
+            if complete and r.status_code == 200 and self.cache.store(key, url, params, r):
+                self.cache_counters.inc("stored")
+        if root is None:
+            return HtmlPage(body.decode(enc or "utf-8", "replace"))
+        return HtmlPage(root=root)
+
+    @timed("http_download")
+    def download(self, url, timeout=45, max_bytes: int = PDF_MAX_BYTES) -> Download:
+        # Descarga grande (folletos) en streaming a disco con tope de tamaño; desde caché se usa el cuerpo guardado
+        if self.cancel_cb(): raise Cancelled("cancelled")
+        key, entry, fresh = self._cache_lookup(url, None)
+        if fresh: return Download(entry.body_path, url, temp=False)
+        r = self._get_network(url, None, timeout, entry.validators() if entry else None, stream=True)
+        if entry and r.status_code == 304:
+            discard(r)
+            return Download(self._cache_revalidated(entry, r).body_path, url, temp=False)
         try:
-            r = self.rs.get(url, params=params, timeout=timeout, allow_redirects=True)
+            dl = Download.fetch(r, url, max_bytes, dir=self.cache.root if self.cache else None)
+        finally:
+            r.close()
+        self.metrics.inc("scraper_http_bytes_total", dl.size, host=host_of(url))
+        if self.cache:
+            self._cache_miss()
+            # el archivo abierto sigue válido tras moverlo a la caché
+            stored = self.cache.store_file(key, url, None, r, dl.path) if r.status_code == 200 else None
+            if stored:
+                self.cache_counters.inc("stored")
+                dl.path, dl.temp = stored, False
+        return dl
+
+    def _get_network(self, url, params, timeout, cond_headers=None, stream=False):
+        host = host_of(url)
+        hs = self.sessions.for_url(url)
+        self.log(f"GET {url}" + (f" params={params}" if params else ""))
+        kw = {"params": params, "timeout": timeout, "allow_redirects": True}
+        if cond_headers: kw["headers"] = cond_headers
+        if stream: kw["stream"] = True
+        for attempt in range(self.max_retries + 1):
+            r = self._fetch(host, hs.get, url, **kw)
             self.log(f"HTTP {r.status_code} {r.url}")
+            if self._throttled(host, r):
+                if r.status_code == 403 and HAVE_CURLCFFI and not hs.http2:
+                    r2 = self._fetch(host, hs.curl_get, url, **kw)
+                    self.log(f"HTTP {r2.status_code} {r2.url} (curl_cffi)")
+                    self._throttled(host, r2)
+                    discard(r)
+                    if not r2.ok: discard(r2)
+                    r2.raise_for_status()
+                    return r2
+                if r.status_code == 429 and attempt < self.max_retries:
+                    discard(r)
+                    continue
+            if not r.ok: discard(r)
             r.raise_for_status()
-            time.sleep(random.uniform(*self.delay_range))
             return r
-        except requests.HTTPError as e:
-            if self.crs and getattr(e.response, "status_code", 0) == 403:
-                r2 = self.crs.get(url, params=params, timeout=timeout, allow_redirects=True, impersonate="chrome124")
-                self.log(f"HTTP {r2.status_code} {r2.url} (curl_cffi)")
-                r2.raise_for_status()
-                time.sleep(random.uniform(*self.delay_range))
-                return r2
-            raise
 
 # ============================== Scraper ==============================
 class PriceScraper:
-    def __init__(self, headless: bool = True, delay_range: Tuple[int,int]=(2,5)):
-        self.client: Optional[HttpClient] = None
+    def __init__(self, headless: bool = True, delay_range: Tuple[int,int]=(2,5), max_workers: Optional[int]=None, rate_limits: Optional[Dict[str, Dict]]=None, strategy_cache: Optional[StrategyCache]=None,
+                 use_cache: bool = True, response_cache: Optional[ResponseCache]=None, history: Optional[HistoryStore]=None, scheduler: Optional[HostScheduler]=None,
+                 catalog: Optional[CatalogStore]=None, selector_profiles: Optional[SelectorProfiles]=None):
         self.delay_range = delay_range
+        self.response_cache = (response_cache or default_response_cache()) if use_cache else None
+        self.cache_counters = CacheCounters()
+        self.brochure_texts = BrochureTextStore()
+        self._term_groups: List[List[str]] = []
+        self._matcher: Optional[ProductMatcher] = None
+        self._batch_eans: set = set()
+        self.plan_counters = CacheCounters()
+        self.history = history
+        # catalog: índice de fichas por vendedor (catalog.py); con él se prueba la ficha antes que el buscador
+        self.catalog = catalog
+        self._fresh: Dict[Tuple[int, str], Tuple[str, str, float]] = {}
+        self._memo: Dict[Tuple[str, str], object] = {}
+        self._memo_lock = threading.Lock()
+        self.strategy_cache = strategy_cache or default_strategy_cache()
+        self.selector_profiles = selector_profiles or default_selector_profiles()
+        self.max_workers = max_workers
+        self.rate_limits = rate_limits or {}
+        # scheduler: p. ej. SharedHostScheduler para que el ritmo por host valga entre procesos
+        self.scheduler = scheduler or HostScheduler(HostPolicy.from_delay_range(delay_range))
+        self.last_stats: Dict[str, Dict] = {}
+        self.metrics = Metrics(parent=REGISTRY)
+        self.last_metrics: Dict = {}
+        self._local = threading.local()
+
+    # Cada hilo (un vendedor) usa su propio HttpClient: sesión y delay independientes
+    @property
+    def client(self) -> Optional[HttpClient]:
+        return getattr(self._local, "client", None)
+
+    @client.setter
+    def client(self, c: Optional[HttpClient]):
+        self._local.client = c
+
+    @property
+    def vendor(self) -> str:
+        return getattr(self.client, "vendor", "")
+
+    # Memo por lote: cada folleto/página se descarga y procesa una sola vez
+    def _batch_excluded(self):
+        budget = getattr(self._local, "budget", None)
+        return budget.excluded() if budget else nullcontext()
+
+    def _batch_memo(self, kind: str, key: str, fn):
+        with self._memo_lock:
+            if (kind, key) in self._memo: return self._memo[(kind, key)]
+        with self._batch_excluded():
+            val = fn()
+        with self._memo_lock:
+            return self._memo.setdefault((kind, key), val)
 
     # ---------- extracción confiable desde “cards” ----------
-    def _extract_from_cards(self, soup: BeautifulSoup, term: str) -> Optional[str]:
-        variants = mk_variants_for_match(term)
-        for cs in CARD_SELECTORS:
-            for card in soup.select(cs):
-                ctxt = card.get_text(" ", strip=True)
-                title_ok = text_matches_any_variant(ctxt, variants)
-                if not title_ok:
-                    for ts in TITLE_SELECTORS:
-                        t = card.select_one(ts)
-                        if t and text_matches_any_variant(t.get_text(" ", strip=True), variants):
-                            title_ok = True; break
-                if not title_ok: continue
-                for ps in PRICE_CSS:
-                    el = card.select_one(ps)
-                    if el:
-                        p = strip_decimal_and_non_digits(el.get_text(" ", strip=True))
+    def _card_price_sel(self, page: HtmlPage, card, ctxt: str, selectors: List[str] = PRICE_CSS) -> Tuple[Optional[str], str]:
+        # Precio y el selector que lo dio ("" si salió del texto de la card)
+        for ps in selectors:
+            for el in page.select(card, ps):
+                if page.struck(el): continue
+                p = strip_decimal_and_non_digits(page.node_text(el))
+                if p: return p, ps
+                break
+        return first_price(ctxt), ""
+
+    def _card_price(self, page: HtmlPage, card, ctxt: str) -> Optional[str]:
+        return self._card_price_sel(page, card, ctxt)[0]
+
+    def _card_entries(self, page: HtmlPage, profile: Optional[Profile] = None) -> Tuple[List[Tuple[str, List[str], Optional[str]]], List[Profile]]:
+        # Cada card se visita una vez. No hace falta mirar TITLE_SELECTORS:
+        # el texto del título ya está contenido en el de la card.
+        # Con perfil del vendedor, sólo su selector de card y el de precio. Devuelve también el par usado por card
+        out, used = [], []
+        tagged = [(profile[0], card) for card in page.select(None, profile[0])] if profile else page.tagged_cards()
+        price_css = ([profile[1]] if profile[1] else []) if profile else PRICE_CSS
+        for cs, card in tagged:
+            ctxt = normalize_spaces(page.node_text(card)).lower()
+            price, ps = self._card_price_sel(page, card, ctxt, price_css)
+            out.append((ctxt, [], price)); used.append((cs, ps))
+        return out, used
+
+    def _match_cards(self, entries, term: str) -> Optional[str]:
+        # Precio de la card que mejor identifica al producto en curso. Dentro de un lote cada card se puntúa una vez
+        # contra todos los productos (CardPool); una card de otro producto del lote queda en el pool para ese producto
+        i, pool = getattr(self._local, "product", None), getattr(self._local, "card_pool", None)
+        if i is not None and pool is not None:
+            hit = pool.add(entries).get(i)
+        else:
+            hit = ProductMatcher.for_term(term).assign(entries).get(0)
+        return hit[1] if hit else None
+
+    def _page_price(self, page: HtmlPage, term: str) -> Optional[str]:
+        # Página sin cards (p. ej. el buscador redirigió a la ficha): sólo si nombra el EAN o el modelo del producto
+        # y con un selector de precio; nunca el primer número de la página
+        if page.cards(): return None
+        i = getattr(self._local, "product", None)
+        matcher = self._matcher if i is not None and self._matcher is not None else ProductMatcher.for_term(term)
+        price = self._card_price(page, None, "")
+        hit = matcher.assign([(page.text().lower(), [], price)], min_score=STRONG).get(i if i is not None else 0)
+        return hit[1] if hit else None
+
+    def _record_profile(self, vn: str, outcome: str, entries, used: List[Profile], price: str):
+        # el par de selectores de la primera card con el precio aceptado
+        pair = next((u for (_, _, p), u in zip(entries, used) if p == price), None)
+        self.selector_profiles.record(vn, outcome, pair)
+        self.metrics.inc("scraper_selector_profile_total", vendor=vn, outcome=outcome)
+
+    @timed("extract_cards")
+    def _extract_from_cards(self, page: HtmlPage, term: str) -> Optional[str]:
+        # Primero el perfil aprendido del vendedor (uno o dos selectores); la cascada genérica sólo si no alcanza
+        vn = self.vendor
+        profile = self.selector_profiles.get(vn) if vn else None
+        if profile:
+            try:
+                entries, used = self._card_entries(page, profile)
+            except Exception:   # selector editado a mano inválido: como si no hubiera perfil
+                entries, used = [], []
+            price = self._match_cards(entries, term) if entries else None
+            if price:
+                self._record_profile(vn, "hit", entries, used, price)
+                return price
+        entries, used = self._card_entries(page)
+        price = self._match_cards(entries, term)
+        if price and vn:
+            self._record_profile(vn, "fallback" if profile else "learn", entries, used, price)
+        return price
+
+    # ------------------------ VTEX (API) ------------------------
+    def _vtex_sku_price(self, item: Dict) -> Optional[str]:
+        # Precio del SKU: primero un seller con stock y precio > 0
+        offers = [(sel.get("commertialOffer") or {}) for sel in (item.get("sellers") or [])]
+        for o in offers:
+            if o.get("Price") and (o.get("AvailableQuantity") or 0) > 0:
+                return plain_from_float(o["Price"])
+        for o in offers:
+            if o.get("Price"):
+                return plain_from_float(o["Price"])
+        return None
+
+    def _vtex_entries(self, data: List[Dict]) -> List[Tuple[str, List[str], Optional[str]]]:
+        out = []
+        for prod in data:
+            names = [s(prod.get("productName")), s(prod.get("brand"))]
+            for it in (prod.get("items") or []):
+                names += [s(it.get("name")), s(it.get("ean"))]
+                price = self._vtex_sku_price(it)
+                if price:
+                    out.append((normalize_spaces(" ".join(n for n in names if n)).lower(), [s(prod.get("productName"))], price))
+        return out
+
+    def _vtex_bulk_map(self, base: str, log) -> Optional[Dict[str, str]]:
+        # EAN -> precio del SKU con ese EAN, para todos los EAN del lote en pocas consultas
+        bulk = self._local.vtex_bulk
+        if base in bulk: return bulk[base]
+        api = f"{base.rstrip('/')}/api/catalog_system/pub/products/search"
+        eans = sorted(self._batch_eans)
+        found: Dict[str, str] = {}
+        requests_made = 0
+        for k in range(0, len(eans), VTEX_BULK_EANS):
+            chunk = eans[k:k + VTEX_BULK_EANS]
+            for page in range(VTEX_BULK_MAX_PAGES):
+                params = [("fq", f"alternateIds_Ean:{e}") for e in chunk] + [("_from", page * VTEX_PAGE), ("_to", page * VTEX_PAGE + VTEX_PAGE - 1)]
+                try:
+                    data = self.client.get(api, params=params).json()
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    log(f"VTEX bulk error: {e}"); data = None
+                requests_made += 1
+                if not isinstance(data, list): break
+                for prod in data:
+                    for it in (prod.get("items") or []):
+                        ean, price = s(it.get("ean")), self._vtex_sku_price(it)
+                        if ean and price: found[ean] = price
+                if len(data) < VTEX_PAGE: break
+        # sin un solo resultado: el sitio no soporta el filtro; se vuelve a la búsqueda por término
+        bulk[base] = found or None
+        log(f"VTEX bulk: {len(found)}/{len(eans)} EAN resueltos en {requests_made} consulta(s)")
+        return bulk[base]
+
+    def _vtex_pick(self, data: List[Dict], term: str) -> Optional[str]:
+        # Precio del SKU que corresponde al producto (EAN exacto, modelo, marca), no del primer resultado
+        if EAN_PAT.fullmatch(term):
+            for prod in data:
+                for it in (prod.get("items") or []):
+                    if s(it.get("ean")) == term:
+                        p = self._vtex_sku_price(it)
                         if p: return p
-                m = PRICE_PAT.search(ctxt)
-                if m:
-                    p = strip_decimal_and_non_digits(m.group(0))
-                    if p: return p
+        p = self._match_cards(self._vtex_entries(data), term)
+        if p: return p
+        # un único resultado para un EAN (el sitio lo indexa aunque no lo exponga en items): es ese producto
+        if len(data) == 1 and EAN_PAT.fullmatch(term):
+            for it in (data[0].get("items") or []):
+                p = self._vtex_sku_price(it)
+                if p: return p
+            pr = (data[0].get("priceRange") or {}).get("sellingPrice", {})
+            if pr.get("lowPrice"):
+                return plain_from_float(pr["lowPrice"])
         return None
 
-    # ------------------------ VTEX (API) ------------------------
+    @timed("vtex", "scraper_strategy_seconds", "strategy")
     def _try_vtex(self, base: str, term: str, log):
+        if EAN_PAT.fullmatch(term) and self._batch_eans and getattr(self._local, "vtex_bulk", None) is not None:
+            with self._batch_excluded():
+                bulk = self._vtex_bulk_map(base, log)
+            if bulk is not None:
+                pnum = bulk.get(term)
+                if not pnum: raise NoResults("VTEX: EAN sin resultados (consulta en bloque)")
+                return f"$ {int(pnum):,}".replace(",", ".") + ",00", pnum
         api = f"{base.rstrip('/')}/api/catalog_system/pub/products/search"
         r = self.client.get(api, params={"_from": 0, "_to": 9, "ft": term})
         try: data = r.json()
         except Exception: return None, None
-        if not isinstance(data, list) or not data:
-            log("VTEX: sin resultados"); return None, None
-        for prod in data:
-            for it in (prod.get("items") or []):
-                for sel in (it.get("sellers") or []):
-                    offer = (sel.get("commertialOffer") or {})
-                    if offer.get("Price") is not None:
-                        pnum = plain_from_float(offer["Price"])
-                        return f"$ {int(pnum):,}".replace(",", ".") + ",00", pnum
-        for prod in data:
-            pr = (prod.get("priceRange") or {}).get("sellingPrice", {})
-            if pr.get("lowPrice") is not None:
-                pnum = plain_from_float(pr["lowPrice"])
-                return f"$ {int(pnum):,}".replace(",", ".") + ",00", pnum
+        if not isinstance(data, list): return None, None
+        if not data: raise NoResults("VTEX: sin resultados")
+        pnum = self._vtex_pick(data, term)
+        if pnum:
+            return f"$ {int(pnum):,}".replace(",", ".") + ",00", pnum
+        log(f"VTEX: {len(data)} resultado(s) sin coincidencia para {term}")
         return None, None
 
     # --------------------- Magento (HTML) ---------------------
+    @timed("magento", "scraper_strategy_seconds", "strategy")
     def _try_magento_html(self, base: str, term: str, log):
         url = f"{base.rstrip('/')}/catalogsearch/result/"
-        r = self.client.get(url, params={"q": term})
-        soup = BeautifulSoup(r.text, "html.parser")
-        price = self._extract_from_cards(soup, term)
+        page = self.client.get_page(url, params={"q": term})
+        price = self._extract_from_cards(page, term)
+        if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
+        if is_no_results_page(page, page.cards()): raise NoResults("Magento: sin resultados")
+        price = self._page_price(page, term)
         if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
-        m = PRICE_PAT.search(soup.get_text(" ", strip=True))
-        if m:
-            price = strip_decimal_and_non_digits(m.group(0))
-            if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
         return None, None
 
     # ---------------- WordPress / WooCommerce ----------------
     def _find_wp_search(self, html: str, base: str) -> str:
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(html)
         form = soup.find("form", attrs={"role":"search"}) or soup.find("form", class_=re.compile("search", re.I))
         return (form.get("action") if form else None) or base.rstrip("/") + "/"
 
+    @timed("wordpress", "scraper_strategy_seconds", "strategy")
     def _try_wordpress(self, base: str, term: str, log):
         r = self.client.get(base.rstrip("/") + "/")
         action = self._find_wp_search(r.text, base)
         for params in ({"s": term}, {"s": term, "post_type": "product"}):
-            rr = self.client.get(action, params=params)
-            soup = BeautifulSoup(rr.text, "html.parser")
-            price = self._extract_from_cards(soup, term)
+            page = self.client.get_page(action, params=params)
+            price = self._extract_from_cards(page, term)
             if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
+            # la búsqueda de WordPress ya incluye productos: sin resultados no hace falta post_type=product
+            if is_no_results_page(page, page.cards()): raise NoResults("WordPress: sin resultados")
         return None, None
 
     # ------------------------ Genérico ------------------------
+    @timed("generic", "scraper_strategy_seconds", "strategy")
     def _try_generic(self, base: str, term: str, log):
+        dead = getattr(self._local, "dead_paths", None)
+        if dead is None: dead = set()
         for path in ["/search","/buscar","/busca","/s","/busqueda"]:
+            if path in dead: continue
             try:
-                rr = self.client.get(f"{base.rstrip('/')}{path}", params={"q": term})
-                soup = BeautifulSoup(rr.text, "html.parser")
-                price = self._extract_from_cards(soup, term)
+                page = self.client.get_page(f"{base.rstrip('/')}{path}", params={"q": term})
+                price = self._extract_from_cards(page, term)
+                if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
+                price = self._page_price(page, term)
                 if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
-                m = PRICE_PAT.search(soup.get_text(" ", strip=True))
-                if m:
-                    price = strip_decimal_and_non_digits(m.group(0))
-                    if price: return f"$ {int(price):,}".replace(",", ".") + ",00", price
+            except Cancelled:
+                raise
             except Exception as e:
                 log(f"Genérico error {path}: {e}")
+                # la ruta no existe en este sitio: no se vuelve a probar en el lote
+                if getattr(getattr(e, "response", None), "status_code", None) == 404: dead.add(path)
+        return None, None
+
+    # --------------------- Catálogo local (sitemaps) ---------------------
+    @timed("catalog", "scraper_strategy_seconds", "strategy")
+    def _try_catalog(self, entry: Dict, log):
+        # Una sola ficha: el precio de sus datos estructurados (o de la página), si sigue siendo el producto en curso
+        r = self.client.get(entry["url"])
+        info = product_info(r.text)
+        price = strip_decimal_and_non_digits(info["price"]) if info["price"] else None
+        text = " ".join([info["title"], info["brand"], info["sku"], info["mpn"], *info["gtins"]])
+        if not price or not page_keys(info):
+            page = HtmlPage(r.text)
+            price = price or self._card_price(page, None, "")
+            text += " " + page.text()
+        hit = self._matcher.assign([(text.lower(), [], price)], min_score=STRONG).get(self._local.product)
+        if not hit:
+            log(f"Catálogo: la ficha ya no corresponde al producto o no tiene precio ({entry['url']})")
+            return None, None
+        if str(entry.get("price_num") or "") != hit[1]: self.catalog.set_price(self.vendor, entry["url"], hit[1])
+        return f"$ {int(hit[1]):,}".replace(",", ".") + ",00", hit[1]
+
+    def _search_catalog(self, vn: str, p: Dict, log):
+        entry = self.catalog.lookup(vn, product_keys(p))
+        if not entry: return None, None
+        log(f"[{vn}] estrategia=Catálogo {entry['url']}")
+        try:
+            res = self._try_catalog(entry, log)
+            self._record_strategy(vn, "catalog", "hit" if res[1] else "miss")
+            return res
+        except Cancelled:
+            log(f"[{vn}] cancelado")
+        except requests.HTTPError as e:
+            status = getattr(e.response, "status_code", "")
+            log(f"HTTPError {e}")
+            self._record_strategy(vn, "catalog", "error", f"HTTP {status}")
+            # la ficha ya no existe: sale del índice hasta que el sitemap la vuelva a traer
+            if status in (404, 410): self.catalog.save(vn, entry["url"], None, None)
+        except Exception as e:
+            log(f"Error {e}")
+            self._record_strategy(vn, "catalog", "error", f"{type(e).__name__}: {e}")
         return None, None
 
+    def build_catalog(self, vendors: Dict[str, str], full: bool = False, max_pages: Optional[int] = None,
+                      cancel_cb: Optional[Callable[[], bool]] = None, on_log: Optional[Callable[[str], None]] = None) -> Tuple[Dict[str, Dict], List[str]]:
+        # Un hilo por vendedor y, dentro, CatalogBuilder con sus hilos para las fichas; "sitemap=" y "feed=" de
+        # VENDEDORES.txt (o rate_limits) eligen la fuente si el sitio no la publica en robots.txt
+        logs: List[str] = []
+        def log(line: str):
+            logs.append(line)
+            if on_log: on_log(line)
+        def one(vn: str, url: str) -> Dict:
+            opts = self.rate_limits.get(vn) or {}
+            # sin log por pedido: un catálogo son miles de fichas
+            factory = lambda: HttpClient(delay_range=self.delay_range, cancel_cb=cancel_cb, scheduler=self.scheduler,
+                                         cache=self.response_cache, cache_counters=self.cache_counters, metrics=self.metrics, vendor=vn)
+            builder = CatalogBuilder(self.catalog, factory, strip_decimal_and_non_digits, log=log, max_pages=max_pages or CATALOG_MAX_PAGES)
+            try:
+                return builder.build(vn, url, sitemap=opts.get("sitemap"), feed=opts.get("feed"), full=full)
+            except Cancelled:
+                log(f"[{vn}] cancelado"); return {"vendor": vn, "error": "cancelado"}
+            except Exception as e:
+                log(f"[{vn}] catálogo: error {type(e).__name__}: {e}"); return {"vendor": vn, "error": str(e)}
+        for vn, url in vendors.items():
+            if self.rate_limits.get(vn):
+                self.scheduler.set_policy(host_of(url), HostPolicy.from_dict(self.rate_limits[vn], self.scheduler.default))
+        with ThreadPoolExecutor(max_workers=max(1, min(len(vendors), self.max_workers or 8)), thread_name_prefix="catalog-vendor") as ex:
+            futs = {vn: ex.submit(one, vn, url) for vn, url in vendors.items()}
+            result = {vn: f.result() for vn, f in futs.items()}
+        self.last_stats = self.scheduler.stats()
+        return result, logs
+
     # -------------------- Folletos / PDF (+OCR) --------------------
     def _extract_pdf_links(self, html: str, base: str) -> List[str]:
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(html)
         links = []
         for a in soup.find_all("a", href=True):
             href = a["href"]
@@ -252,51 +800,86 @@ class PriceScraper:
                 links.append(src)
         return list(dict.fromkeys(links))
 
-    def _pdf_text_from_url(self, url: str, log) -> str:
-        r = self.client.get(url, timeout=45)
-        bio = io.BytesIO(r.content)
+    @timed("pdf_text")
+    def _pdf_text_from_url(self, url: str, log, dl: Optional[Download]=None) -> str:
+        own = dl is None
         try:
-            txt = pdf_extract_text(bio) or ""
+            if own: dl = self.client.download(url, timeout=45)
+            from pdfminer.high_level import extract_text as pdf_extract_text
+            # pdfminer lee del mmap del archivo descargado, sin copiarlo a memoria
+            txt = pdf_extract_text(dl.view()) or ""
             log(f"PDF extraído ({len(txt)} chars) {url}")
             return txt
+        except Cancelled:
+            raise
         except Exception as e:
             log(f"PDF error {e} {url}")
             return ""
+        finally:
+            if own and dl is not None: dl.close()
 
-    def _pdf_ocr_pages(self, url: str, log, scale=2.2) -> str:
-        if not HAVE_PDFIUM: return ""
-        txts = []
+    @timed("pdf_ocr")
+    def _pdf_ocr_pages(self, url: str, log, scale=2.2, dl: Optional[Download]=None) -> Tuple[str, bool]:
+        if not HAVE_PDFIUM or not HAVE_TESS: return "", True
+        own = dl is None
         try:
-            doc = pdfium.PdfDocument(io.BytesIO(self.client.get(url, timeout=45).content))
-            for i in range(len(doc)):
-                page = doc.get_page(i)
-                img = page.render_topil(scale=scale, greyscale=False)
-                ocr = pytesseract.image_to_string(img, lang="spa+eng") if HAVE_TESS else ""
-                txts.append(ocr)
+            if own: dl = self.client.download(url, timeout=45)
+            res = ocr_pdf(dl.path, term_groups=self._term_groups, scale=scale, log=log)
+            log(f"OCR {res.done}/{res.pages} páginas ({res.cached} en caché) {url}")
+            return res.text, res.complete
+        except Cancelled:
+            raise
         except Exception as e:
             log(f"OCR error {e} {url}")
-        return "\n".join(txts)
+            return "", False
+        finally:
+            if own and dl is not None: dl.close()
 
-    def _try_brochures(self, base: str, term: str, log):
+    def _brochure_pdfs(self, base: str, log) -> List[str]:
         pages = [base] + [f"{base.rstrip('/')}/{p}" for p in ["ofertas","oferta","promociones","folleto","folletos","catalogo","catalogos"]]
         pdfs = []
         for u in pages:
             try:
                 html = self.client.get(u).text
                 pdfs.extend(self._extract_pdf_links(html, base))
+            except Cancelled:
+                raise
             except Exception as e:
                 log(f"Folleto error {u}: {e}")
-        variants = mk_variants_for_match(term)
-        for purl in pdfs[:12]:
-            txt = self._pdf_text_from_url(purl, log)
+        return pdfs[:12]
+
+    def _brochure_text(self, purl: str, log) -> str:
+        # Una sola descarga (a disco, con tope) para el texto y, si hace falta, el OCR
+        with self.client.download(purl, timeout=45) as dl:
+            txt = self.brochure_texts.get(dl.digest)
+            if txt is not None:
+                log(f"PDF (texto en caché, {len(txt)} chars) {purl}")
+                return txt
+            txt, complete = self._pdf_text_from_url(purl, log, dl=dl), True
             if len(txt) < 200 and HAVE_PDFIUM:
-                txt = self._pdf_ocr_pages(purl, log, scale=2.2)
-            tl = txt.lower()
-            for m in PRICE_PAT.finditer(txt):
-                window = tl[max(0, m.start()-200): m.end()+200]
-                if any(all(tok in window for tok in v.lower().split()) for v in variants):
-                    p = strip_decimal_and_non_digits(m.group(0))
-                    if p: return f"$ {int(p):,}".replace(",", ".") + ",00", p
+                txt, complete = self._pdf_ocr_pages(purl, log, scale=2.2, dl=dl)
+            # un OCR cortado temprano sólo sirve para los términos de este lote
+            if txt and complete: self.brochure_texts.put(dl.digest, txt)
+            return txt
+
+    def _build_brochure_index(self, base: str, log) -> BrochureIndex:
+        # Cada PDF del vendedor se extrae una vez por lote y se indexa por tokens
+        idx = BrochureIndex(PRICE_PAT, strip_decimal_and_non_digits)
+        for purl in self._brochure_pdfs(base, log):
+            try:
+                idx.add(purl, self._brochure_text(purl, log))
+            except Cancelled:
+                raise
+            except Exception as e:
+                log(f"Folleto error {purl}: {e}")
+        log(f"Índice de folletos: {len(idx)} precios indexados ({base})")
+        return idx
+
+    @timed("brochures", "scraper_strategy_seconds", "strategy")
+    def _try_brochures(self, base: str, term: str, log):
+        idx = self._batch_memo("brochure_index", base, lambda: self._build_brochure_index(base, log))
+        p = idx.lookup(mk_variants_for_match(term))
+        if p: return f"$ {int(p):,}".replace(",", ".") + ",00", p
         return None, None
 
     # ---------------- Orden de estrategias por vendedor ----------------
@@ -307,19 +890,76 @@ class PriceScraper:
         if vn in ["musimundo"]: return ["vtex","magento","wordpress","generic"]
         return ["vtex","magento","wordpress","generic"]
 
+    def _strategy_order(self, vendor_name: str) -> List[str]:
+        # Orden aprendido: la estrategia ganadora primero, sin las que fallan siempre
+        return self.strategy_cache.order(vendor_name, self._detect_platform_order(vendor_name))
+
+    def probe_vendor(self, vendor_name: str, base: str, log) -> Dict:
+        # Detecta la plataforma una sola vez desde el HTML de la home
+        r = self.client.get(base.rstrip("/") + "/")
+        platform = detect_platform(r.text, dict(r.headers))
+        log(f"[{vendor_name}] plataforma detectada: {platform or 'desconocida'}")
+        self.strategy_cache.set_platform(vendor_name, platform)
+        return {"platform": platform, "order": self._strategy_order(vendor_name)}
+
+    def probe_vendors(self, vendors: Dict[str, str], cancel_cb: Optional[Callable[[], bool]]=None) -> Tuple[Dict[str, Dict], List[str]]:
+        vendors = dict(vendors or {})
+        def one(vn, url):
+            plogs: List[str] = []
+            self.client = HttpClient(delay_range=self.delay_range, log=plogs.append, cancel_cb=cancel_cb, scheduler=self.scheduler,
+                                     cache=self.response_cache, cache_counters=self.cache_counters, metrics=self.metrics, vendor=vn)
+            try:
+                return self.probe_vendor(vn, url, plogs.append), plogs
+            except Cancelled:
+                raise
+            except Exception as e:
+                plogs.append(f"[{vn}] error al detectar plataforma: {e}")
+                return {"platform": None, "error": str(e), "order": self._strategy_order(vn)}, plogs
+            finally:
+                self.client = None
+        with ThreadPoolExecutor(max_workers=max(1, min(len(vendors), self.max_workers or 8)), thread_name_prefix="probe") as ex:
+            futs = [ex.submit(one, vn, url) for vn, url in vendors.items()]
+            done = [f.result() for f in futs]
+        logs = [line for _, plogs in done for line in plogs]
+        return {vn: res for vn, (res, _) in zip(vendors, done)}, logs
+
+    def _record_strategy(self, vendor_name: str, strat: str, outcome: str, error: str = ""):
+        self.strategy_cache.record(vendor_name, strat, outcome, error)
+        self.metrics.inc("scraper_strategy_total", vendor=vendor_name, strategy=strat, outcome=outcome)
+
     def _search_vendor_once(self, vendor_name: str, base: str, term: str, log):
-        for strat in self._detect_platform_order(vendor_name):
+        budget = getattr(self._local, "budget", None)
+        dead = getattr(self._local, "dead_strategies", None) or set()
+        for strat in self._strategy_order(vendor_name):
+            if strat in dead: continue
+            if budget and budget.reason(): return None, None
             try:
                 if strat == "vtex": log(f"[{vendor_name}] estrategia=VTEX ft={term}"); res = self._try_vtex(base, term, log)
                 elif strat == "magento": log(f"[{vendor_name}] estrategia=Magento q={term}"); res = self._try_magento_html(base, term, log)
                 elif strat == "wordpress": log(f"[{vendor_name}] estrategia=WordPress q={term}"); res = self._try_wordpress(base, term, log)
                 elif strat == "brochures": log(f"[{vendor_name}] estrategia=Folletos term={term}"); res = self._try_brochures(base, term, log)
                 else: log(f"[{vendor_name}] estrategia=Genérico q={term}"); res = self._try_generic(base, term, log)
-                if res and res[0] and res[1]: return res
+                if res and res[0] and res[1]:
+                    self._record_strategy(vendor_name, strat, "hit")
+                    return res
+                self._record_strategy(vendor_name, strat, "miss")
+            except NoResults as e:
+                # el buscador del sitio respondió bien y no tiene el término: las otras estrategias no van a encontrarlo
+                log(str(e))
+                self._record_strategy(vendor_name, strat, "empty")
+                if budget: budget.empty()
+                return None, None
+            except Cancelled:
+                log(f"[{vendor_name}] cancelado"); return None, None
             except requests.HTTPError as e:
                 log(f"HTTPError {e}")
+                status = getattr(e.response, "status_code", "")
+                self._record_strategy(vendor_name, strat, "error", f"HTTP {status}")
+                # el endpoint de la plataforma no existe en este sitio: no se repite con las demás variantes
+                if status == 404: dead.add(strat)
             except Exception as e:
                 log(f"Error {e}")
+                self._record_strategy(vendor_name, strat, "error", f"{type(e).__name__}: {e}")
         return None, None
 
     def _variants(self, p: Dict) -> List[str]:
@@ -332,32 +972,199 @@ class PriceScraper:
         if modelo: vs.append(modelo)
         if producto: vs.append(producto)
         if marca and capacidad: vs.append(f"{marca} {capacidad}")
+        # EAN primero; variantes casi iguales (puntuación, orden de palabras) se consultan una vez
         out, seen = [], set()
         for v in vs:
             for cand in mk_variants_for_match(v):
-                if cand and cand not in seen:
-                    out.append(cand); seen.add(cand)
+                keys = near_duplicate_keys(cand)
+                if cand and keys[0] and not seen.intersection(keys):
+                    out.append(cand); seen.update(keys)
         return out[:10]
 
-    def scrape_all_vendors(self, products: List[Dict], vendors: Dict[str,str], include_official_site: bool=False, return_logs: bool=False, cancel_cb: Optional[Callable[[], bool]]=None):
-        logs: List[str] = []
-        def log(msg: str): logs.append(msg)
+    def _search_term(self, vn: str, url: str, term: str, log):
+        # Cada (vendedor, término normalizado) se consulta una sola vez por lote
+        key = term_key(term) or term
+        memo = self._local.term_memo
+        budget = self._local.budget
+        if key in memo:
+            # El resultado guardado es el del producto que lanzó la búsqueda: para este producto sólo vale lo que
+            # sus cards (ya puntuadas en el pool) digan de él
+            self.plan_counters.inc("memo")
+            log(f"[{vn}] término ya consultado en este lote: {term}")
+            if memo[key]: budget.empty()
+            i, pool = getattr(self._local, "product", None), self._local.card_pool
+            price = pool.match(i) if i is not None and pool is not None else None
+            return (f"$ {int(price):,}".replace(",", ".") + ",00", price) if price else (None, None)
+        empties = budget.empties
+        res = self._search_vendor_once(vn, url, term, log)
+        # una búsqueda cortada por presupuesto no es un resultado
+        if res[1] or budget.empties > empties or not budget.reason():
+            memo[key] = budget.empties > empties
+        return res
+
+    def _scrape_vendor_products(self, vn: str, url: str, products: List[Dict], cancel_cb, on_cell: Callable, on_log: Optional[Callable[[str], None]]=None):
+        # Los productos de un mismo vendedor se procesan en secuencia (pipeline) dentro de su hilo
+        self.client = HttpClient(delay_range=self.delay_range, cancel_cb=cancel_cb, scheduler=self.scheduler,
+                                 cache=self.response_cache, cache_counters=self.cache_counters, metrics=self.metrics, vendor=vn)
+        self._local.card_pool = CardPool(self._matcher)
+        self._local.term_memo = {}
+        self._local.budget = None
+        self._local.dead_strategies, self._local.dead_paths = set(), set()
+        self._local.vtex_bulk = {}
+        # VTEX resuelve los EAN del lote en bloque (20 por consulta): para esos productos la ficha no conviene
+        catalog = self.catalog if self.catalog is not None and self.catalog.has(vn) else None
+        bulk_first = self._strategy_order(vn)[:1] == ["vtex"] and bool(self._batch_eans)
+        try:
+            for i, p in enumerate(products):
+                plogs: List[str] = []
+                def log(msg: str, _plogs=plogs):
+                    _plogs.append(msg)
+                    if on_log: on_log(msg)
+                self.client.log = log
+                hist = self._fresh.get((i, vn))
+                if hist:
+                    self.plan_counters.inc("history")
+                    log(f"[{vn}] precio reciente del historial (hace {(time.time() - hist[2]) / 3600:.1f} h): {hist[0]}")
+                    on_cell(i, vn, (hist[0], hist[1], plogs))
+                    continue
+                price_txt, price_num = None, None
+                terms = self._term_groups[i]
+                self._local.product = i
+                # Primero, cards ya vistas en búsquedas de otros productos del lote (ya asignadas a este)
+                price = self._local.card_pool.match(i)
+                if price:
+                    self.plan_counters.inc("pool")
+                    log(f"[{vn}] resuelto con resultados ya descargados: {terms[0] if terms else i}")
+                    price_txt, price_num = f"$ {int(price):,}".replace(",", ".") + ",00", price
+                if not price_num and catalog is not None and not (bulk_first and s(p.get("ean")) in self._batch_eans):
+                    price_txt, price_num = self._search_catalog(vn, p, log)
+                if not price_num:
+                    self._local.budget = SearchBudget(lambda: self.client.requests)
+                    for term in terms:
+                        price_txt, price_num = self._search_term(vn, url, term, log)
+                        if price_txt and price_num: break
+                        reason = self._local.budget.reason()
+                        if reason:
+                            self.plan_counters.inc("budget")
+                            log(f"[{vn}] búsqueda cortada ({reason}): ND")
+                            break
+                    self._local.budget = None
+                on_cell(i, vn, (price_txt or "ND", price_num or "", plogs))
+        finally:
+            self.client = None
+            self._local.card_pool = None
+            self._local.product = None
+            self._local.term_memo = None
+            self._local.budget = None
+            self._local.dead_strategies = self._local.dead_paths = None
+            self._local.vtex_bulk = None
+
+    def _base_row(self, p: Dict, date_only: str) -> Dict:
+        return {"Producto": s(p.get("producto")), "Marca": s(p.get("marca")), "Modelo": s(p.get("modelo")), "EAN": s(p.get("ean")),
+                "Marca (Sitio oficial)": "ND", "Fecha de Consulta": date_only}
 
-        self.client = HttpClient(delay_range=self.delay_range, log=log, cancel_cb=cancel_cb)
+    def _assemble_row(self, p: Dict, vendors: Dict[str, str], cells: Dict[str, Tuple], date_only: str) -> Dict:
+        row = self._base_row(p, date_only)
+        for vn in vendors:
+            price_txt, price_num, _ = cells[vn]
+            row[vn] = price_txt
+            row[f"{vn} (num)"] = price_num  # entero plano sin decimales/separadores
+        return row
+
+    def scrape_all_vendors(self, products: List[Dict], vendors: Dict[str,str], include_official_site: bool=False, return_logs: bool=False, cancel_cb: Optional[Callable[[], bool]]=None, concurrent: bool=True,
+                           on_row: Optional[Callable[[int, Dict], None]]=None, on_log: Optional[Callable[[str], None]]=None, max_age_s: Optional[float]=None,
+                           as_frame: bool=True, keep_rows: bool=True):
+        # max_age_s (con historial): modo incremental, los pares (producto, vendedor) con precio más nuevo no se consultan.
+        # as_frame=False devuelve la lista de filas (dicts) en lugar del DataFrame: no carga pandas.
+        # keep_rows=False (con on_row): cada fila se entrega y se descarta; no se devuelven filas ni logs por producto
+        products = list(products or [])
+        vendors = dict(vendors or {})
         date_only = datetime.now().strftime("%d/%m/%Y")
+        self.cache_counters = CacheCounters()
+        self.metrics = Metrics(parent=REGISTRY)
+        self._term_groups = [self._variants(p) for p in products]
+        # índice de coincidencias de todo el lote: EAN, modelo, marca y nombre de cada producto
+        self._matcher = ProductMatcher(products)
+        self._batch_eans = {s(p.get("ean")) for p in products if EAN_PAT.fullmatch(s(p.get("ean")))}
+        self.plan_counters = CacheCounters()
+        plan = QueryPlan(self._term_groups, len(vendors))
+        if on_log: on_log(plan.summary())
+        self._fresh = self.history.fresh(products, list(vendors), max_age_s) if (self.history and max_age_s) else {}
+        if max_age_s and self.history:
+            line = f"Incremental: {len(self._fresh)} de {len(products) * len(vendors)} par(es) con precio de hace menos de {max_age_s / 3600:g} h"
+            if on_log: on_log(line)
+        with self._memo_lock:
+            self._memo.clear()
+        for vn, url in vendors.items():
+            if self.rate_limits.get(vn):
+                self.scheduler.set_policy(host_of(url), HostPolicy.from_dict(self.rate_limits[vn], self.scheduler.default))
+
+        # Una fila está completa cuando todos los vendedores terminaron ese producto (on_row la emite en vivo)
+        cells: List[Dict[str, Tuple]] = [{} for _ in products]
+        cells_lock = threading.Lock()
+        def on_cell(i: int, vn: str, res: Tuple):
+            with cells_lock:
+                cells[i][vn] = res
+                complete = len(cells[i]) == len(vendors)
+            if complete and self.history:
+                # sólo lo consultado en esta corrida: lo tomado del historial no renueva su fecha
+                try:
+                    self.history.record(products[i], {v: cells[i][v][:2] for v in vendors if (i, v) not in self._fresh})
+                except Exception as e:
+                    if on_log: on_log(f"Historial: error al guardar fila {i}: {e}")
+            if complete and on_row:
+                on_row(i, self._assemble_row(products[i], vendors, cells[i], date_only))
+            if complete and not keep_rows:
+                cells[i] = None
+        if not vendors and on_row:
+            for i, p in enumerate(products): on_row(i, self._base_row(p, date_only))
 
+        # Un hilo por vendedor; el resultado se arma en orden fijo (producto, vendedor)
+        if concurrent and len(vendors) > 1:
+            workers = max(1, min(len(vendors), self.max_workers or 8))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vendor") as ex:
+                futs = [ex.submit(self._scrape_vendor_products, vn, url, products, cancel_cb, on_cell, on_log) for vn, url in vendors.items()]
+                for f in futs: f.result()
+        else:
+            for vn, url in vendors.items():
+                self._scrape_vendor_products(vn, url, products, cancel_cb, on_cell, on_log)
+
+        logs: List[str] = [plan.summary()] + ([line] if max_age_s and self.history else [])
         rows = []
-        for p in (products or []):
-            base_row = {"Producto": s(p.get("producto")), "Marca": s(p.get("marca")), "Marca (Sitio oficial)": "ND", "Fecha de Consulta": date_only}
-            row = dict(base_row)
-            for vn, url in (vendors or {}).items():
-                price_txt, price_num = None, None
-                for term in self._variants(p):
-                    price_txt, price_num = self._search_vendor_once(vn, url, term, log)
-                    if price_txt and price_num: break
-                row[vn] = price_txt or "ND"
-                row[f"{vn} (num)"] = price_num or ""  # entero plano sin decimales/separadores
-            rows.append(row)
+        for i, p in enumerate(products if keep_rows else ()):
+            rows.append(self._assemble_row(p, vendors, cells[i], date_only))
+            for vn in vendors:
+                logs.extend(cells[i][vn][2])
+
+        pc = self.plan_counters.snapshot()
+        tail: List[str] = [f"Plan: {pc.get('memo', 0)} consulta(s) repetida(s) evitadas, {pc.get('pool', 0)} fila(s) resueltas con resultados previos, {pc.get('history', 0)} desde el historial, {pc.get('budget', 0)} búsqueda(s) cortadas antes (ND)"]
+        self.strategy_cache.flush()
+        self.selector_profiles.flush()
+        if self.response_cache:
+            cc = self.cache_counters.snapshot()
+            tail.append(f"Cache HTTP: hits={cc.get('hits', 0)} misses={cc.get('misses', 0)} revalidados={cc.get('revalidated', 0)} guardados={cc.get('stored', 0)}")
+
+        # Métricas de espera (rate limit) vs descarga por host
+        self.last_stats = self.scheduler.stats()
+        self.last_metrics = self.metrics.summary()
+        for vn, url in vendors.items():
+            st = self.last_stats.get(host_of(url))
+            if st:
+                tail.append(f"[{vn}] host={host_of(url)} pedidos={st['requests']} espera={st['wait_s']:.1f}s descarga={st['fetch_s']:.1f}s throttled={st['throttled']}")
+            vm = self.last_metrics["vendors"].get(vn)
+            if vm:
+                per = " ".join(f"{k}={v.get('seconds', 0):.1f}s({v.get('hit', 0)}/{v.get('miss', 0)}/{v.get('empty', 0)}/{v.get('error', 0)})" for k, v in vm["strategies"].items())
+                tail.append(f"[{vn}] estrategias (hit/miss/vacío/error): {per}")
+            prof = (vm or {}).get("profile")
+            if prof and (prof.get("hit") or prof.get("fallback")):
+                tried = prof.get("hit", 0) + prof.get("fallback", 0)
+                tail.append(f"[{vn}] perfil de selectores: {prof.get('hit', 0)}/{tried} página(s) con el perfil ({100 * prof.get('hit', 0) / tried:.0f}%), {prof.get('fallback', 0)} con la cascada genérica")
+        logs.extend(tail)
+        if on_log:
+            for line in tail: on_log(line)
 
+        if not as_frame:
+            return (rows, logs) if return_logs else (rows, [])
+        import pandas as pd
         df = pd.DataFrame(rows)
         return (df, logs) if return_logs else (df, [])
@@ -0,0 +1,165 @@
+# selector_profiles.py
+# Perfil de selectores por vendedor: qué selector de card y de precio dieron el precio aceptado. Con suficientes
+# aciertos el par más frecuente pasa a ser el perfil del vendedor y se prueba antes que la cascada genérica.
+# Vive en SELECTORES.json junto a VENDEDORES.txt y se puede editar a mano:
+#   {"Frávega": {"card": "article.product-card", "price": ".sale-price", "fixed": true}}
+# "fixed": true deja el perfil como está (no se reaprende); price "" toma el primer precio del texto de la card.
+# Cada proceso guarda sólo lo que sumó desde el último flush y lo agrega sobre el archivo releído, así varios
+# workers de gunicorn y las ediciones a mano conviven sin pisarse los contadores.
+import os, json, time, threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+SELECTORS_FILE = Path(os.getenv("SELECTORS_FILE", Path(__file__).resolve().parent / "SELECTORES.json"))
+PROFILE_MIN_HITS = int(os.getenv("PROFILE_MIN_HITS", 3))   # aciertos de un par antes de usarlo como perfil
+RELOAD_EVERY_S = 2.0                                         # cada cuánto se mira si el archivo cambió (edición a mano)
+
+Profile = Tuple[str, str]   # (selector de card, selector de precio)
+
+def _key(vendor_name: str) -> str:
+    return (vendor_name or "").strip().lower()
+
+def _pair(card: str, price: str) -> str:
+    return f"{card} | {price}"
+
+class SelectorProfiles:
+    def __init__(self, path: Path = SELECTORS_FILE, min_hits: int = PROFILE_MIN_HITS, flush_every_s: float = 30.0):
+        self.path = Path(path)
+        self.min_hits = min_hits
+        self.flush_every_s = flush_every_s
+        self._lock = threading.Lock()
+        self._data: Optional[Dict] = None
+        self._mtime = None
+        self._checked = 0.0
+        self._delta: Dict[str, Dict] = {}   # contadores de este proceso todavía no guardados
+        self._last_flush = time.time()
+
+    def _file_mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self) -> Optional[Dict]:
+        # None si el archivo está a medio editar (JSON inválido); {} si no existe
+        if self._file_mtime() is None: return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return None
+
+    def _load(self) -> Dict:
+        # Se relee si otro proceso o una edición a mano cambió el archivo; los contadores sin guardar se vuelven a sumar
+        now = time.time()
+        if self._data is not None and now - self._checked < RELOAD_EVERY_S: return self._data
+        self._checked = now
+        mtime = self._file_mtime()
+        if self._data is None or mtime != self._mtime:
+            data = self._read()
+            if data is None:
+                # archivo a medio editar: se sigue con lo anterior hasta que vuelva a leerse bien
+                if self._data is None: self._data = {}
+            else:
+                self._data, self._mtime = self._merge(data), mtime
+        return self._data
+
+    def _merge(self, data: Dict) -> Dict:
+        # Suma los contadores pendientes de este proceso sobre lo leído del archivo (perfiles "fixed" no se reaprenden)
+        for d in self._delta.values():
+            e = self._find(data, d["name"], create=True)
+            for f in ("hits", "fallbacks"):
+                if d[f]: e[f] = e.get(f, 0) + d[f]
+            if d["learned"]:
+                learned = e.setdefault("learned", {})
+                for pair, n in d["learned"].items(): learned[pair] = learned.get(pair, 0) + n
+                if not e.get("fixed"): self._promote(e)
+            e["updated"] = d["updated"]
+        return data
+
+    @staticmethod
+    def _find(data: Dict, vendor_name: str, create: bool = False) -> Optional[Dict]:
+        k = _key(vendor_name)
+        for name, e in data.items():
+            if _key(name) == k and isinstance(e, dict): return e
+        if not create: return None
+        return data.setdefault((vendor_name or "").strip(), {})
+
+    def _entry(self, vendor_name: str, create: bool = False) -> Optional[Dict]:
+        return self._find(self._load(), vendor_name, create)
+
+    def get(self, vendor_name: str) -> Optional[Profile]:
+        if not vendor_name: return None
+        with self._lock:
+            e = self._entry(vendor_name)
+            if not e or not e.get("card"): return None
+            return e["card"], e.get("price") or ""
+
+    def record(self, vendor_name: str, outcome: str, used: Optional[Profile] = None):
+        # outcome: "hit" (precio con el perfil), "fallback" (el perfil no alcanzó y la cascada sí dio precio),
+        # "learn" (precio de la cascada, sin perfil). used: el par de selectores del precio aceptado
+        if not vendor_name: return
+        with self._lock:
+            e = self._entry(vendor_name, create=True)
+            d = self._delta.setdefault(_key(vendor_name), {"name": (vendor_name or "").strip(), "hits": 0, "fallbacks": 0, "learned": {}})
+            if outcome in ("hit", "fallback"):
+                e[outcome + "s"] = e.get(outcome + "s", 0) + 1
+                d[outcome + "s"] += 1
+            if used:
+                learned = e.setdefault("learned", {})
+                learned[_pair(*used)] = learned.get(_pair(*used), 0) + 1
+                d["learned"][_pair(*used)] = d["learned"].get(_pair(*used), 0) + 1
+                if not e.get("fixed"): self._promote(e)
+            e["updated"] = d["updated"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            due = time.time() - self._last_flush > self.flush_every_s
+        if due: self.flush()
+
+    def _promote(self, e: Dict):
+        # El par con más aciertos (y al menos min_hits) es el perfil; si la cascada empieza a acertar más con otro, cambia
+        best, n = max(e["learned"].items(), key=lambda kv: kv[1])
+        if n < self.min_hits: return
+        card, price = best.split(" | ", 1)
+        if (e.get("card"), e.get("price") or "") != (card, price):
+            e["card"], e["price"] = card, price
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            out = {}
+            for name, e in self._load().items():
+                if not isinstance(e, dict): continue
+                tried = e.get("hits", 0) + e.get("fallbacks", 0)
+                out[name] = {"card": e.get("card"), "price": e.get("price"), "fixed": bool(e.get("fixed")),
+                             "hits": e.get("hits", 0), "fallbacks": e.get("fallbacks", 0),
+                             "hit_rate": round(e.get("hits", 0) / tried, 3) if tried else None}
+            return out
+
+    def flush(self):
+        # Lee el archivo actual (ediciones a mano y lo que guardaron otros workers) y le suma lo de este proceso
+        with self._lock:
+            if not self._delta: return
+            self._last_flush = time.time()
+            mtime, data = self._file_mtime(), self._read()
+            if data is None: return   # archivo a medio editar: se reintenta en el próximo flush
+            data = self._merge(data)
+            payload = json.dumps(data, ensure_ascii=False, indent=1)
+            self._data, self._mtime = data, mtime
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(tmp, self.path)
+                self._mtime, self._delta = self._file_mtime(), {}
+            except OSError:
+                pass   # los contadores quedan pendientes para el próximo flush
+
+_default_profiles: Optional[SelectorProfiles] = None
+_default_lock = threading.Lock()
+
+def default_selector_profiles() -> SelectorProfiles:
+    global _default_profiles
+    with _default_lock:
+        if _default_profiles is None:
+            _default_profiles = SelectorProfiles()
+        return _default_profiles
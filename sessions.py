@@ -0,0 +1,143 @@
+# sessions.py
+# Sesiones HTTP compartidas por todo el proceso (entre lotes y trabajos): una por host, con identidad estable
+# (mismo user-agent y headers para ese host), pool keep-alive acotado, compresión y, a pedido (SCRAPER_HTTP2=1),
+# HTTP/2 vía curl_cffi. Las conexiones TLS quedan abiertas entre pedidos y entre corridas.
+import os, random, threading
+from collections import OrderedDict
+from importlib.util import find_spec
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util import make_headers
+
+# Opcional: curl_cffi (huella TLS/HTTP2 de Chrome) para HTTP/2 y para reducir 403; se importa con la primera sesión curl
+HAVE_CURLCFFI = find_spec("curl_cffi") is not None
+
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 4))   # conexiones keep-alive por host
+POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", 64))      # hosts con sesión abierta (LRU)
+HTTP2 = os.getenv("SCRAPER_HTTP2", "0").lower()         # 1: curl_cffi (HTTP/2) para https si está instalado; 0: sólo requests
+IMPERSONATE = os.getenv("CURL_IMPERSONATE", "chrome124")
+# gzip/deflate y br/zstd si están los decodificadores instalados
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+UA_POOL = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
+]
+
+DEFAULT_HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "accept-language": "es-AR,es;q=0.9,en-US;q=0.8,en;q=0.7",
+    "accept-encoding": ACCEPT_ENCODING,
+    "cache-control": "no-cache",
+    "upgrade-insecure-requests": "1",
+    "sec-fetch-site": "none",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-user": "?1",
+    "sec-fetch-dest": "document",
+    "pragma": "no-cache",
+}
+def browser_headers(domain: str) -> dict:
+    ua = random.choice(UA_POOL)
+    h = dict(DEFAULT_HEADERS)
+    h["user-agent"] = ua
+    h["sec-ch-ua"] = '"Chromium";v="120", "Google Chrome";v="120", "Not:A-Brand";v="99"'
+    h["sec-ch-ua-platform"] = '"Windows"'
+    h["sec-ch-ua-mobile"] = "?0"
+    h["referer"] = f"{domain.rstrip('/')}/"
+    return h
+
+def as_requests_response(cr) -> requests.Response:
+    # Respuesta de curl_cffi con la interfaz de requests: raise_for_status da requests.HTTPError y el cuerpo
+    # (ya leído) se puede reemplazar o recorrer con iter_content como el de cualquier otra respuesta
+    r = requests.Response()
+    r.status_code = cr.status_code
+    r.url = str(cr.url)
+    r.reason = getattr(cr, "reason", "") or ""
+    r.headers = CaseInsensitiveDict(dict(cr.headers.items()))
+    r.encoding = get_encoding_from_headers(r.headers)
+    r._content, r._content_consumed = cr.content, True
+    return r
+
+class HostSession:
+    def __init__(self, origin: str, pool_maxsize: int = POOL_MAXSIZE, http2: bool = False):
+        self.origin = origin
+        # Identidad fija del host: se elige una vez y no se toca por pedido
+        self.headers = browser_headers(origin)
+        self.rs = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.rs.mount("http://", adapter); self.rs.mount("https://", adapter)
+        self.rs.headers.clear(); self.rs.headers.update(self.headers)
+        self.http2 = http2 and HAVE_CURLCFFI
+        self._crs = None
+        self._curl_lock = threading.Lock()   # una sesión curl no es thread-safe
+
+    def get(self, url: str, **kw):
+        if self.http2: return self.curl_get(url, **kw)
+        return self.rs.get(url, **kw)
+
+    def curl_get(self, url: str, **kw):
+        # curl_cffi impersonando Chrome: transporte principal con HTTP/2 o reintento ante 403. El cuerpo se lee
+        # entero (sin stream) y los errores de transporte salen como los de requests
+        kw.pop("stream", None)
+        with self._curl_lock:
+            if self._crs is None:
+                from curl_cffi import requests as curl_requests
+                self._crs = curl_requests.Session(impersonate=IMPERSONATE)
+                # el UA y los sec-ch-* los pone el navegador impersonado
+                self._crs.headers.update({"accept-language": self.headers["accept-language"], "referer": self.headers["referer"]})
+            try:
+                cr = self._crs.get(url, **kw)
+            except Exception as e:
+                raise requests.ConnectionError(f"curl_cffi: {e}") from e
+        return as_requests_response(cr)
+
+    def close(self):
+        self.rs.close()
+        with self._curl_lock:
+            if self._crs is not None:
+                try: self._crs.close()
+                except Exception: pass
+                self._crs = None
+
+class SessionPool:
+    def __init__(self, max_hosts: int = POOL_HOSTS, pool_maxsize: int = POOL_MAXSIZE, http2: str = HTTP2):
+        self.max_hosts = max_hosts
+        self.pool_maxsize = pool_maxsize
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self._hosts: "OrderedDict[str, HostSession]" = OrderedDict()
+
+    def for_url(self, url: str) -> HostSession:
+        parts = urlsplit(url or "")
+        origin = f"{parts.scheme}://{parts.netloc}".lower()
+        with self._lock:
+            hs = self._hosts.get(origin)
+            if hs is not None:
+                self._hosts.move_to_end(origin)
+                return hs
+            # HTTP/2 sólo se negocia sobre TLS (ALPN)
+            hs = self._hosts[origin] = HostSession(origin, self.pool_maxsize, http2=self.http2 in ("1", "true", "auto") and parts.scheme == "https")
+            while len(self._hosts) > self.max_hosts:
+                _, old = self._hosts.popitem(last=False)
+                old.close()
+            return hs
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {o: {"http2": hs.http2} for o, hs in self._hosts.items()}
+
+_default_pool: Optional[SessionPool] = None
+_default_lock = threading.Lock()
+
+def default_session_pool() -> SessionPool:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool()
+        return _default_pool
@@ -0,0 +1,210 @@
+# sheets_export.py
+# Exportación a Google Sheets: cliente autorizado reutilizado y escritura por diferencias
+# (sólo celdas cambiadas + filas nuevas), en lotes acotados y con reintentos ante cuota (429/5xx).
+# El cliente se inyecta: cualquier objeto con la interfaz de gspread (open/create -> sheet1) sirve, junto con sus
+# excepciones (errors=) si no son las de gspread; tests/fake_gspread.py es uno en memoria.
+import os, json, time, base64, random, threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+DEFAULT_SHEET = "Comparación Precios Electrodomésticos"
+# Una fila por producto (nombre, marca, modelo y EAN: dos modelos con el mismo nombre son filas distintas) y fecha:
+# el mismo día se actualiza, otro día se agrega
+KEY_COLUMNS = ("Producto", "Marca", "Modelo", "EAN", "Fecha de Consulta")
+MAX_CELLS_PER_CALL = int(os.getenv("SHEETS_MAX_CELLS", 10000))
+MAX_ROWS_PER_APPEND = int(os.getenv("SHEETS_MAX_ROWS", 500))
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_client = None
+_client_lock = threading.Lock()
+
+def _credentials():
+    from oauth2client.service_account import ServiceAccountCredentials
+    path = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+    b64 = os.getenv("GOOGLE_CREDENTIALS_BASE64", "")
+    if b64 and not os.path.exists(path):
+        # directo desde la variable, sin escribir el archivo en cada exportación
+        return ServiceAccountCredentials.from_json_keyfile_dict(json.loads(base64.b64decode(b64)), SCOPE)
+    return ServiceAccountCredentials.from_json_keyfile_name(path, SCOPE)
+
+def default_client():
+    # Autorizado una vez por proceso; gspread renueva el token solo
+    global _client
+    with _client_lock:
+        if _client is None:
+            import gspread
+            _client = gspread.authorize(_credentials())
+        return _client
+
+class _NoMatch(Exception):
+    pass
+
+def gspread_errors() -> Tuple[type, type]:
+    # (APIError, SpreadsheetNotFound) de gspread; sin gspread instalado no hay excepción suya que atrapar
+    try:
+        from gspread.exceptions import APIError, SpreadsheetNotFound
+        return APIError, SpreadsheetNotFound
+    except ImportError:
+        return _NoMatch, _NoMatch
+
+def col_letter(n: int) -> str:
+    # 1 -> A, 27 -> AA
+    out = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        out = chr(65 + r) + out
+    return out
+
+def _cell(v) -> str:
+    return "" if v is None else str(v)
+
+class SheetsExporter:
+    def __init__(self, client=None, sheet_name: str = DEFAULT_SHEET, key_columns: Tuple[str, ...] = KEY_COLUMNS,
+                 max_retries: int = 5, backoff_base: float = 1.0, flush_rows: int = 50, flush_s: float = 10.0,
+                 sleep: Callable[[float], None] = time.sleep, log: Optional[Callable[[str], None]] = None,
+                 errors: Optional[Tuple[type, type]] = None):
+        self.client = client or default_client()
+        # (error de la API con .response.status_code, planilla inexistente)
+        self.api_error, self.not_found = errors or gspread_errors()
+        self.sheet_name = sheet_name
+        self.key_columns = key_columns
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.flush_rows = flush_rows
+        self.flush_s = flush_s
+        self.sleep = sleep
+        self.log = log or (lambda *_: None)
+        self.sheet = None; self.ws = None
+        self.header: List[str] = []
+        self.index: Dict[Tuple[str, ...], Tuple[int, List[str]]] = {}   # clave -> (nº de fila, valores)
+        self.n_rows = 0
+        self.stats = {"updated_cells": 0, "appended_rows": 0, "calls": 0, "retries": 0}
+        self._buffer: List[Dict] = []
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    # ------------------------ API con reintentos ------------------------
+    def _call(self, fn, *a, **kw):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.stats["calls"] += 1
+                return fn(*a, **kw)
+            except self.api_error as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status not in RETRY_STATUS or attempt >= self.max_retries: raise
+                delay = min(64.0, self.backoff_base * (2 ** attempt)) * random.uniform(1.0, 1.5)
+                self.stats["retries"] += 1
+                self.log(f"Sheets: HTTP {status}, reintento en {delay:.1f}s")
+                self.sleep(delay)
+
+    def _key(self, values: Dict) -> Tuple[str, ...]:
+        return tuple(_cell(values.get(c)).strip() for c in self.key_columns)
+
+    # ------------------------ estado de la hoja ------------------------
+    def open(self):
+        try:
+            self.sheet = self._call(self.client.open, self.sheet_name)
+        except self.not_found:
+            self.sheet = self._call(self.client.create, self.sheet_name)
+        self.ws = self.sheet.sheet1
+        values = self._call(self.ws.get_all_values)
+        self.header = list(values[0]) if values else []
+        self.n_rows = len(values)
+        self.index = {}
+        for r, row in enumerate(values[1:], start=2):
+            self.index[self._key(dict(zip(self.header, row)))] = (r, list(row))
+        return self
+
+    def ensure_columns(self, columns: List[str]):
+        # Columnas nuevas se agregan al final del encabezado (la hoja nueva lo recibe completo)
+        if self.ws is None: self.open()
+        new = list(dict.fromkeys(c for c in columns if c not in self.header))
+        if not new: return
+        first = not self.header
+        start = len(self.header) + 1
+        self.header += new
+        if len(self.header) > getattr(self.ws, "col_count", len(self.header)):
+            self._call(self.ws.add_cols, len(self.header) - self.ws.col_count)
+        rng = f"{col_letter(start)}1:{col_letter(len(self.header))}1"
+        self._call(self.ws.batch_update, [{"range": rng, "values": [new]}], value_input_option="RAW")
+        self.n_rows = max(self.n_rows, 1)
+        if first:
+            try:
+                self.ws.format("A1:Z1", {"textFormat": {"bold": True}})
+            except Exception:
+                pass
+
+    # ------------------------ escritura ------------------------
+    def add_rows(self, rows: List[Dict]):
+        # Para trabajos en curso: se acumulan y se escriben por tamaño o por tiempo
+        with self._lock:
+            self._buffer.extend(rows)
+            due = len(self._buffer) >= self.flush_rows or time.time() - self._last_flush >= self.flush_s
+        if due: self.flush()
+
+    def export(self, rows: List[Dict]) -> Dict:
+        with self._lock:
+            self._buffer.extend(rows)
+        return self.flush()
+
+    def flush(self) -> Dict:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.time()
+            if not rows: return dict(self.stats)
+            if self.ws is None: self.open()
+            self.ensure_columns([c for r in rows for c in r])
+            updates: List[Dict] = []
+            appends: Dict[Tuple[str, ...], List[str]] = {}
+            for row in rows:
+                key = self._key(row)
+                vals = [_cell(row[c]) if c in row else None for c in self.header]
+                if key in appends:
+                    appends[key] = [v if v is not None else old for v, old in zip(vals, appends[key])]
+                elif key in self.index:
+                    updates += self._diff(key, vals)
+                else:
+                    appends[key] = vals
+            cells = self._send_updates(updates)
+            added = self._send_appends(appends)
+            self.stats["updated_cells"] += cells; self.stats["appended_rows"] += added
+            if cells or added:
+                self.log(f"Sheets: {cells} celda(s) actualizadas, {added} fila(s) nuevas")
+            return dict(self.stats)
+
+    def _diff(self, key, vals: List[Optional[str]]) -> List[Dict]:
+        # Rangos contiguos de celdas cambiadas en la fila; columnas ausentes en la fila no se tocan
+        r, old = self.index[key]
+        old = old + [""] * (len(self.header) - len(old))
+        out, run = [], []
+        for j, v in enumerate(vals + [None]):
+            changed = v is not None and j < len(old) and v != old[j]
+            if changed:
+                run.append(j); old[j] = v
+            elif run:
+                out.append({"range": f"{col_letter(run[0] + 1)}{r}:{col_letter(run[-1] + 1)}{r}", "values": [[old[k] for k in run]]})
+                run = []
+        self.index[key] = (r, old)
+        return out
+
+    def _send_updates(self, updates: List[Dict]) -> int:
+        total, chunk, size = 0, [], 0
+        for u in updates:
+            n = len(u["values"][0])
+            if chunk and size + n > MAX_CELLS_PER_CALL:
+                self._call(self.ws.batch_update, chunk, value_input_option="RAW"); chunk, size = [], 0
+            chunk.append(u); size += n; total += n
+        if chunk:
+            self._call(self.ws.batch_update, chunk, value_input_option="RAW")
+        return total
+
+    def _send_appends(self, appends: Dict[Tuple[str, ...], List[Optional[str]]]) -> int:
+        items = [(k, [v or "" for v in vals]) for k, vals in appends.items()]
+        step = max(1, min(MAX_ROWS_PER_APPEND, MAX_CELLS_PER_CALL // max(1, len(self.header))))
+        for i in range(0, len(items), step):
+            part = items[i:i + step]
+            self._call(self.ws.append_rows, [vals for _, vals in part], value_input_option="RAW", table_range="A1")
+            for k, vals in part:
+                self.n_rows += 1
+                self.index[k] = (self.n_rows, vals)
+        return len(items)
@@ -205,7 +205,6 @@ function appendProducts(arr){ if (!arr||!arr.length) return; for (const p of arr
 /* Estado */
 let resultsStore = [];
 let abortRun = false;
-let currentRunId = null;
 
 function keyOf(r){ return [r["Producto"]||"", r["Marca"]||""].join("||"); }
 
@@ -303,23 +302,21 @@ function renderFull(){
   }
 }
 
-/* Ejecución */
+/* Ejecución: un trabajo repartido en la cola (todos los vendedores en paralelo, en cualquier worker) */
+let currentJobId = null;
+
 async function stopSearch(){
   abortRun = true;
   logLine("Solicitud de cancelación enviada…", "warn");
-  if (currentRunId){
+  if (currentJobId){
     try{
-      await safeJsonFetch(`${API_BASE}/api/cancel`, {
-        method:"POST", headers:{ "Content-Type":"application/json" },
-        body: JSON.stringify({ run_id: currentRunId })
-      });
+      await safeJsonFetch(`${API_BASE}/api/jobs/${currentJobId}/cancel`, { method:"POST" });
       logLine("Cancelación confirmada por el servidor.", "ok");
     }catch(e){
       logLine(`Error al cancelar: ${e.message}`, "err");
     }
   }
 }
-function newRunId(){ return Math.random().toString(36).slice(2) + Date.now().toString(36); }
 
 async function runSearch(){
   const allProducts = collectProducts();
@@ -334,51 +331,88 @@ async function runSearch(){
   runLog.textContent = ""; resultsStore = []; resultsBody.innerHTML = "";
   setStatus("Ejecutando búsqueda...");
   abortRun = false;
-  currentRunId = newRunId();
+  currentJobId = null;
 
   logLine(timeGreeting("Alberto"), "ok");
-  logLine(`Lote de ${products.length} producto(s), ${Object.keys(allVendors).length} vendedor(es). run_id=${currentRunId}`, "warn");
 
   const immediateSel = document.getElementById("immediate");
   const immediate = immediateSel ? immediateSel.value === "true" : true;
-
-  for (const [name, url] of Object.entries(allVendors)){
-    if (abortRun){ logLine("Ejecución detenida por el usuario.", "err"); break; }
-    if (!name) continue;
-    logLine(`Iniciando ${name} …`, "warn");
-    try{
-      const payload = {
-        run_id: currentRunId,
-        products,
-        vendor: { name, url },
-        headless: document.getElementById("headless").value === "true",
-        min_delay: parseInt(document.getElementById("minDelay").value || "2", 10),
-        max_delay: parseInt(document.getElementById("maxDelay").value || "5", 10),
-        include_official: document.getElementById("official").value === "true"
-      };
-      const data = await safeJsonFetch(`${API_BASE}/api/scrape_vendor`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload)
-      });
-      if (!data.success) throw new Error(data.error || `Falló ${name}`);
-
-      if (immediate){
-        (data.rows || []).forEach(r => ensureRowAndSetCell(r, name));
+  let status = "error";
+
+  try{
+    const payload = {
+      products,
+      vendors: allVendors,
+      sharded: true,
+      headless: document.getElementById("headless").value === "true",
+      min_delay: parseInt(document.getElementById("minDelay").value || "2", 10),
+      max_delay: parseInt(document.getElementById("maxDelay").value || "5", 10),
+      include_official: document.getElementById("official").value === "true"
+    };
+    const data = await safeJsonFetch(`${API_BASE}/api/jobs`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload)
+    });
+    if (!data.success) throw new Error(data.error || "No se pudo crear el trabajo");
+    currentJobId = data.job_id;
+    logLine(`Lote de ${products.length} producto(s), ${Object.keys(allVendors).length} vendedor(es). job_id=${currentJobId}`, "warn");
+
+    await followJob(currentJobId, ev => {
+      if (ev.type === "log") logLine(ev.data);
+      else if (ev.type === "cells"){
+        // precio de un vendedor para un producto, apenas lo resuelve cualquier worker
+        if (immediate) ensureRowAndSetCell(ev.data.row, ev.data.vendor);
+        mergeRows([ev.data.row]);
+      }
+      else if (ev.type === "row"){
+        // fila completa (todos los vendedores del tramo), con el formato de /api/scrape
+        mergeRows([ev.data.row]);
+        if (!immediate) renderFull();
+      }
+      else if (ev.type === "end"){
+        status = ev.status;
+        if (ev.error) logLine(`ERROR: ${ev.error}`, "err");
       }
+    });
+  }catch(e){
+    logLine(`ERROR: ${e.message}`, "err");
+  }
 
-      mergeRows(data.rows || []);
-      if (!immediate) renderFull();
+  const cancelled = abortRun || status === "cancelled";
+  setStatus(cancelled ? "Cancelado" : status === "done" ? "Completado" : "Error");
+  logLine(cancelled ? "Lote cancelado." : "Lote finalizado.", cancelled || status !== "done" ? "err" : "ok");
+}
 
-      (data.log || []).forEach(line => logLine(line));
-      logLine(`OK ${name}`, "ok");
+/* Stream NDJSON de /api/jobs/<id>/stream; si se corta la conexión se retoma desde el último evento */
+async function followJob(jobId, onEvent){
+  let after = 0;
+  for (let attempt = 0; attempt < 5; attempt++){
+    try{
+      const res = await fetch(`${API_BASE}/api/jobs/${jobId}/stream?after=${after}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+      while (true){
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        const lines = buf.split("\n"); buf = lines.pop();
+        for (const line of lines){
+          if (!line.trim()) continue;
+          const ev = JSON.parse(line);
+          if (ev.seq) after = ev.seq;
+          onEvent(ev);
+          if (ev.type === "end") return;
+        }
+      }
     }catch(e){
-      logLine(`ERROR ${name}: ${e.message}`, "err");
+      logLine(`Stream interrumpido (${e.message}), reconectando…`, "warn");
     }
+    await new Promise(r => setTimeout(r, 1000 * (attempt + 1)));
   }
-
-  setStatus(abortRun ? "Cancelado" : "Completado");
-  logLine(abortRun ? "Lote cancelado." : "Lote finalizado.", abortRun ? "err" : "ok");
+  throw new Error("No se pudo seguir el trabajo");
 }
 
 /* Log y helpers */
@@ -0,0 +1,206 @@
+# strategy_cache.py
+# Huella de plataforma por vendedor: qué estrategia dio precio y cómo fallaron las demás
+import os, re, json, time, threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+STRATEGY_CACHE_FILE = Path(os.getenv("STRATEGY_CACHE_FILE", CACHE_DIR / "estrategias.json"))
+
+# Marcadores de plataforma en el HTML de la home (orden = prioridad)
+PLATFORM_MARKERS = [
+    ("vtex", re.compile(r"vtex(?:assets|commercestable|img)|vtex\.render|__RUNTIME__|/arquivos/", re.I)),
+    ("magento", re.compile(r"Magento_|mage/cookies|/static/version\d+|data-mage-init|text/x-magento-init", re.I)),
+    ("wordpress", re.compile(r"wp-content|wp-includes|woocommerce|wp-json", re.I)),
+]
+
+def detect_platform(html: str, headers: Optional[Dict] = None) -> Optional[str]:
+    hdr = " ".join(f"{k}: {v}" for k, v in (headers or {}).items())
+    for name, pat in PLATFORM_MARKERS:
+        if pat.search(hdr) or pat.search(html or ""):
+            return name
+    return None
+
+def _vendor_key(vendor_name: str) -> str:
+    return (vendor_name or "").strip().lower()
+
+COUNTERS = ("hits", "misses", "errors", "empties")
+STAMPS = ("last_ok", "last_empty", "last_fail")
+RELOAD_EVERY_S = 2.0                                                    # cada cuánto se mira si otro worker guardó
+ERROR_RETRY_S = float(os.getenv("STRATEGY_ERROR_RETRY_S", 600))        # pausa de una estrategia tras max_errors seguidos
+
+class StrategyCache:
+    # Cada proceso guarda sólo lo que sumó desde el último flush (contadores, rachas y huella) y lo agrega sobre el
+    # archivo releído: con varios workers de gunicorn ninguno pisa lo aprendido por los otros ni los /api/vendors/probe
+    def __init__(self, path: Path = STRATEGY_CACHE_FILE, ttl_s: float = 7 * 86400, max_errors: int = 3, max_misses: int = 12, flush_every_s: float = 30.0,
+                 error_retry_s: float = ERROR_RETRY_S):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_errors = max_errors
+        self.max_misses = max_misses
+        self.error_retry_s = error_retry_s
+        self.flush_every_s = flush_every_s
+        self._lock = threading.Lock()
+        self._data: Optional[Dict] = None
+        self._mtime = None
+        self._checked = 0.0
+        self._delta: Dict[str, Dict] = {}   # vendedor -> {"platform": (plataforma, probed), "strategies": {estrategia: cambios}}
+        self._last_flush = time.time()
+
+    def _file_mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self) -> Optional[Dict]:
+        # None si el archivo no se pudo leer entero (se reintenta después); {} si no existe
+        if self._file_mtime() is None: return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return None
+
+    def _load(self) -> Dict:
+        now = time.time()
+        if self._data is not None and now - self._checked < RELOAD_EVERY_S: return self._data
+        self._checked = now
+        mtime = self._file_mtime()
+        if self._data is None or mtime != self._mtime:
+            data = self._read()
+            if data is None:
+                if self._data is None: self._data = {}
+            else:
+                self._data, self._mtime = self._merge(data), mtime
+        return self._data
+
+    @staticmethod
+    def _new_entry() -> Dict:
+        return {"platform": None, "probed": 0, "strategies": {}}
+
+    def _merge(self, data: Dict) -> Dict:
+        # Suma lo pendiente de este proceso sobre lo leído: contadores sumados, fechas y huella la más nueva, rachas
+        # continuadas (o reemplazadas si acá hubo un acierto que las cortó)
+        for vk, d in self._delta.items():
+            e = data.setdefault(vk, self._new_entry())
+            if d.get("platform") and d["platform"][1] >= e.get("probed", 0):
+                e["platform"], e["probed"] = d["platform"]
+            for name, ds in d["strategies"].items():
+                st = e["strategies"].setdefault(name, {"hits": 0, "misses": 0, "errors": 0})
+                for f in COUNTERS:
+                    if ds.get(f): st[f] = st.get(f, 0) + ds[f]
+                for f in STAMPS:
+                    if ds.get(f, 0) > st.get(f, 0): st[f] = ds[f]
+                if ds.get("last_error") and ds.get("last_fail", 0) >= st.get("last_fail", 0): st["last_error"] = ds["last_error"]
+                for f in ("consecutive_errors", "consecutive_misses"):
+                    st[f] = ds[f] if ds.get(f + "_reset") else st.get(f, 0) + ds.get(f, 0)
+        return data
+
+    def _expire(self, e: Dict, now: float):
+        # Expira la huella para forzar re-detección
+        if e.get("platform") and now - e.get("probed", 0) > self.ttl_s:
+            e["platform"] = None
+        strats = e["strategies"]
+        for k in [k for k, st in strats.items() if now - max(st.get(f, 0) for f in STAMPS) > self.ttl_s]:
+            del strats[k]
+
+    def _entry(self, vendor_name: str) -> Dict:
+        e = self._load().setdefault(_vendor_key(vendor_name), self._new_entry())
+        self._expire(e, time.time())
+        return e
+
+    def _pending(self, vendor_name: str) -> Dict:
+        return self._delta.setdefault(_vendor_key(vendor_name), {"strategies": {}})
+
+    def order(self, vendor_name: str, default_order: List[str]) -> List[str]:
+        with self._lock:
+            e = self._entry(vendor_name)
+            strats = e["strategies"]
+            order = list(default_order)
+            if e.get("platform") in order:
+                order.remove(e["platform"]); order.insert(0, e["platform"])
+            # La última estrategia que dio precio va primero
+            winners = sorted((k for k in order if strats.get(k, {}).get("last_ok")), key=lambda k: -strats[k]["last_ok"])
+            if winners:
+                order.remove(winners[0]); order.insert(0, winners[0])
+            keep = [k for k in order if not self._is_dead(strats.get(k))]
+            return keep or order
+
+    def _is_dead(self, st: Optional[Dict]) -> bool:
+        if not st: return False
+        # errores seguidos (403, timeouts): pausa corta y se vuelve a probar, no un veto por todo el TTL
+        if st.get("consecutive_errors", 0) >= self.max_errors and time.time() - st.get("last_fail", 0) < self.error_retry_s: return True
+        return not st.get("hits") and st.get("consecutive_misses", 0) >= self.max_misses
+
+    def record(self, vendor_name: str, strategy: str, outcome: str, error: str = ""):
+        # outcome: "hit" (dio precio), "miss" (respuesta válida sin precio), "empty" (búsqueda válida sin resultados),
+        # "error" (HTTP/parseo). "empty" es una respuesta sana: el vendedor no tiene el producto, la estrategia funciona
+        with self._lock:
+            st = self._entry(vendor_name)["strategies"].setdefault(strategy, {"hits": 0, "misses": 0, "errors": 0})
+            ds = self._pending(vendor_name)["strategies"].setdefault(strategy, {})
+            now = time.time()
+            def add(f, n=1):
+                st[f] = st.get(f, 0) + n; ds[f] = ds.get(f, 0) + n
+            def reset(f):
+                st[f] = ds[f] = 0; ds[f + "_reset"] = True
+            def stamp(f, value):
+                st[f] = ds[f] = value
+            if outcome == "hit":
+                add("hits"); stamp("last_ok", now)
+                reset("consecutive_errors"); reset("consecutive_misses")
+            elif outcome == "empty":
+                add("empties"); stamp("last_empty", now)
+                reset("consecutive_errors")
+            elif outcome == "miss":
+                add("misses"); stamp("last_fail", now); stamp("last_error", "sin precio")
+                add("consecutive_misses")
+            else:
+                add("errors"); stamp("last_fail", now); stamp("last_error", (error or "error")[:200])
+                add("consecutive_errors")
+            due = now - self._last_flush > self.flush_every_s
+        if due: self.flush()
+
+    def set_platform(self, vendor_name: str, platform: Optional[str]):
+        with self._lock:
+            e = self._entry(vendor_name)
+            e["platform"] = platform; e["probed"] = time.time()
+            self._pending(vendor_name)["platform"] = (platform, e["probed"])
+        self.flush()
+
+    def snapshot(self, vendor_name: str) -> Dict:
+        with self._lock:
+            return json.loads(json.dumps(self._entry(vendor_name)))
+
+    def flush(self):
+        # Relee el archivo (lo que guardaron otros workers) y le suma lo de este proceso
+        with self._lock:
+            if not self._delta: return
+            self._last_flush = time.time()
+            mtime, data = self._file_mtime(), self._read()
+            if data is None: return   # archivo ilegible: se reintenta en el próximo flush
+            data = self._merge(data)
+            for e in data.values():
+                if isinstance(e, dict) and isinstance(e.get("strategies"), dict): self._expire(e, self._last_flush)
+            payload = json.dumps(data, ensure_ascii=False, indent=1)
+            self._data, self._mtime = data, mtime
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(tmp, self.path)
+                self._mtime, self._delta = self._file_mtime(), {}
+            except OSError:
+                pass   # lo pendiente queda para el próximo flush
+
+_default_cache: Optional[StrategyCache] = None
+_default_lock = threading.Lock()
+
+def default_strategy_cache() -> StrategyCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = StrategyCache()
+        return _default_cache
@@ -0,0 +1,112 @@
+# stream_export.py
+# Exportación en streaming de filas de un scrape: NDJSON y CSV línea a línea, Arrow (IPC stream) por lotes y
+# Parquet por row groups en un archivo temporal. Todos consumen un generador de filas (dicts) y devuelven un
+# generador de bytes: en memoria sólo queda el lote en curso, no el resultado completo.
+import io, os, csv, json, tempfile
+from importlib.util import find_spec
+from typing import Dict, Iterable, Iterator, List
+
+# Opcional: pyarrow para Arrow y Parquet; se importa recién al exportar en esos formatos
+HAVE_ARROW = find_spec("pyarrow") is not None
+BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 1000))   # filas por record batch / row group
+CSV_FLUSH_BYTES = 64 * 1024
+FILE_CHUNK = 256 * 1024
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+
+def needs_arrow(fmt: str) -> bool:
+    return fmt in ("arrow", "parquet")
+
+def _batches(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch; batch = []
+    if batch: yield batch
+
+# ---------------- texto ----------------
+def ndjson_chunks(rows: Iterable[Dict]) -> Iterator[bytes]:
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+def csv_chunks(rows: Iterable[Dict], columns: List[str]) -> Iterator[bytes]:
+    # Encabezado fijo (las columnas se conocen antes de la primera fila); BOM para que Excel lea UTF-8
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore", restval="")
+    buf.write("\ufeff"); w.writeheader()
+    for row in rows:
+        w.writerow(row)
+        if buf.tell() >= CSV_FLUSH_BYTES:
+            yield buf.getvalue().encode("utf-8"); buf.seek(0); buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+# ---------------- Arrow / Parquet ----------------
+def _schema(columns: List[str]):
+    # Precios "(num)" como enteros (nulos si ND), el resto texto
+    import pyarrow as pa
+    return pa.schema([(c, pa.int64() if c.endswith(" (num)") else pa.string()) for c in columns])
+
+def _record_batch(batch: List[Dict], schema):
+    import pyarrow as pa
+    num = lambda v: int(v) if str(v).isdigit() else None
+    cols = [[num(r.get(f.name)) if pa.types.is_integer(f.type) else (None if r.get(f.name) is None else str(r.get(f.name))) for r in batch]
+            for f in schema]
+    return pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema)
+
+class _Sink(io.RawIOBase):
+    # Destino del writer de Arrow: acumula lo escrito hasta que el generador lo entrega
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.chunks.append(bytes(b)); return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks); self.chunks = []; return out
+
+def arrow_chunks(rows: Iterable[Dict], columns: List[str], batch_rows: int = BATCH_ROWS) -> Iterator[bytes]:
+    # IPC stream: el esquema sale primero y cada lote apenas se completa
+    import pyarrow as pa
+    schema, sink = _schema(columns), _Sink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for batch in _batches(rows, batch_rows):
+            writer.write_batch(_record_batch(batch, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def parquet_chunks(rows: Iterable[Dict], columns: List[str], batch_rows: int = BATCH_ROWS) -> Iterator[bytes]:
+    # Parquet lleva el índice al final: se escribe un row group por lote en un temporal y se envía al cerrar
+    import pyarrow.parquet as pq
+    schema = _schema(columns)
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".parquet")
+    os.close(fd)
+    try:
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in _batches(rows, batch_rows):
+                writer.write_batch(_record_batch(batch, schema))
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK)
+                if not chunk: break
+                yield chunk
+    finally:
+        try: os.remove(path)
+        except OSError: pass
+
+def encode(fmt: str, rows: Iterable[Dict], columns: List[str]) -> Iterator[bytes]:
+    if fmt == "ndjson": return ndjson_chunks(rows)
+    if fmt == "csv": return csv_chunks(rows, columns)
+    if fmt == "arrow": return arrow_chunks(rows, columns)
+    if fmt == "parquet": return parquet_chunks(rows, columns)
+    raise ValueError(f"formato desconocido: {fmt}")
@@ -0,0 +1,89 @@
+# tests/fake_gspread.py
+# Cliente de Google Sheets en memoria con la interfaz que usa SheetsExporter (open/create -> sheet1 con
+# get_all_values, batch_update, append_rows, add_cols, format). fail() encola errores HTTP para probar reintentos.
+import re
+from types import SimpleNamespace
+from typing import Dict, List
+
+class FakeAPIError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status)
+
+class FakeNotFound(Exception):
+    pass
+
+ERRORS = (FakeAPIError, FakeNotFound)
+
+def _col(letters: str) -> int:
+    n = 0
+    for ch in letters: n = n * 26 + ord(ch) - 64
+    return n - 1
+
+class FakeWorksheet:
+    def __init__(self, client: "FakeClient", cols: int = 26):
+        self.client = client
+        self.cells: List[List[str]] = []
+        self.col_count = cols
+
+    def _row(self, r: int) -> List[str]:
+        while len(self.cells) <= r: self.cells.append([])
+        row = self.cells[r]
+        while len(row) < self.col_count: row.append("")
+        return row
+
+    def get_all_values(self):
+        self.client.hit("get_all_values")
+        last = max((len(r) - next((k for k, v in enumerate(reversed(r)) if v), len(r)) for r in self.cells), default=0)
+        return [list(r[:last]) + [""] * (last - len(r)) for r in self.cells]
+
+    def batch_update(self, data: List[Dict], value_input_option: str = "RAW"):
+        self.client.hit("batch_update")
+        for u in data:
+            m = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d+)", u["range"])
+            c0, r0 = _col(m.group(1)), int(m.group(2)) - 1
+            if c0 + len(u["values"][0]) > self.col_count: raise FakeAPIError(400)
+            for k, v in enumerate(u["values"][0]): self._row(r0)[c0 + k] = v
+
+    def append_rows(self, rows: List[List[str]], value_input_option: str = "RAW", table_range: str = "A1"):
+        self.client.hit("append_rows")
+        start = len(self.cells)
+        for i, vals in enumerate(rows):
+            row = self._row(start + i)
+            for k, v in enumerate(vals): row[k] = v
+
+    def add_cols(self, n: int):
+        self.client.hit("add_cols")
+        self.col_count += n
+
+    def format(self, rng: str, fmt: Dict):
+        pass
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeClient", name: str):
+        self.title = name
+        self.url = f"https://sheets.invalid/{name}"
+        self.sheet1 = FakeWorksheet(client)
+
+class FakeClient:
+    def __init__(self):
+        self.sheets: Dict[str, FakeSpreadsheet] = {}
+        self.calls: Dict[str, int] = {}
+        self._fail: List[int] = []
+
+    def fail(self, *statuses: int):
+        # las próximas llamadas fallan con estos status, en orden
+        self._fail += statuses
+
+    def hit(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self._fail: raise FakeAPIError(self._fail.pop(0))
+
+    def open(self, name: str) -> FakeSpreadsheet:
+        self.hit("open")
+        if name not in self.sheets: raise FakeNotFound(name)
+        return self.sheets[name]
+
+    def create(self, name: str) -> FakeSpreadsheet:
+        self.hit("create")
+        return self.sheets.setdefault(name, FakeSpreadsheet(self, name))
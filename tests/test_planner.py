@@ -0,0 +1,82 @@
+from planner import SearchBudget
+from scraper import NoResults, PriceScraper
+from selector_profiles import SelectorProfiles
+from strategy_cache import StrategyCache
+
+SHARED = "heladera no frost"
+
+class FakeSearchScraper(PriceScraper):
+    # El buscador del vendedor sólo conoce cards fijas por término; cuenta las consultas a la red
+    def __init__(self, tmp_path, cards):
+        super().__init__(delay_range=(0, 0), use_cache=False, strategy_cache=StrategyCache(tmp_path / "estrategias.json"),
+                         selector_profiles=SelectorProfiles(tmp_path / "SELECTORES.json"))
+        self.cards = cards
+        self.searched = []
+
+    def _search_vendor_once(self, vendor_name, base, term, log):
+        self.searched.append(term.lower())
+        entries = self.cards.get(term.lower())
+        if not entries: return None, None
+        price = self._match_cards(entries, term)
+        return (f"$ {int(price):,}".replace(",", ".") + ",00", price) if price else (None, None)
+
+class EmptySiteScraper(PriceScraper):
+    # Sitio VTEX que responde "sin resultados" a todo; las demás estrategias cuentan sus llamadas
+    def __init__(self, tmp_path):
+        super().__init__(delay_range=(0, 0), use_cache=False, strategy_cache=StrategyCache(tmp_path / "estrategias.json"),
+                         selector_profiles=SelectorProfiles(tmp_path / "SELECTORES.json"))
+        self.calls = []
+
+    def _try_vtex(self, base, term, log):
+        self.calls.append(("vtex", term)); raise NoResults(f"sin resultados: {term}")
+
+    def _try_magento_html(self, base, term, log):
+        self.calls.append(("magento", term)); return None, None
+
+    _try_wordpress = _try_generic = _try_brochures = _try_magento_html
+
+def scrape(scraper, products):
+    rows, _ = scraper.scrape_all_vendors(products, {"Tienda": "http://tienda.invalid"}, as_frame=False)
+    return rows
+
+def test_shared_term_is_searched_once_and_not_copied_to_other_models(tmp_path):
+    products = [{"producto": "Heladera No Frost", "marca": "Samsung", "modelo": "RT38"},
+                {"producto": "Heladera No Frost", "marca": "Whirlpool", "modelo": "WRM45"}]
+    scraper = FakeSearchScraper(tmp_path, {SHARED: [("heladera no frost samsung rt38 $ 1.000", [], "1000")]})
+    rows = scrape(scraper, products)
+    assert scraper.searched.count(SHARED) == 1
+    assert rows[0]["Tienda"] == "$ 1.000,00"
+    assert rows[1]["Tienda"] == "ND"
+
+def test_shared_term_results_serve_every_product_they_match(tmp_path):
+    products = [{"producto": "Heladera No Frost", "marca": "Samsung", "modelo": "RT38"},
+                {"producto": "Heladera No Frost", "marca": "Whirlpool", "modelo": "WRM45"}]
+    cards = [("heladera no frost samsung rt38 $ 1.000", [], "1000"), ("heladera no frost whirlpool wrm45 $ 2.000", [], "2000")]
+    scraper = FakeSearchScraper(tmp_path, {SHARED: cards})
+    rows = scrape(scraper, products)
+    assert scraper.searched.count(SHARED) == 1
+    assert [r["Tienda"] for r in rows] == ["$ 1.000,00", "$ 2.000,00"]
+
+def test_budget_stops_after_valid_empty_answers():
+    requests = [0]
+    budget = SearchBudget(lambda: requests[0], max_requests=12, max_seconds=0, empty_stop=2)
+    budget.empty()
+    assert budget.reason() is None
+    budget.empty()
+    assert "sin resultados" in budget.reason()
+
+def test_budget_excludes_batch_work_from_the_product():
+    requests = [0]
+    budget = SearchBudget(lambda: requests[0], max_requests=3, max_seconds=0, empty_stop=0)
+    with budget.excluded():
+        requests[0] += 10
+    assert budget.used() == 0 and budget.reason() is None
+    requests[0] += 3
+    assert budget.reason() == "3 pedido(s)"
+
+def test_no_results_skips_other_strategies_and_stops_the_product(tmp_path):
+    scraper = EmptySiteScraper(tmp_path)
+    rows = scrape(scraper, [{"producto": "Heladera No Frost", "marca": "Samsung", "modelo": "RT38"}])
+    assert rows[0]["Tienda"] == "ND"
+    assert [s for s, _ in scraper.calls] == ["vtex", "vtex"]
+    assert scraper.strategy_cache.order("Tienda", ["vtex", "magento"]) == ["vtex", "magento"]
@@ -0,0 +1,65 @@
+import pytest
+
+from sheets_export import SheetsExporter
+from tests.fake_gspread import ERRORS, FakeAPIError, FakeClient
+
+def row(producto="Heladera", marca="Samsung", modelo="RT38", ean="7791234567890", fecha="17/10/2026", **prices):
+    out = {"Producto": producto, "Marca": marca, "Modelo": modelo, "EAN": ean, "Fecha de Consulta": fecha}
+    out.update(prices)
+    return out
+
+def exporter(client, **kw):
+    return SheetsExporter(client, "Precios", sleep=lambda s: None, errors=ERRORS, **kw)
+
+def values(client):
+    return client.sheets["Precios"].sheet1.get_all_values()
+
+def test_new_sheet_gets_header_and_rows():
+    client = FakeClient()
+    stats = exporter(client).export([row(Naldo="100"), row(modelo="RT32", ean="7790000000001", Naldo="90")])
+    got = values(client)
+    assert got[0] == ["Producto", "Marca", "Modelo", "EAN", "Fecha de Consulta", "Naldo"]
+    assert len(got) == 3 and stats["appended_rows"] == 2
+
+def test_same_day_export_only_writes_changed_cells():
+    client = FakeClient()
+    exporter(client).export([row(Naldo="100", Vital="200")])
+    stats = exporter(client).export([row(Naldo="110", Vital="200")])
+    assert stats["updated_cells"] == 1 and stats["appended_rows"] == 0
+    assert values(client)[1][-2:] == ["110", "200"]
+
+def test_same_name_and_brand_with_other_model_is_another_row():
+    client = FakeClient()
+    exporter(client).export([row(modelo="RT38", ean="1111111111111", Naldo="100")])
+    exporter(client).export([row(modelo="RT32", ean="2222222222222", Naldo="90")])
+    got = values(client)
+    assert [r[2] for r in got[1:]] == ["RT38", "RT32"]
+    assert [r[-1] for r in got[1:]] == ["100", "90"]
+
+def test_new_vendor_column_is_added_at_the_end():
+    client = FakeClient()
+    exporter(client).export([row(Naldo="100")])
+    exporter(client).export([row(Vital="200")])
+    got = values(client)
+    assert got[0][-2:] == ["Naldo", "Vital"] and got[1][-2:] == ["100", "200"]
+
+def test_quota_errors_are_retried():
+    client = FakeClient()
+    client.fail(429, 503)
+    ex = exporter(client)
+    stats = ex.export([row(Naldo="100")])
+    assert stats["retries"] == 2 and len(values(client)) == 2
+
+def test_other_errors_are_raised():
+    client = FakeClient()
+    client.fail(400)
+    with pytest.raises(FakeAPIError):
+        exporter(client).export([row(Naldo="100")])
+
+def test_rows_buffer_until_flush_rows():
+    client = FakeClient()
+    ex = exporter(client, flush_rows=2, flush_s=3600)
+    ex.add_rows([row(Naldo="100")])
+    assert "Precios" not in client.sheets
+    ex.add_rows([row(modelo="RT32", ean="", Naldo="90")])
+    assert len(values(client)) == 3
@@ -0,0 +1,58 @@
+from strategy_cache import StrategyCache
+
+DEFAULT = ["vtex", "magento", "wordpress", "generic"]
+
+def cache(tmp_path, **kw):
+    return StrategyCache(tmp_path / "estrategias.json", flush_every_s=1e9, **kw)
+
+def test_valid_empty_answers_do_not_kill_a_strategy(tmp_path):
+    c = cache(tmp_path)
+    for _ in range(12):
+        c.record("Carrefour", "vtex", "empty")
+    assert c.order("Carrefour", DEFAULT) == DEFAULT
+    st = c.snapshot("Carrefour")["strategies"]["vtex"]
+    assert st["empties"] == 12 and st.get("consecutive_misses", 0) == 0
+
+def test_misses_without_hits_kill_a_strategy(tmp_path):
+    c = cache(tmp_path, max_misses=12)
+    for _ in range(12):
+        c.record("Carrefour", "vtex", "miss")
+    assert c.order("Carrefour", DEFAULT) == DEFAULT[1:]
+
+def test_empty_answer_resets_consecutive_errors(tmp_path):
+    c = cache(tmp_path, max_errors=3)
+    for outcome in ("error", "error", "empty", "error", "error"):
+        c.record("Carrefour", "vtex", outcome)
+    assert c.order("Carrefour", DEFAULT) == DEFAULT
+
+def test_last_hit_goes_first(tmp_path):
+    c = cache(tmp_path)
+    c.record("Naldo", "wordpress", "hit")
+    assert c.order("Naldo", DEFAULT)[0] == "wordpress"
+
+def test_errors_pause_a_strategy_only_for_the_retry_window(tmp_path):
+    c = cache(tmp_path, max_errors=3, error_retry_s=600)
+    c.record("Naldo", "vtex", "hit")
+    for _ in range(3):
+        c.record("Naldo", "vtex", "error", "HTTP 403")
+    assert "vtex" not in c.order("Naldo", DEFAULT)
+    c.snapshot("Naldo")
+    c._data["naldo"]["strategies"]["vtex"]["last_fail"] -= 601
+    assert c.order("Naldo", DEFAULT)[0] == "vtex"
+
+def test_flush_merges_what_each_worker_learned(tmp_path):
+    a, b = cache(tmp_path), cache(tmp_path)
+    a.record("Frávega", "vtex", "hit"); a.record("Frávega", "vtex", "miss")
+    b.record("Frávega", "vtex", "hit")
+    a.flush()
+    b.set_platform("Musimundo", "vtex")   # guarda al momento
+    fresh = cache(tmp_path)
+    st = fresh.snapshot("Frávega")["strategies"]["vtex"]
+    assert (st["hits"], st["misses"], st["consecutive_misses"]) == (2, 1, 0)
+    assert fresh.snapshot("Musimundo")["platform"] == "vtex"
+
+def test_consecutive_errors_continue_across_workers(tmp_path):
+    a, b = cache(tmp_path, max_errors=3), cache(tmp_path, max_errors=3)
+    a.record("Naldo", "vtex", "error"); a.record("Naldo", "vtex", "error"); a.flush()
+    b.record("Naldo", "vtex", "error"); b.flush()
+    assert "vtex" not in cache(tmp_path, max_errors=3).order("Naldo", DEFAULT)
@@ -0,0 +1,294 @@
+# workqueue.py
+# Cola de tareas compartida por todos los workers de gunicorn (y las instancias que vean el mismo almacén):
+# un lote se reparte en tareas (vendedor, tramo de productos) que cualquier proceso toma con un lease que
+# renueva por heartbeat mientras trabaja; si el proceso muere, el lease vence y otro la retoma.
+# También guarda el turno por host (HostSlots) que usa SharedHostScheduler para la cortesía global.
+# Backend por WORK_QUEUE_URL: sqlite:///ruta (por defecto, en .cache). Otros (Redis, Postgres, ...) se suman
+# con register_backend(esquema, fábrica); la fábrica devuelve un objeto con la interfaz de SqliteTaskQueue
+# (enqueue, claim, heartbeat, finish, fail, counts, results, purge y .slots).
+import os, json, time, uuid, random, socket, sqlite3, threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+CACHE_DIR = Path(os.getenv("SCRAPER_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+WORK_QUEUE_URL = os.getenv("WORK_QUEUE_URL", f"sqlite:///{CACHE_DIR / 'workqueue.sqlite3'}")
+LEASE_S = float(os.getenv("QUEUE_LEASE_S", 60))
+MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 3))
+QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", 8))       # hilos por proceso que toman tareas (0: este proceso no ejecuta)
+SHARD_PRODUCTS = int(os.getenv("SHARD_PRODUCTS", 100))   # productos por tarea: más chico reparte más, pero pierde memo y cards del lote
+POLL_S = float(os.getenv("QUEUE_POLL_S", 1.0))          # consulta a la cola sin tareas; crece hasta POLL_MAX_S
+POLL_MAX_S = float(os.getenv("QUEUE_POLL_MAX_S", 5.0))
+TASKS_TTL_S = float(os.getenv("JOBS_TTL_S", 2 * 86400))
+
+FINAL = ("done", "error", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY, job_id TEXT, grp INTEGER, vendor TEXT, host TEXT, payload TEXT,
+    status TEXT, worker TEXT, lease_until REAL, attempts INTEGER DEFAULT 0,
+    result TEXT, error TEXT, created REAL, updated REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, created);
+CREATE INDEX IF NOT EXISTS tasks_job ON tasks(job_id, grp);
+CREATE TABLE IF NOT EXISTS host_slots (host TEXT PRIMARY KEY, tat REAL, cooldown_until REAL);
+"""
+
+@dataclass
+class Task:
+    id: str
+    job_id: str
+    group: int
+    vendor: str
+    payload: Dict
+    attempts: int
+    worker: str
+
+def _connect(path: Path) -> sqlite3.Connection:
+    c = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.row_factory = sqlite3.Row
+    return c
+
+class _SqliteStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = self._local.conn = _connect(self.path)
+        return c
+
+    def after_fork(self):
+        # las conexiones abiertas antes de un fork no se usan en el hijo (SQLite no lo soporta)
+        self._local = threading.local()
+
+    def _tx(self, fn):
+        # BEGIN IMMEDIATE: toma el lock de escritura al empezar, así dos procesos no leen el mismo estado
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(c)
+            c.execute("COMMIT")
+            return out
+        except BaseException:
+            c.execute("ROLLBACK"); raise
+
+class SqliteHostSlots(_SqliteStore):
+    # Mismo GCRA que HostScheduler, con el TAT y el enfriamiento de cada host en la base compartida
+    def reserve(self, host: str, interval: float, burst: int, jitter: float, now: float) -> float:
+        if interval <= 0:
+            return max(now, self.cooldown_until(host))   # sin límite de ritmo: sólo se respeta un enfriamiento
+        def run(c):
+            r = c.execute("SELECT tat, cooldown_until FROM host_slots WHERE host=?", (host,)).fetchone()
+            tat, cool = (r["tat"], r["cooldown_until"]) if r else (0.0, 0.0)
+            ready = max(now, cool, tat - (burst - 1) * interval)
+            if ready > now and jitter > 0:
+                ready += random.uniform(0, jitter)
+            c.execute("INSERT OR REPLACE INTO host_slots (host, tat, cooldown_until) VALUES (?,?,?)",
+                      (host, max(tat, ready) + interval, cool))
+            return ready
+        return self._tx(run)
+
+    def cooldown_until(self, host: str) -> float:
+        r = self._conn().execute("SELECT cooldown_until FROM host_slots WHERE host=?", (host,)).fetchone()
+        return r[0] if r else 0.0
+
+    def cool(self, host: str, until: float):
+        self._conn().execute("""INSERT INTO host_slots (host, tat, cooldown_until) VALUES (?,0,?)
+                                ON CONFLICT(host) DO UPDATE SET cooldown_until=max(cooldown_until, excluded.cooldown_until)""",
+                             (host, until))
+
+class SqliteTaskQueue(_SqliteStore):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.slots = SqliteHostSlots(path)
+
+    def enqueue(self, job_id: str, tasks: List[Dict]) -> int:
+        # tasks: {"group", "vendor", "host", "payload"}; un grupo son las tareas de un mismo tramo de productos
+        now = time.time()
+        rows = [(uuid.uuid4().hex, job_id, t["group"], t["vendor"], t.get("host", ""), json.dumps(t["payload"], ensure_ascii=False),
+                 "queued", now + k * 1e-6, now) for k, t in enumerate(tasks)]
+        self._tx(lambda c: c.executemany("""INSERT INTO tasks (id, job_id, grp, vendor, host, payload, status, created, updated)
+                                            VALUES (?,?,?,?,?,?,?,?,?)""", rows))
+        return len(rows)
+
+    def claim(self, worker: str, lease_s: float = LEASE_S) -> Optional[Task]:
+        # La tarea más vieja libre (o con lease vencido), prefiriendo hosts que nadie está consultando
+        def run(c):
+            now = time.time()
+            while True:
+                r = c.execute("""SELECT * FROM tasks t WHERE status='queued' OR (status='leased' AND lease_until < ?)
+                                 ORDER BY (SELECT COUNT(*) FROM tasks o WHERE o.status='leased' AND o.lease_until >= ? AND o.host=t.host),
+                                          created LIMIT 1""", (now, now)).fetchone()
+                if not r: return None
+                if r["attempts"] >= MAX_ATTEMPTS:
+                    c.execute("UPDATE tasks SET status='error', error=?, updated=? WHERE id=?",
+                              (f"lease vencido en {r['attempts']} intento(s) (worker caído)", now, r["id"]))
+                    continue
+                # dueño por toma: si el mismo proceso la retoma tras vencer, el hilo anterior ya no es dueño
+                owner = f"{worker}/{uuid.uuid4().hex[:8]}"
+                c.execute("UPDATE tasks SET status='leased', worker=?, lease_until=?, attempts=attempts+1, updated=? WHERE id=?",
+                          (owner, now + lease_s, now, r["id"]))
+                return Task(r["id"], r["job_id"], r["grp"], r["vendor"], json.loads(r["payload"]), r["attempts"] + 1, owner)
+        return self._tx(run)
+
+    def heartbeat(self, task: Task, lease_s: float = LEASE_S) -> bool:
+        # False: el lease se perdió (venció y otro worker tomó la tarea)
+        now = time.time()
+        cur = self._conn().execute("UPDATE tasks SET lease_until=?, updated=? WHERE id=? AND worker=? AND status='leased'",
+                                   (now + lease_s, now, task.id, task.worker))
+        return cur.rowcount == 1
+
+    def finish(self, task: Task, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> Optional[Dict]:
+        # None si el lease ya no es nuestro. Si no: {"group": tareas del tramo si éste quedó completo,
+        # "job": conteo por estado si terminó todo el trabajo}; sólo quien cierra el último lo recibe
+        def run(c):
+            now = time.time()
+            cur = c.execute("UPDATE tasks SET status=?, result=?, error=?, lease_until=NULL, updated=? WHERE id=? AND worker=? AND status='leased'",
+                            (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, now, task.id, task.worker))
+            if cur.rowcount != 1: return None
+            return self._closed(c, task.job_id, task.group)
+        return self._tx(run)
+
+    def fail(self, task: Task, error: str) -> Optional[Dict]:
+        # Error de la tarea: vuelve a la cola hasta MAX_ATTEMPTS intentos, después queda en error
+        if task.attempts < MAX_ATTEMPTS:
+            now = time.time()
+            cur = self._conn().execute("UPDATE tasks SET status='queued', error=?, worker=NULL, lease_until=NULL, updated=? WHERE id=? AND worker=? AND status='leased'",
+                                       (error, now, task.id, task.worker))
+            return {"requeued": True, "error": error, "group": None, "job": None} if cur.rowcount == 1 else None
+        return self.finish(task, "error", error=error)
+
+    def _closed(self, c, job_id: str, group: int) -> Dict:
+        grp = c.execute("SELECT status FROM tasks WHERE job_id=? AND grp=?", (job_id, group)).fetchall()
+        out = {"requeued": False, "group": None, "job": None}
+        if all(r[0] in FINAL for r in grp):
+            out["group"] = self._rows(c, "SELECT * FROM tasks WHERE job_id=? AND grp=? ORDER BY created", (job_id, group))
+            counts = self._counts(c, job_id)
+            if all(k in FINAL for k in counts): out["job"] = counts
+        return out
+
+    @staticmethod
+    def _rows(c, q, args) -> List[Dict]:
+        out = []
+        for r in c.execute(q, args):
+            d = dict(r)
+            d["payload"] = json.loads(d["payload"] or "{}")
+            d["result"] = json.loads(d["result"]) if d["result"] else None
+            out.append(d)
+        return out
+
+    @staticmethod
+    def _counts(c, job_id: str) -> Dict[str, int]:
+        return {r[0]: r[1] for r in c.execute("SELECT status, COUNT(*) FROM tasks WHERE job_id=? GROUP BY status", (job_id,))}
+
+    def counts(self, job_id: str) -> Dict[str, int]:
+        return self._counts(self._conn(), job_id)
+
+    def results(self, job_id: str) -> List[Dict]:
+        return self._rows(self._conn(), "SELECT * FROM tasks WHERE job_id=? ORDER BY grp, created", (job_id,))
+
+    def purge(self, older_than: float):
+        self._conn().execute(f"DELETE FROM tasks WHERE updated < ? AND status IN ({','.join('?' * len(FINAL))})", (older_than, *FINAL))
+
+# ------------------------ backends ------------------------
+BACKENDS: Dict[str, Callable[[str], object]] = {}
+
+def register_backend(scheme: str, factory: Callable[[str], object]):
+    BACKENDS[scheme] = factory
+
+def _sqlite_backend(url: str) -> SqliteTaskQueue:
+    # sqlite:///relativa.sqlite3 o sqlite:////ruta/absoluta.sqlite3
+    rest = url.split("://", 1)[1]
+    return SqliteTaskQueue(Path(rest[1:] if rest.startswith("/") else rest))
+
+register_backend("sqlite", _sqlite_backend)
+
+def open_queue(url: str = WORK_QUEUE_URL):
+    scheme = url.split("://", 1)[0].lower()
+    if scheme not in BACKENDS:
+        raise ValueError(f"WORK_QUEUE_URL: backend desconocido '{scheme}' (disponibles: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[scheme](url)
+
+# ------------------------ ejecución ------------------------
+class QueueWorker:
+    # Hilos que toman tareas y las corren con handler(task, lost) -> resultado (dict JSON); lost() avisa que el
+    # lease se perdió. on_finish(task, fin) recibe lo que devolvió finish/fail (tramo o trabajo completos).
+    def __init__(self, queue, handler: Callable[[Task, Callable[[], bool]], Dict], on_finish: Callable[[Task, Dict], None],
+                 threads: int = QUEUE_WORKERS, lease_s: float = LEASE_S, poll_s: float = POLL_S):
+        self.queue = queue
+        self.handler = handler
+        self.on_finish = on_finish
+        self.threads = threads
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self.worker_id = ""
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Idempotente y por proceso: tras un fork (gunicorn) los hilos del padre no existen, se vuelven a crear
+        with self._lock:
+            if self.threads <= 0 or self._started_pid == os.getpid(): return self
+            self._started_pid = os.getpid()
+            self._stop.clear()
+            self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+            for n in range(self.threads):
+                threading.Thread(target=self._loop, name=f"queue-{n}", daemon=True).start()
+            return self
+
+    def stop(self):
+        self._stop.set(); self._wake.set()
+
+    def notify(self):
+        # Tareas nuevas encoladas desde este proceso: no esperar al próximo sondeo
+        self._wake.set()
+        return self
+
+    def _loop(self):
+        idle = self.poll_s
+        while not self._stop.is_set():
+            try:
+                task = self.queue.claim(self.worker_id, self.lease_s)
+            except sqlite3.Error:
+                task = None
+            if task is None:
+                if self._wake.wait(idle * random.uniform(0.5, 1.5)):
+                    self._wake.clear(); idle = self.poll_s
+                else:
+                    idle = min(idle * 2, POLL_MAX_S)
+                continue
+            idle = self.poll_s
+            try:
+                self.run(task)
+            except Exception:
+                pass   # on_finish falló (p. ej. base ocupada): el hilo sigue tomando tareas
+
+    def run(self, task: Task) -> Optional[Dict]:
+        lost, done = threading.Event(), threading.Event()
+        def beat():
+            while not done.wait(self.lease_s / 3):
+                try:
+                    if not self.queue.heartbeat(task, self.lease_s): lost.set(); return
+                except sqlite3.Error:
+                    pass   # base ocupada: se reintenta en el próximo latido, el lease todavía tiene margen
+        threading.Thread(target=beat, name=f"heartbeat-{task.id[:6]}", daemon=True).start()
+        try:
+            result = self.handler(task, lost.is_set)
+            # el handler puede marcar su resultado como "cancelled"
+            fin = self.queue.finish(task, (result or {}).get("status", "done"), result=result) if not lost.is_set() else None
+        except Exception as e:
+            fin = self.queue.fail(task, f"{type(e).__name__}: {e}") if not lost.is_set() else None
+        finally:
+            done.set()
+        if fin is not None:
+            self.on_finish(task, fin)
+        return fin